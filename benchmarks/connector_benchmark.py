@@ -0,0 +1,169 @@
+""" Benchmark of the ProxyStore connectors as module stores.
+
+Stores simulated packages of module-like sizes (data files of 1MB, 10MB to 2GB)
+through every available connector, and measures packaging on the driver and the
+first import on concurrent workers, each with its own package path so every
+worker reads the package from the store:
+
+    - file: FileConnector on a directory (use --workdir on the filesystem to test)
+    - local: LocalConnector, in the memory of the driver. Workers are forked after
+      packaging, so this is a lower bound that only measures deserializing and
+      extracting.
+    - redis: RedisConnector against a redis-server launched with redis.conf, only
+      when redis-server and the redis package are installed
+
+Results are appended in the JSONL schema of scaling_test.py, one line per
+connector, package size and number of workers:
+
+    $ python connector_benchmark.py --sizes 10 100 1000 --workers 1 4 16 --output connectors.jsonl
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from create_simulated_package import create_package
+from local_benchmark import package, run_workers
+
+from proxystore.store import get_store, unregister_store
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+def start_redis(workdir: str) -> tuple[subprocess.Popen, int]:
+    """ Launches a redis-server with redis.conf on a free port"""
+    port = free_port()
+    conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "redis.conf")
+    server = subprocess.Popen(["redis-server", conf, "--port", str(port), "--dir", workdir,
+                               "--proto-max-bulk-len", "4096mb"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("localhost", port), timeout=1).close()
+            return server, port
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                server.kill()
+                raise RuntimeError("redis-server did not start")
+            time.sleep(0.1)
+
+def connector_configs(workdir: str, redis_port: int | None) -> dict[str, tuple[str, dict]]:
+    configs = {
+        "file": ("proxystore.connectors.file.FileConnector", {"store_dir": os.path.join(workdir, "module-store")}),
+        "local": ("proxystore.connectors.local.LocalConnector", {}),
+    }
+    if redis_port is not None:
+        configs["redis"] = ("proxystore.connectors.redis.RedisConnector", {"hostname": "localhost", "port": redis_port})
+    return configs
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="Package sizes in MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Numbers of concurrent workers")
+    parser.add_argument("--files", type=int, default=100, help="Number of modules in each package")
+    parser.add_argument("--connectors", nargs="+", default=["file", "local", "redis"], help="Connectors to compare, if available")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the packages, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="connectors.jsonl", help="File to append results to")
+    parser.add_argument("--run_info", default=None, help="Add additional information to results")
+    opts = parser.parse_args()
+
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-connectors-")
+    os.makedirs(workdir, exist_ok=True)
+    redis_server, redis_port = None, None
+    if "redis" in opts.connectors:
+        if shutil.which("redis-server") is None or importlib.util.find_spec("redis") is None:
+            print("redis-server or the redis package is not installed, skipping redis")
+        else:
+            redis_server, redis_port = start_redis(workdir)
+
+    try:
+        configs = connector_configs(workdir, redis_port)
+        for size in opts.sizes:
+            name = f"sim_pack_{size}mb"
+            src = os.path.join(workdir, "src")
+            shutil.rmtree(src, ignore_errors=True)
+            os.mkdir(src)
+            create_package(name, 1, 0, src, nfiles=opts.files, data_files=size, data_size="fixed:1048576")
+
+            for connector in opts.connectors:
+                if connector not in configs:
+                    continue
+                connector_type, connector_config = configs[connector]
+                store_name = f"connector-benchmark-{connector}"
+                config = {
+                    "package_path": os.path.join(workdir, "proxied-site-packages"),
+                    "module_store_config": {
+                        "name": store_name,
+                        "connector_type": connector_type,
+                        "connector_config": connector_config,
+                        "cache_size": 0,
+                    },
+                }
+                try:
+                    proxies, packaging_time = package(name, src, config)
+                except Exception as e:
+                    print(f"Could not store {name} with {connector}: {e!r}")
+                    continue
+                # Forked workers would find the package imported by the packaging
+                for module_name in list(sys.modules):
+                    if module_name == name or module_name.startswith(f"{name}."):
+                        del sys.modules[module_name]
+
+                for nworkers in opts.workers:
+                    shutil.rmtree(config["package_path"], ignore_errors=True)
+                    tic = time.perf_counter()
+                    # The local store only exists in this process, forked workers inherit it
+                    workers = run_workers(name, proxies, config["package_path"], nworkers, separate_nodes=True,
+                                          start_method="fork" if connector == "local" else "spawn")
+                    end_time = time.perf_counter() - tic
+
+                    times = [worker["first_import"] for worker in workers]
+                    results = {
+                        "ntasks": nworkers,
+                        "cumulative_time": sum(times),
+                        "times": times,
+                        "launch_time": 0.0,
+                        "end_time": end_time,
+                        "method": "lazy",
+                        "module": name,
+                        "nodes": 1,
+                        "sleep": 0,
+                        "setup": packaging_time,
+                        "benchmark": "connectors",
+                        "host": platform.node(),
+                        "connector": connector,
+                        "size_mb": size,
+                        "fetch": [worker["fetch"] for worker in workers],
+                        "unpack": [worker["unpack"] for worker in workers],
+                    }
+                    if opts.run_info is not None:
+                        results.update(json.loads(opts.run_info))
+                    with open(opts.output, "a") as fp:
+                        fp.write(json.dumps(results) + "\n")
+                    print(f"{connector:<6} {size:>5}MB {nworkers:>3} workers: packaging {packaging_time:.2f}s, "
+                          f"first import max {max(times):.2f}s, fetch max {max(results['fetch']):.2f}s")
+
+                # Free the memory of the local store, and the data of the others, before the next size
+                store = get_store(store_name)
+                if store is not None:
+                    store.close()
+                    unregister_store(store_name)
+    finally:
+        if redis_server is not None:
+            redis_server.terminate()
+            redis_server.wait()
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+""" Benchmark of many workers on one node starting at the same time.
+
+For each number of workers N (by default powers of two up to the number of
+cores), N local processes each construct a ProxyImporter and import the same
+proxied package as soon as they are all started, racing in `unpack`. For every
+N the distribution of the time to first import and the number of bytes each
+worker read from the store is appended as a line to the output file:
+
+    $ python contention_benchmark.py --nfolders 10 --files 100 --output contention.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+
+from create_simulated_package import add_package_arguments, package_kwargs
+from local_benchmark import generate_package, make_config, package, run_workers
+
+def worker_counts(max_workers: int) -> list[int]:
+    """ Powers of two up to max_workers, always including max_workers"""
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    index = min(int(round(q * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+def distribution(values: list[float]) -> dict[str, float]:
+    return {
+        "mean": statistics.mean(values),
+        "min": min(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nfolders", type=int, default=10, help="Number of subfolders in the simulated package")
+    add_package_arguments(parser)
+    parser.set_defaults(files=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="Largest number of concurrent workers")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions for each number of workers")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the package, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="contention.jsonl", help="File to append results to")
+    parser.add_argument("--run_info", default=None, help="Add additional information to results")
+    opts = parser.parse_args()
+
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-contention-")
+    os.makedirs(workdir, exist_ok=True)
+    config = make_config(workdir)
+    try:
+        src = generate_package(workdir, opts)
+        proxies, packaging_time = package(opts.name, src, config)
+
+        for nworkers in worker_counts(opts.max_workers):
+            times = []
+            lock_wait = []
+            bytes_read = []
+            for _ in range(opts.repeat):
+                # Every repetition starts from a cold node
+                shutil.rmtree(config["package_path"], ignore_errors=True)
+                for result in run_workers(opts.name, proxies, config["package_path"], nworkers):
+                    times.append(result["first_import"])
+                    lock_wait.append(result["lock_wait"])
+                    bytes_read.append(result["bytes_read"])
+
+            results = {
+                "benchmark": "contention",
+                "host": platform.node(),
+                "module": opts.name,
+                "workers": nworkers,
+                "repeat": opts.repeat,
+                "setup": packaging_time,
+                "times": times,
+                "first_import": distribution(times),
+                "lock_wait": distribution(lock_wait),
+                "bytes_read": bytes_read,
+                "bytes_read_total": sum(bytes_read) / opts.repeat,
+                "package": {key: value for key, value in package_kwargs(opts).items() if key != "rng"} | {"depth": opts.depth, "seed": opts.seed},
+            }
+            if opts.run_info is not None:
+                results.update(json.loads(opts.run_info))
+
+            print(f"{nworkers:>4} workers: first import p50 {results['first_import']['p50']:.3f}s "
+                  f"p99 {results['first_import']['p99']:.3f}s, "
+                  f"{results['bytes_read_total']:.0f} bytes read from store per node")
+            with open(opts.output, "a") as fp:
+                fp.write(json.dumps(results) + "\n")
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
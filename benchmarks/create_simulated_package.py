@@ -1,12 +1,92 @@
 import argparse
 import os
+import random
 import shutil
+import struct
+import sys
+from typing import Callable, Optional
 
-def create_init(parent: str, submodules: list[str], prefix: str = ""):
+def parse_distribution(spec: Optional[str]) -> Callable[[random.Random], int]:
+    """ Parse a size distribution into a function that samples a size in bytes.
+
+    Supported formats:
+        empty                -> 0 bytes
+        fixed:SIZE           -> always SIZE bytes
+        uniform:MIN:MAX      -> uniformly between MIN and MAX bytes
+        lognormal:MU:SIGMA   -> exp(N(MU, SIGMA)) bytes, i.e. a few large files among many small ones
+    """
+    if spec is None or spec == "empty":
+        return lambda rng: 0
+
+    kind, *params = spec.split(":")
+    if kind == "fixed" and len(params) == 1:
+        size = int(params[0])
+        return lambda rng: size
+    elif kind == "uniform" and len(params) == 2:
+        low, high = int(params[0]), int(params[1])
+        return lambda rng: rng.randint(low, high)
+    elif kind == "lognormal" and len(params) == 2:
+        mu, sigma = float(params[0]), float(params[1])
+        return lambda rng: int(rng.lognormvariate(mu, sigma))
+
+    raise ValueError(f"Unknown size distribution {spec}")
+
+def module_source(size: int, import_work: float) -> str:
+    """ Source of a simulated module, padded to roughly size bytes and spending
+    import_work seconds of CPU time when it is executed
+    """
+    code = ""
+    if import_work > 0:
+        code += \
+f"""import time as _time
+_tic = _time.perf_counter()
+while _time.perf_counter() - _tic < {import_work}:
+    pass
+"""
+    # Pad with a constant, so the file has to be read and compiled like a large module
+    padding = max(size - len(code), 0)
+    if padding > 0:
+        code += f"_DATA = '{'x' * padding}'\n"
+    return code
+
+def shared_object_stub(size: int, rng: random.Random) -> bytes:
+    """ A valid shared library that exports nothing, for the machine of this interpreter,
+    padded with random bytes to roughly size bytes. Workers load the shared objects of
+    a package before executing it, so the stubs must load like real libraries.
+    """
+    with open(sys.executable, "rb") as fp:
+        ident = fp.read(20)
+    if ident[:4] != b"\x7fELF" or ident[4] != 2:
+        raise ValueError("Stub shared objects can only be created on 64 bit ELF platforms")
+    endian = "<" if ident[5] == 1 else ">"
+    machine, = struct.unpack_from(endian + "H", ident, 18)
+
+    # ELF header, program headers (PT_LOAD, PT_DYNAMIC, PT_GNU_STACK), an empty string
+    # table, the null symbol, a hash table with no symbols and the dynamic section
+    phnum = 3
+    strtab = 64 + 56 * phnum
+    symtab = strtab + 8
+    hashtab = symtab + 24
+    dynamic = hashtab + 16
+    entries = [(4, hashtab), (5, strtab), (6, symtab), (10, 1), (11, 24), (0, 0)]
+    end = dynamic + 16 * len(entries)
+
+    data = struct.pack(endian + "4sBBBB8xHHIQQQIHHHHHH", b"\x7fELF", 2, ident[5], 1, 0,
+                       3, machine, 1, 0, 64, 0, 0, 64, 56, phnum, 64, 0, 0)
+    data += struct.pack(endian + "IIQQQQQQ", 1, 4, 0, 0, 0, end, end, 0x1000)
+    data += struct.pack(endian + "IIQQQQQQ", 2, 4, dynamic, dynamic, dynamic, end - dynamic, end - dynamic, 8)
+    data += struct.pack(endian + "IIQQQQQQ", 0x6474e551, 6, 0, 0, 0, 0, 0, 16)
+    data += bytes(8) + bytes(24) + struct.pack(endian + "IIII", 1, 1, 0, 0)
+    data += b"".join(struct.pack(endian + "qQ", tag, value) for tag, value in entries)
+    # Data after the loaded segment is not read by the loader
+    return data + rng.randbytes(max(size - len(data), 0))
+
+def create_init(parent: str, submodules: list[str], prefix: str = "", import_work: float = 0.0):
     """ Create an __init__.py file that will import all submodules"""
 
     file_path = os.path.join(parent, "__init__.py")
     with open(file_path, "w") as fp:
+        fp.write(module_source(0, import_work))
         for submodule in submodules:
             fp.write(f"import {prefix}.{submodule}\n")
 
@@ -19,6 +99,7 @@ setup(
     name='{package_name}',
     version='0.0.1',
     packages=find_packages(),
+    package_data={{'': ['*.bin', '*.so']}},
     description='Package with bunch of empty files for testing'
 )
 """
@@ -26,8 +107,42 @@ setup(
     with open(path, "w") as fp:
         fp.write(code)
 
-def create_package(name: str, nfolders: int, level: int, path: str = "./", nfiles: int = 100, prefix: str = ""):
-    """ Recursive method to create a package with a certain number of folders"""
+def create_package(
+        name: str,
+        nfolders: int,
+        level: int,
+        path: str = "./",
+        nfiles: int = 100,
+        prefix: str = "",
+        file_size: Optional[str] = None,
+        data_files: int = 0,
+        data_size: Optional[str] = None,
+        shared_objects: int = 0,
+        so_size: Optional[str] = None,
+        lazy_fraction: float = 0.0,
+        import_work: float = 0.0,
+        rng: Optional[random.Random] = None
+    ):
+    """ Recursive method to create a package with a certain number of folders
+
+    Args:
+        name (str): name of the (sub)package.
+        nfolders (int): number of subpackages in each non-leaf package.
+        level (int): depth of the tree below this package.
+        path (str): directory to create the package in.
+        nfiles (int): number of modules in each leaf package.
+        prefix (str): dotted name of the parent package.
+        file_size (str): size distribution of the modules (see parse_distribution).
+        data_files (int): number of binary data blobs in each leaf package.
+        data_size (str): size distribution of the data blobs.
+        shared_objects (int): number of stub shared objects in each leaf package.
+            These are packaged, extracted and loaded like real libraries, but export nothing.
+        so_size (str): size distribution of the stub shared objects.
+        lazy_fraction (float): fraction of subpackages not imported by their parent.
+        import_work (float): seconds of CPU time spent executing each module.
+        rng (random.Random): random generator, pass a seeded one for reproducible packages.
+    """
+    rng = rng if rng is not None else random.Random(0)
 
     module_path = os.path.join(path, name)
     os.mkdir(module_path)
@@ -37,30 +152,79 @@ def create_package(name: str, nfolders: int, level: int, path: str = "./", nfile
         prefix = name
     submodules = []
     if level == 0:
+        sample_file_size = parse_distribution(file_size)
         for i in range(nfiles):
             file_path = os.path.join(module_path, f"file_{i}.py")
             with open(file_path, "w") as fp:
-                pass
+                fp.write(module_source(sample_file_size(rng), import_work))
             submodules.append(f"file_{i}")
+
+        sample_data_size = parse_distribution(data_size)
+        for i in range(data_files):
+            with open(os.path.join(module_path, f"data_{i}.bin"), "wb") as fp:
+                fp.write(rng.randbytes(sample_data_size(rng)))
+
+        sample_so_size = parse_distribution(so_size)
+        for i in range(shared_objects):
+            with open(os.path.join(module_path, f"lib_stub_{i}.so"), "wb") as fp:
+                fp.write(shared_object_stub(sample_so_size(rng), rng))
     else:
         for i in range(nfolders):
-            create_package(f"module_{i}", nfolders, level-1, module_path, nfiles, prefix)
-            submodules.append(f"module_{i}")
-        
-    create_init(module_path, submodules, prefix=prefix)
+            create_package(f"module_{i}", nfolders, level-1, module_path, nfiles, prefix,
+                           file_size=file_size,
+                           data_files=data_files,
+                           data_size=data_size,
+                           shared_objects=shared_objects,
+                           so_size=so_size,
+                           lazy_fraction=lazy_fraction,
+                           import_work=import_work,
+                           rng=rng)
+            if rng.random() >= lazy_fraction:
+                submodules.append(f"module_{i}")
+
+    create_init(module_path, submodules, prefix=prefix, import_work=import_work)
+
+def add_package_arguments(parser: argparse.ArgumentParser):
+    """ Add the options describing the shape of the simulated package to a parser,
+    so other benchmarks can generate the same packages
+    """
+    parser.add_argument("--files", type=int, default=1000, help="Number of files per subfolder")
+    parser.add_argument("--name", type=str, default="sim_pack", help="Name of package")
+    parser.add_argument("--depth", type=int, default=1, help="Number of levels of subfolders")
+    parser.add_argument("--file-size", type=str, default="empty", help="Size distribution of python files, i.e. fixed:1024, uniform:0:4096 or lognormal:8:2")
+    parser.add_argument("--data-files", type=int, default=0, help="Number of binary data files per leaf folder")
+    parser.add_argument("--data-size", type=str, default="fixed:1048576", help="Size distribution of data files")
+    parser.add_argument("--shared-objects", type=int, default=0, help="Number of stub shared objects per leaf folder")
+    parser.add_argument("--so-size", type=str, default="fixed:1048576", help="Size distribution of stub shared objects")
+    parser.add_argument("--lazy-fraction", type=float, default=0.0, help="Fraction of subpackages that are not imported by their parent")
+    parser.add_argument("--import-work", type=float, default=0.0, help="Seconds of CPU time spent importing each module")
+    parser.add_argument("--seed", type=int, default=0, help="Seed used to generate the package")
+
+def package_kwargs(opts: argparse.Namespace) -> dict:
+    """ Turns the options from add_package_arguments into arguments of create_package"""
+    return {
+        "nfiles": opts.files,
+        "file_size": opts.file_size,
+        "data_files": opts.data_files,
+        "data_size": opts.data_size,
+        "shared_objects": opts.shared_objects,
+        "so_size": opts.so_size,
+        "lazy_fraction": opts.lazy_fraction,
+        "import_work": opts.import_work,
+        "rng": random.Random(opts.seed),
+    }
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("nfolders", type=int, help="Number of files to include in simulated package")
-    parser.add_argument("--files", type=int, default=1000, help="Number of files per subfolder")
-    parser.add_argument("--name", type=str, default="sim_pack", help="Name of package")
     parser.add_argument("--path", type=str, default="./", help="Path to put package at")
+    add_package_arguments(parser)
     opts = parser.parse_args()
 
     path = os.path.join(opts.path, "simulated_package")
     shutil.rmtree(path, ignore_errors=True)
     os.mkdir(path)
-    create_package(opts.name, opts.nfolders, 1, path, opts.files)
+    create_package(opts.name, opts.nfolders, opts.depth, path, **package_kwargs(opts))
     create_setup(path, opts.name)
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+""" Benchmark of task latency with a fork server against a new process per task.
+
+Both start from a node where the simulated package is already extracted, so the
+difference is the time spent starting the process and executing the package:
+
+    - process: every task runs in a new (spawned) process that sets up a
+      ProxyImporter and imports the package, like a fresh worker
+    - forkserver: every task runs in a process forked from a template that has
+      the package imported (see proxy_imports.proxy_forkserver)
+
+Use --import-work to simulate packages that are expensive to execute:
+
+    $ python forkserver_benchmark.py --nfolders 4 --files 20 --import-work 0.001 --output forkserver.jsonl
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+from contention_benchmark import distribution
+from create_simulated_package import add_package_arguments, package_kwargs
+from local_benchmark import generate_package, make_config, package, run_workers
+
+from proxy_imports.proxy_forkserver import ForkServer
+
+def task(name: str) -> str:
+    """ Trivial task using the package"""
+    return importlib.import_module(name).__name__
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nfolders", type=int, default=10, help="Number of subfolders in the simulated package")
+    add_package_arguments(parser)
+    parser.set_defaults(files=100)
+    parser.add_argument("--tasks", type=int, default=10, help="Number of tasks for each mode")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the package, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="forkserver.jsonl", help="File to append results to")
+    parser.add_argument("--run_info", default=None, help="Add additional information to results")
+    opts = parser.parse_args()
+
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-forkserver-")
+    os.makedirs(workdir, exist_ok=True)
+    config = make_config(workdir)
+    try:
+        src = generate_package(workdir, opts)
+        proxies, packaging_time = package(opts.name, src, config)
+        # Extract once, both modes start from a warm node
+        run_workers(opts.name, proxies, config["package_path"], 1)
+
+        process = []
+        for _ in range(opts.tasks):
+            tic = time.perf_counter()
+            run_workers(opts.name, proxies, config["package_path"], 1)
+            process.append(time.perf_counter() - tic)
+
+        forkserver = []
+        tic = time.perf_counter()
+        with ForkServer(proxies, config["package_path"]) as server:
+            server.wait_ready()
+            template_time = time.perf_counter() - tic
+            for _ in range(opts.tasks):
+                tic = time.perf_counter()
+                server.submit(task, opts.name).result()
+                forkserver.append(time.perf_counter() - tic)
+
+        results = {
+            "benchmark": "forkserver",
+            "host": platform.node(),
+            "module": opts.name,
+            "tasks": opts.tasks,
+            "setup": packaging_time,
+            "template": template_time,
+            "process": distribution(process),
+            "forkserver": distribution(forkserver),
+            "raw": {"process": process, "forkserver": forkserver},
+            "package": {key: value for key, value in package_kwargs(opts).items() if key != "rng"} | {"depth": opts.depth, "seed": opts.seed},
+        }
+        if opts.run_info is not None:
+            results.update(json.loads(opts.run_info))
+
+        print(f"template ready in {template_time:.3f}s")
+        for mode in ["process", "forkserver"]:
+            print(f"{mode:<12}task latency p50 {results[mode]['p50']:.4f}s p90 {results[mode]['p90']:.4f}s")
+        with open(opts.output, "a") as fp:
+            fp.write(json.dumps(results) + "\n")
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+""" Self-contained benchmark of the proxy imports pipeline.
+
+Unlike the other benchmarks in this folder, this one does not need Parsl,
+conda or a cluster. It generates a simulated package, stores it through a
+local FileConnector, and uses local processes as workers. It measures:
+
+    - packaging: importing, tarring and storing the package on the driver
+    - fetch: reading the package from the store on the worker
+    - unpack: deserializing and extracting the package on the worker
+    - first_import: time from creating the ProxyImporter to a resolved module
+    - warm_import: first import in a new worker when the package is already extracted
+
+Results are written as JSON and can be compared against a saved baseline:
+
+    $ python local_benchmark.py --output baseline.json
+    $ python local_benchmark.py --output new.json --baseline baseline.json
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from create_simulated_package import add_package_arguments, create_package, package_kwargs
+
+from proxy_imports import store_modules
+import proxy_imports.proxy_analyze
+from proxy_imports.proxy_timing import clear_events, get_timing_report
+
+UNPACK_STAGES = ["deserialize", "untar", "extract_libraries"]
+
+def make_config(workdir: str, name: str = "local-benchmark-store") -> dict:
+    return {
+        "package_path": os.path.join(workdir, "proxied-site-packages"),
+        "module_store_config": {
+            "name": name,
+            "connector_type": "proxystore.connectors.file.FileConnector",
+            "connector_config": {
+                "store_dir": os.path.join(workdir, "module-store")
+            },
+            "cache_size": 0
+        }
+    }
+
+def generate_package(workdir: str, opts: argparse.Namespace) -> str:
+    """ Creates the simulated package and returns the directory containing it"""
+    src = os.path.join(workdir, "src")
+    shutil.rmtree(src, ignore_errors=True)
+    os.mkdir(src)
+    create_package(opts.name, opts.nfolders, opts.depth, src, **package_kwargs(opts))
+    return src
+
+def package(name: str, src: str, config: dict) -> tuple[dict, float]:
+    """ Stores the simulated package, returns the proxies and the packaging time"""
+    if src not in sys.path:
+        sys.path.insert(0, src)
+
+    # Make sure nothing is cached from a previous repetition
+    proxy_imports.proxy_analyze.proxied_modules.pop(name, None)
+    proxy_imports.proxy_analyze.package_records.pop(name, None)
+    for module_name in list(sys.modules):
+        if module_name == name or module_name.startswith(f"{name}."):
+            del sys.modules[module_name]
+    importlib.invalidate_caches()
+
+    clear_events()
+    tic = time.perf_counter()
+    proxies = store_modules(name, trace=False, config=config)
+    packaging_time = time.perf_counter() - tic
+    return proxies, packaging_time
+
+def worker(name: str, proxies: dict, package_path: str, barrier, queue, peers: Optional[dict] = None) -> None:
+    """ Simulates a worker executing its first task"""
+    from proxy_imports import ProxyImporter
+
+    barrier.wait()
+    tic = time.perf_counter()
+    sys.meta_path.insert(0, ProxyImporter(proxies, package_path, peers=peers))
+    module = importlib.import_module(name)
+    module.__wrapped__ # Force resolution of proxy
+    first_import = time.perf_counter() - tic
+
+    report = get_timing_report()
+    stages = report["packages"].get(name, {"stages": dict(), "bytes": dict()})
+    queue.put({
+        "first_import": first_import,
+        "fetch": stages["stages"].get("fetch", 0.0),
+        "unpack": sum(stages["stages"].get(stage, 0.0) for stage in UNPACK_STAGES),
+        "lock_wait": stages["stages"].get("lock_wait", 0.0),
+        "exec_module": stages["stages"].get("exec_module", 0.0),
+        "bytes_read": stages["bytes"].get("fetch", 0),
+        "store_reads": sum(1 for event in report["events"] if event["package"] == name and event["stage"] == "fetch" and event.get("source") != "peer"),
+    })
+    if peers is not None:
+        # Keep serving the package until every worker has it
+        barrier.wait()
+
+def run_workers(name: str,
+                proxies: dict,
+                package_path: str,
+                nworkers: int,
+                separate_nodes: bool = False,
+                peers: Optional[dict] = None,
+                start_method: str = "spawn") -> list[dict]:
+    """ Launches nworkers processes that import the package at the same time.
+    With separate_nodes, every worker simulates a node with its own package path.
+    """
+    ctx = multiprocessing.get_context(start_method)
+    barrier = ctx.Barrier(nworkers)
+    queue = ctx.Queue()
+    if separate_nodes:
+        paths = [os.path.join(package_path, f"node-{i}") for i in range(nworkers)]
+    else:
+        paths = [package_path] * nworkers
+    processes = [ctx.Process(target=worker, args=(name, proxies, path, barrier, queue, peers)) for path in paths]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+        if p.exitcode != 0:
+            raise RuntimeError(f"Worker exited with code {p.exitcode}")
+    return results
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "mean": statistics.mean(values),
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+def run_benchmark(opts) -> dict:
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    config = make_config(workdir)
+    src = generate_package(workdir, opts)
+
+    measurements: dict[str, list[float]] = {
+        "packaging": [],
+        "fetch": [],
+        "unpack": [],
+        "lock_wait": [],
+        "first_import": [],
+        "exec_module": [],
+        "warm_import": [],
+        "bytes_read": [],
+    }
+    try:
+        for _ in range(opts.repeat):
+            shutil.rmtree(config["package_path"], ignore_errors=True)
+
+            proxies, packaging_time = package(opts.name, src, config)
+            measurements["packaging"].append(packaging_time)
+
+            # Cold start: all workers race for the same node-local package path
+            for result in run_workers(opts.name, proxies, config["package_path"], opts.workers):
+                for key, value in result.items():
+                    if key in measurements:
+                        measurements[key].append(value)
+
+            # Warm start: package is already extracted on the node
+            for result in run_workers(opts.name, proxies, config["package_path"], 1):
+                measurements["warm_import"].append(result["first_import"])
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "benchmark": "local",
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "name": opts.name,
+        "nfolders": opts.nfolders,
+        "files": opts.files,
+        "package": {key: value for key, value in package_kwargs(opts).items() if key != "rng"} | {"depth": opts.depth, "seed": opts.seed},
+        "workers": opts.workers,
+        "repeat": opts.repeat,
+        "results": {key: summarize(values) for key, values in measurements.items()},
+        "raw": measurements,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """ Compares the median of each timing against the baseline.
+    Returns the metrics that regressed by more than threshold (relative).
+    """
+    regressions = []
+    print(f"{'metric':<15}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for key, summary in results["results"].items():
+        if key not in baseline["results"]:
+            continue
+        old = baseline["results"][key]["median"]
+        new = summary["median"]
+        ratio = new / old if old > 0 else float("inf") if new > 0 else 1.0
+        flag = ""
+        if key != "bytes_read" and ratio > 1 + threshold:
+            regressions.append(key)
+            flag = " <- regression"
+        print(f"{key:<15}{old:>12.4f}{new:>12.4f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nfolders", type=int, default=10, help="Number of subfolders in the simulated package")
+    add_package_arguments(parser)
+    parser.set_defaults(files=100)
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent worker processes")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the package, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="local_results.json", help="File to write results to")
+    parser.add_argument("--baseline", type=str, default=None, help="Results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown of a median that counts as a regression")
+    opts = parser.parse_args()
+
+    results = run_benchmark(opts)
+    with open(opts.output, "w") as fp:
+        json.dump(results, fp, indent=2)
+
+    for key, summary in results["results"].items():
+        print(f"{key}: median {summary['median']:.4f} mean {summary['mean']:.4f} max {summary['max']:.4f}")
+
+    if opts.baseline is not None:
+        with open(opts.baseline) as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, opts.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
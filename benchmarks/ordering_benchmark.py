@@ -0,0 +1,106 @@
+""" Benchmark of the order packages are fetched in.
+
+A task imports a small package first and a large one later. Workers fetch the
+packages one after the other, so if the large package is fetched first, the
+task waits for it before it can import the small one. This measures the time to
+first import (of the small package) when the packages are fetched:
+
+    - unordered: large package first, as it may be without ordering
+    - ordered: in the order the task needs them (see critical_path_order)
+
+    $ python ordering_benchmark.py --large-data-files 20 --output ordering.jsonl
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from contention_benchmark import distribution
+from create_simulated_package import create_package
+from local_benchmark import make_config, package
+
+from proxy_imports.proxy_analyze import critical_path_order
+
+def worker(proxies: dict, package_path: str, first: str, queue) -> None:
+    """ Simulates a task importing the first package right away"""
+    from proxy_imports import ProxyImporter
+
+    tic = time.perf_counter()
+    importer = ProxyImporter(proxies, package_path)
+    sys.meta_path.insert(0, importer)
+    importlib.import_module(first).__wrapped__
+    first_import = time.perf_counter() - tic
+    importer.wait()
+    queue.put({"first_import": first_import, "all_extracted": time.perf_counter() - tic})
+
+def run(proxies: dict, package_path: str, first: str) -> dict:
+    shutil.rmtree(package_path, ignore_errors=True)
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    p = ctx.Process(target=worker, args=(proxies, package_path, first, queue))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--small-files", type=int, default=10, help="Number of modules in the small package")
+    parser.add_argument("--large-files", type=int, default=100, help="Number of modules in each subfolder of the large package")
+    parser.add_argument("--large-data-files", type=int, default=20, help="Number of 1MB data files in each subfolder of the large package")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the packages, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="ordering.jsonl", help="File to append results to")
+    parser.add_argument("--run_info", default=None, help="Add additional information to results")
+    opts = parser.parse_args()
+
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-ordering-")
+    os.makedirs(workdir, exist_ok=True)
+    config = make_config(workdir)
+    try:
+        src = os.path.join(workdir, "src")
+        shutil.rmtree(src, ignore_errors=True)
+        os.mkdir(src)
+        create_package("small_pack", 1, 0, src, nfiles=opts.small_files, rng=random.Random(0))
+        create_package("large_pack", 4, 1, src, nfiles=opts.large_files,
+                       data_files=opts.large_data_files, data_size="fixed:1048576", rng=random.Random(0))
+
+        proxies = package("large_pack", src, config)[0] | package("small_pack", src, config)[0]
+        orders = {
+            "unordered": ["large_pack", "small_pack"],
+            "ordered": critical_path_order(["small_pack", "large_pack"], dict()),
+        }
+
+        results = {
+            "benchmark": "ordering",
+            "host": platform.node(),
+            "repeat": opts.repeat,
+            "package": {"small_files": opts.small_files, "large_files": opts.large_files, "large_data_files": opts.large_data_files},
+        }
+        for mode, order in orders.items():
+            runs = [run({name: proxies[name] for name in order}, config["package_path"], "small_pack") for _ in range(opts.repeat)]
+            results[mode] = {
+                "order": order,
+                "first_import": distribution([r["first_import"] for r in runs]),
+                "all_extracted": distribution([r["all_extracted"] for r in runs]),
+            }
+            print(f"{mode:<10} time to first import p50 {results[mode]['first_import']['p50']:.3f}s, "
+                  f"all extracted p50 {results[mode]['all_extracted']['p50']:.3f}s")
+
+        if opts.run_info is not None:
+            results.update(json.loads(opts.run_info))
+        with open(opts.output, "a") as fp:
+            fp.write(json.dumps(results) + "\n")
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+""" Benchmark of distributing a package to many nodes through peers.
+
+Every worker is a local process simulating a separate node, with its own package
+path. For each number of nodes N, the package is distributed once with every node
+reading it from the store, and once with peers (see proxy_imports.proxy_peers),
+where nodes serve it to each other over loopback sockets. Each line of the output
+reports the number of reads from the store and the time to first import:
+
+    $ python peers_benchmark.py --nfolders 10 --files 100 --max-workers 16 --output peers.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+from contention_benchmark import distribution, worker_counts
+from create_simulated_package import add_package_arguments, package_kwargs
+from local_benchmark import generate_package, make_config, package, run_workers
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nfolders", type=int, default=10, help="Number of subfolders in the simulated package")
+    add_package_arguments(parser)
+    parser.set_defaults(files=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="Largest number of simulated nodes")
+    parser.add_argument("--fanout", type=int, default=2, help="Number of children of each node in the broadcast tree")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the package, store and extraction (default: temporary)")
+    parser.add_argument("--output", type=str, default="peers.jsonl", help="File to append results to")
+    parser.add_argument("--run_info", default=None, help="Add additional information to results")
+    opts = parser.parse_args()
+
+    workdir = opts.workdir or tempfile.mkdtemp(prefix="proxy-imports-peers-")
+    os.makedirs(workdir, exist_ok=True)
+    config = make_config(workdir)
+    try:
+        src = generate_package(workdir, opts)
+        proxies, packaging_time = package(opts.name, src, config)
+
+        for nworkers in worker_counts(opts.max_workers):
+            results = {
+                "benchmark": "peers",
+                "host": platform.node(),
+                "module": opts.name,
+                "workers": nworkers,
+                "fanout": opts.fanout,
+                "setup": packaging_time,
+                "package": {key: value for key, value in package_kwargs(opts).items() if key != "rng"} | {"depth": opts.depth, "seed": opts.seed},
+            }
+            for mode in ["store", "peers"]:
+                shutil.rmtree(config["package_path"], ignore_errors=True)
+                peers = None
+                if mode == "peers":
+                    # A new registry for every run, so nodes do not find peers of an earlier run
+                    registry = os.path.join(workdir, "peers", str(nworkers))
+                    shutil.rmtree(registry, ignore_errors=True)
+                    peers = {"directory": registry, "fanout": opts.fanout, "host": "127.0.0.1"}
+                workers = run_workers(opts.name, proxies, config["package_path"], nworkers, separate_nodes=True, peers=peers)
+                results[mode] = {
+                    "store_reads": sum(result["store_reads"] for result in workers),
+                    "first_import": distribution([result["first_import"] for result in workers]),
+                }
+                print(f"{nworkers:>4} nodes, {mode:<6}: {results[mode]['store_reads']:>4} store reads, "
+                      f"first import p50 {results[mode]['first_import']['p50']:.3f}s "
+                      f"max {results[mode]['first_import']['max']:.3f}s")
+
+            if opts.run_info is not None:
+                results.update(json.loads(opts.run_info))
+            with open(opts.output, "a") as fp:
+                fp.write(json.dumps(results) + "\n")
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+""" Microbenchmark of attribute access through a resolved ProxyModule.
+
+Task code that does `import numpy as np` at the top of its module keeps accessing
+`np.<attr>` long after the package is imported. This measures the cost of such
+an access on a plain module, through a resolved ProxyModule, and on the global
+after the ProxyModule rebound it to the module on resolution:
+
+    $ python proxy_overhead_benchmark.py --number 1000000
+"""
+import argparse
+import importlib
+import json
+import platform
+import timeit
+
+from proxy_imports.proxy_importer import ProxyModule
+
+MODULE = "json.decoder"
+ATTRIBUTE = "JSONDecoder"
+
+def access_time(namespace: dict, number: int, repeat: int) -> float:
+    """ Best time of one `module.ATTRIBUTE` access in ns"""
+    times = timeit.repeat(f"module.{ATTRIBUTE}", globals=namespace, number=number, repeat=repeat)
+    return min(times) / number * 1e9
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=1_000_000, help="Number of accesses per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measurements, the best is reported")
+    parser.add_argument("--output", type=str, default=None, help="File to write results to")
+    opts = parser.parse_args()
+
+    # A submodule of an already imported package resolves without a store
+    plain = {"module": importlib.import_module(MODULE)}
+    proxied = {"module": ProxyModule(None, MODULE, package_path="")}
+    proxied["module"].__wrapped__
+    rebound = {"module": ProxyModule(None, MODULE, package_path="")}
+    exec(f"module.{ATTRIBUTE}", rebound)  # Resolves with `rebound` as the globals of the frame
+
+    results = {
+        "benchmark": "proxy_overhead",
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "number": opts.number,
+        "plain": access_time(plain, opts.number, opts.repeat),
+        "proxy": access_time(proxied, opts.number, opts.repeat),
+        "rebound": access_time(rebound, opts.number, opts.repeat),
+    }
+    for key in ["plain", "proxy", "rebound"]:
+        print(f"{key:<8}{results[key]:>8.1f} ns per attribute access")
+
+    if opts.output is not None:
+        with open(opts.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+if __name__ == "__main__":
+    main()
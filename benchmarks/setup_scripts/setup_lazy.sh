@@ -7,6 +7,4 @@ rm -rdf "/dev/shm/proxied-site-packages"
 
 # Run from shared file system
 test_env=`pwd -P`/test_env
-conda activate ${test_env}
-
-export LD_LIBRARY_PATH="/dev/shm/proxied-site-packages/libraries:$LD_LIBRARY_PATH"
\ No newline at end of file
+conda activate ${test_env}
\ No newline at end of file
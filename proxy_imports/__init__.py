@@ -1,8 +1,35 @@
-"""Proxy Import module"""
+"""Proxy Import module
 
-__all__ = ["ProxyImporter", "store_module" "proxy_transform", "analyze_func_and_create_proxies", "read_config"]
+Only what a worker needs to unpack and import packages is imported eagerly.
+The packaging functions are imported on first use, so the packaging stack
+(PyInstaller, tracing and tarring) is never loaded on workers.
+"""
+
+import importlib
+
+__all__ = ["ProxyImporter", "store_modules", "store_modules_async", "proxy_transform", "analyze_func_and_create_proxies", "read_config", "get_timing_report", "get_cache_stats", "prefetch", "worker_init_command", "probe_environment", "save_environment", "ForkServer", "package_costs", "fold_misses"]
 
 from proxy_imports.proxy_importer import ProxyImporter
 from proxy_imports.proxy_transform import proxy_transform
-from proxy_imports.proxy_analyze import analyze_func_and_create_proxies, store_modules
-from proxy_imports.proxy_config import read_config
\ No newline at end of file
+from proxy_imports.proxy_config import read_config
+from proxy_imports.proxy_timing import get_timing_report
+from proxy_imports.proxy_cache import get_cache_stats
+from proxy_imports.proxy_prefetch import prefetch, worker_init_command
+
+_lazy_exports = {
+    "store_modules": "proxy_imports.proxy_analyze",
+    "store_modules_async": "proxy_imports.proxy_analyze",
+    "analyze_func_and_create_proxies": "proxy_imports.proxy_analyze",
+    "probe_environment": "proxy_imports.proxy_environment",
+    "save_environment": "proxy_imports.proxy_environment",
+    "ForkServer": "proxy_imports.proxy_forkserver",
+    "package_costs": "proxy_imports.proxy_costs",
+    "fold_misses": "proxy_imports.proxy_analyze",
+}
+
+def __getattr__(name):
+    if name in _lazy_exports:
+        value = getattr(importlib.import_module(_lazy_exports[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,5 +1,18 @@
 config = {
     "package_path": "/dev/shm/proxied-site-packages",
+    "manifest_dir": "~/.proxy_modules/manifests", # Versions of stored packages, to only ship changed files
+    "max_delta_chain": 8,
+    "lazy_attributes": False, # Names imported from unresolved packages are proxies until used
+    "warm_up": False, # Modules workers import in the background, or True for the packages that are not lazy
+    "target_environment": None, # Path of a file written by save_environment(probe_environment()) on the endpoint
+    "peers": None, # i.e. {"directory": "/shared/fs/peers"}, to fetch packages from other nodes (see proxy_peers)
+    "fetch_policy": {}, # "eager", "priority" or "lazy" by package, i.e. {"tensorflow": "lazy"}
+    "endpoint": None, # i.e. {"metadata_latency": 0.001, "bandwidth": 1e9}, to choose how each package is shipped (see proxy_transport)
+    "lazy_threshold": 256 * 2**20, # Packages larger than this (in bytes) are fetched lazily, unless set in fetch_policy
+    "child_processes": False, # Processes started by tasks (i.e. joblib) import the packages extracted by the task (see proxy_children)
+    "batch_fetches": False, # Read the eager packages with one request per store (see proxy_stores)
+    "report_misses": None, # True or {"log": "/shared/fs/misses.jsonl"}, to record packages workers import from outside the package path (see proxy_misses)
+    "blob_cache": None, # i.e. {"directory": "/dev/shm/proxy-imports-blobs"}, to cache packages on the node (see proxy_cache)
     "module_store_config": {
         "name": "module-store",
         "connector_type": "proxystore.connectors.file.FileConnector",
@@ -13,12 +13,15 @@ class TracingFinder(importlib.abc.MetaPathFinder):
     This may (?) be desirable behavior if we assume modules not 
     part of this trace will either be part of the base environment, or have
     been imported by another module that was traced and proxied
+
+    Packages are kept in the order they are first imported, along with the
+    packages each of them imports (the package executing the import statement).
     """
     
-    _packages: set[str]
+    _packages: dict[str, list[str]]
 
     def __init__(self):
-        self._packages = set()
+        self._packages = dict()
 
     def find_module(self, fullname, path=None):
         spec = self.find_spec(fullname, path)
@@ -28,16 +31,36 @@ class TracingFinder(importlib.abc.MetaPathFinder):
 
     def find_spec(self, fullname, path=None, target=None):
         package, _, submod = fullname.partition('.')
-        self._packages.add(package)
+        self._packages.setdefault(package, [])
+
+        importer = self._importing_package()
+        if importer is not None and importer != package and package not in self._packages[importer]:
+            self._packages.setdefault(importer, []).append(package)
+        return None
+
+    @staticmethod
+    def _importing_package():
+        """Top level package of the module executing the import, None for the tracer itself"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            name = frame.f_globals.get("__name__", "")
+            if not name.startswith(("importlib", "_frozen_importlib")):
+                if name == __name__ or name == "__main__":
+                    return None
+                return name.partition('.')[0]
+            frame = frame.f_back
         return None
     
     def get_packages(self):
-        return self._packages
+        return list(self._packages)
+
+    def get_dependencies(self):
+        return {package: dependencies for package, dependencies in self._packages.items() if dependencies}
 
     def clear(self):
-        self._packages = set()
+        self._packages = dict()
 
-def collect_modules_and_dependencies(modules: list):
+def collect_modules_and_dependencies(modules: list, as_json: bool = False):
     """ Imports a list of modules and collects all packages that are also
     imported. Needs to be run in a clean interpreter to correctly obtain all
     dependencies.
@@ -46,7 +69,14 @@ def collect_modules_and_dependencies(modules: list):
     finder = TracingFinder()
     sys.meta_path.insert(0, finder)
     for module_name in modules:
-        importlib.import_module(module_name)
+        # Unlike importlib.import_module, timed by -X importtime
+        __import__(module_name)
+    sys.meta_path.remove(finder)
+
+    if as_json:
+        import json # Only after tracing, so json is traced if the modules import it
+        print(json.dumps({"packages": finder.get_packages(), "dependencies": finder.get_dependencies()}))
+        return
 
     for m in finder.get_packages():
         print(m)
@@ -55,8 +85,10 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('modules', metavar='m', type=str, nargs='+',
                     help='modules to trace imports for')
+    parser.add_argument('--json', action='store_true',
+                    help='print the packages in import order and their dependencies as JSON')
     args = parser.parse_args()
-    collect_modules_and_dependencies(args.modules)
+    collect_modules_and_dependencies(args.modules, args.json)
 
 if __name__ == "__main__":
     main()
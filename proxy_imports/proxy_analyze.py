@@ -1,67 +1,240 @@
 import ast
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
 import importlib
+import importlib.metadata
+import importlib.util
 import inspect
 import io
+import json
+import marshal
 import os
 import os.path
+import pickle
 import shutil
+import site
 import subprocess
 import sys
+import sysconfig
 import tarfile
+import threading
+import time
 from types import ModuleType
 from typing import Optional, Any, Union
 from pathlib import Path
 import zipfile
 
 from.proxy_config import read_config
+from .proxy_environment import _packages_distributions, load_target_environment, satisfied_on_target
+from .proxy_timing import record_event, timed
+from .proxy_transport import ENDPOINT_DEFAULTS, choose_transport, package_stats
 
 from proxystore.proxy import Proxy
 from proxystore.store import Store, get_store, register_store
-from proxystore.connectors.dim import utils
 
-from PyInstaller.utils.hooks import collect_dynamic_libs, conda_support
-from PyInstaller.compat import is_pure_conda
-
-def _serialize_module(m: ModuleType) -> dict[str, bytes]:
-    """ Method used to turn module into serialized bitstring"""
-    
+def _module_path(m: ModuleType) -> str:
+    """ Path of the file or directory that has to be moved for a module"""
     try:
         module_path = inspect.getfile(m)
         if os.path.basename(module_path) == "__init__.py":
             module_path = Path(module_path).parent.absolute()
     except:
         module_path = m.__path__[0]
+    return str(module_path)
+
+def _exclude_pycache(info: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+    if "__pycache__" in info.name.split("/"):
+        return None
+    return info
 
-    module_buffer = io.BytesIO()
-    with tarfile.open(fileobj=module_buffer, mode="w") as f:
-        f. add(module_path, arcname=os.path.basename(module_path))
+def _hash_module(module_path: str) -> dict[str, str]:
+    """ Content hash of every file of a module, keyed by its path inside of the archive.
+    Byte code caches are skipped, they are rebuilt from the source when it changes.
+    """
+    root = os.path.dirname(module_path)
+    if os.path.isfile(module_path):
+        paths = [module_path]
+    else:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(module_path):
+            dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+
+    manifest = dict()
+    for path in sorted(paths):
+        if not os.path.isfile(path):
+            continue
+        digest = hashlib.sha256()
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(chunk)
+        manifest[os.path.relpath(path, root)] = digest.hexdigest()
+    return manifest
 
-    # Convert to string so can easily serialize
-    module_bytes = module_buffer.getvalue()
-    module_buffer.close()
+def _manifest_version(manifest: dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
 
-    # Possible solution for libraries, but seems to be overly inclusive?
-    libraries = collect_dynamic_libs(m.__name__)
-    if is_pure_conda:
+def _is_editable(m: ModuleType) -> bool:
+    """ Checks if a module is under active development, i.e. installed with
+    `pip install -e` or imported directly from a source tree instead of site-packages.
+    """
+    package = m.__name__.partition('.')[0]
+    for dist_name in _packages_distributions().get(package, []):
         try:
-            libraries.extend(conda_support.collect_dynamic_libs(m.__name__, dependencies=False))
-        except ModuleNotFoundError:
-            print(f"{m.__name__} is not a conda package or was not installed with conda. Cannot find all shared libraries.")
+            direct_url = importlib.metadata.distribution(dist_name).read_text("direct_url.json")
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        if direct_url and json.loads(direct_url).get("dir_info", {}).get("editable", False):
+            return True
+
+    # Newer editable installs use an import hook, and the package is not listed
+    # under its own name. Anything outside of an installation directory is treated the same.
+    install_dirs = site.getsitepackages() + [site.getusersitepackages(), sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]]
+    install_dirs = [os.path.realpath(d) + os.sep for d in install_dirs]
+    module_path = os.path.realpath(_module_path(m))
+    return not any(module_path.startswith(d) for d in install_dirs)
+
+def _zip_module(module_path: str, manifest: dict[str, str]) -> bytes:
+    """ Zip file of a package of Python files for zipimport. The byte code of every module
+    is stored next to its source (unchecked, hash based), as zipimport can not cache the
+    byte code it compiles.
+    """
+    root = os.path.dirname(module_path)
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, mode="w") as f:
+        for name in manifest:
+            with open(os.path.join(root, name), "rb") as fp:
+                source = fp.read()
+            f.writestr(name, source)
+            if name.endswith(".py"):
+                code = compile(source, name, "exec", dont_inherit=True)
+                header = importlib.util.MAGIC_NUMBER + (0b01).to_bytes(4, "little") + importlib.util.source_hash(source)
+                f.writestr(name[:-len(".py")] + ".pyc", header + marshal.dumps(code))
+    return zip_buffer.getvalue()
+
+def _shard_module(module_path: str, shards: int, editable: bool) -> list[bytes]:
+    """ Splits the files of a module into archives of about the same size"""
+    root = os.path.dirname(module_path)
+    if os.path.isfile(module_path):
+        paths = [module_path]
+    else:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(module_path):
+            if editable:
+                dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+
+    # Largest files first, each to the smallest shard so far
+    groups = [[] for _ in range(shards)]
+    sizes = [0] * shards
+    for size, path in sorted(((os.path.getsize(path), path) for path in paths), reverse=True):
+        smallest = sizes.index(min(sizes))
+        groups[smallest].append(path)
+        sizes[smallest] += size
 
-    library_buffer = io.BytesIO()
-    with tarfile.open(fileobj=library_buffer, mode="w|") as f:
-        for path, _ in libraries:
-            f.add(path, arcname=os.path.basename(path))
+    archives = []
+    for group in groups:
+        shard_buffer = io.BytesIO()
+        with tarfile.open(fileobj=shard_buffer, mode="w") as f:
+            for path in sorted(group):
+                f.add(path, arcname=os.path.relpath(path, root), recursive=False)
+        archives.append(shard_buffer.getvalue())
+    return archives
 
-    # Convert to string so can easily serialize
-    library_bytes = library_buffer.getvalue()
-    library_buffer.close()
+def _serialize_module(m: ModuleType,
+                      manifest: Optional[dict[str, str]] = None,
+                      base: Optional[dict[str, Any]] = None,
+                      editable: bool = False,
+                      method: str = "tar",
+                      shards: int = 1) -> dict[str, Any]:
+    """ Method used to turn module into serialized bitstring
 
-    print(f"Serialize: {m.__name__}")
-    print(f"\tmodule zip file length: {len(module_bytes)}")
-    print(f"\tlibrary zip file length: {len(library_bytes)}")
+    Args:
+        m (ModuleType): the module to serialize.
+        manifest (dict): content hashes of the module files, computed if not given.
+        base (dict): record of a previously stored version of the module. If given,
+            only the files that changed since that version are included.
+        editable (bool): module is under development, byte code caches are left out.
+        method (str): "tar", "zip" or "sharded" (see proxy_transport). Only tar
+            archives can be deltas against a base.
+        shards (int): number of archives with the sharded method.
+    """
+    module_path = _module_path(m)
+    if manifest is None:
+        manifest = _hash_module(module_path)
+
+    with timed(m.__name__, "tar_module") as info:
+        info["method"] = method
+        module_buffer = io.BytesIO()
+        shard_archives = None
+        if method == "zip":
+            module_buffer.write(_zip_module(module_path, manifest))
+        elif method == "sharded":
+            shard_archives = _shard_module(module_path, shards, editable)
+            info["shards"] = len(shard_archives)
+        else:
+            with tarfile.open(fileobj=module_buffer, mode="w") as f:
+                if base is None:
+                    f. add(module_path, arcname=os.path.basename(module_path), filter=_exclude_pycache if editable else None)
+                else:
+                    root = os.path.dirname(module_path)
+                    for name, digest in manifest.items():
+                        if base["manifest"].get(name) != digest:
+                            f.add(os.path.join(root, name), arcname=name)
 
-    return {"module": module_bytes, "libraries": library_bytes}
+        # Convert to string so can easily serialize
+        module_bytes = module_buffer.getvalue()
+        module_buffer.close()
+        info["bytes"] = len(module_bytes) + sum(len(archive) for archive in shard_archives or [])
+
+    with timed(m.__name__, "collect_libraries") as info:
+        # PyInstaller is only needed for packaging, importing it here keeps it off the worker
+        from PyInstaller.utils.hooks import collect_dynamic_libs
+        from PyInstaller.compat import is_pure_conda
+
+        # Possible solution for libraries, but seems to be overly inclusive?
+        libraries = collect_dynamic_libs(m.__name__)
+        if is_pure_conda:
+            from PyInstaller.utils.hooks import conda_support
+            try:
+                libraries.extend(conda_support.collect_dynamic_libs(m.__name__, dependencies=False))
+            except ModuleNotFoundError:
+                info["warning"] = (f"{m.__name__} is not a conda package or was not installed with conda. "
+                                   "Cannot find all shared libraries.")
+        info["count"] = len(libraries)
+
+    with timed(m.__name__, "tar_libraries") as info:
+        library_buffer = io.BytesIO()
+        with tarfile.open(fileobj=library_buffer, mode="w|") as f:
+            for path, _ in libraries:
+                f.add(path, arcname=os.path.basename(path))
+
+        # Convert to string so can easily serialize
+        library_bytes = library_buffer.getvalue()
+        library_buffer.close()
+        info["bytes"] = len(library_bytes)
+
+    package = {
+        "module": module_bytes,
+        "libraries": library_bytes,
+        "manifest": manifest,
+        "version": _manifest_version(manifest),
+        "libraries_hash": hashlib.sha256(library_bytes).hexdigest(),
+    }
+    if method == "zip":
+        package["format"] = "zip"
+    if shard_archives is not None:
+        package["shards"] = shard_archives
+    if base is not None:
+        # Delta against the previous version, workers without it fetch the base first
+        package["base"] = base["proxy"]
+        package["base_version"] = base["version"]
+        package["deleted"] = sorted(set(base["manifest"]) - set(manifest))
+        if package["libraries_hash"] == base["libraries_hash"]:
+            package["libraries"] = b""
+    return package
 
 def load_config(config: Optional[Union[dict[str, Any], str]] = None):
     if config is None or type(config) == str:
@@ -78,58 +251,447 @@ def create_store_from_config(ps_config: dict[str, Any]) -> Store:
 
     return store
 
+def _record_path(module_name: str, config: dict[str, Any]) -> Optional[Path]:
+    if config.get("manifest_dir") is None:
+        return None
+    return Path(config["manifest_dir"]).expanduser() / f"{module_name}.pkl"
+
+def _load_record(module_name: str, config: dict[str, Any], store: Store) -> Optional[dict[str, Any]]:
+    """ Finds the last stored version of a module, in this process or from a previous driver"""
+    record = package_records.get(module_name)
+    path = _record_path(module_name, config)
+    if record is None and path is not None and path.exists():
+        try:
+            with open(path, "rb") as fp:
+                record = pickle.load(fp)
+        except Exception:
+            record = None
+
+    # The store may have been cleared since the record was written
+    if record is not None and not store.exists(record["proxy"].__factory__.key):
+        record = None
+    return record
+
+def _save_record(module_name: str, record: dict[str, Any], config: dict[str, Any]) -> None:
+    package_records[module_name] = record
+    path = _record_path(module_name, config)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fp:
+            pickle.dump(record, fp)
+
+def _store_package(module_name: str,
+                   module: ModuleType,
+                   store: Store,
+                   config: dict[str, Any],
+                   transport: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """ Stores a module, reusing or building on the last stored version when possible.
+    The module is stored as a tar archive, unless transport (see _choose_transport) says otherwise.
+    """
+    method = transport["method"] if transport is not None else "tar"
+    editable = _is_editable(module)
+    with timed(module_name, "hash") as info:
+        manifest = _hash_module(_module_path(module))
+        info["files"] = len(manifest)
+    version = _manifest_version(manifest)
+
+    record = _load_record(module_name, config, store)
+    if record is not None and record["version"] == version and record.get("method", "tar") == method:
+        package_records[module_name] = record
+        return record
+
+    base = None
+    if method == "tar" and record is not None and record.get("method", "tar") == "tar" and record["depth"] < config.get("max_delta_chain", 8):
+        base = record
+
+    module_tar = _serialize_module(module, manifest=manifest, base=base, editable=editable,
+                                   method=method, shards=transport["shards"] if transport is not None else 1)
+    package_bytes = len(module_tar["module"]) + len(module_tar["libraries"]) + sum(len(shard) for shard in module_tar.get("shards", []))
+    with timed(module_name, "store") as info:
+        if "shards" in module_tar:
+            # Stored on their own, so workers fetch them in parallel
+            module_tar["shards"] = [store.proxy(shard) for shard in module_tar["shards"]]
+            module_tar["parallel_fetches"] = (ENDPOINT_DEFAULTS | config["endpoint"])["parallel_fetches"]
+        proxy = store.proxy(module_tar)
+        info["delta"] = base is not None
+
+    record = {
+        "version": version,
+        "manifest": manifest,
+        "libraries_hash": module_tar["libraries_hash"],
+        "depth": base["depth"] + 1 if base is not None else 0,
+        "editable": editable,
+        "bytes": package_bytes,
+        "method": method,
+        "transport": transport,
+        "proxy": proxy,
+    }
+    _save_record(module_name, record, config)
+    return record
+
 # Create a global cached of proxied modules
 proxied_modules = {}
-def store_modules(modules: str | list, trace: bool = True, config: Optional[Union[dict[str, Any], str]] = None) -> dict[str, Proxy]:
+# Versions of the stored modules, used to only ship changed files
+package_records = {}
+# Packages imported by each traced package, in the order they are imported
+package_dependencies = {}
+# How each package was last shipped, and why (see proxy_transport)
+package_transports = {}
+# Packages workers imported from outside the package path, and where from (see
+# proxy_misses). Added to the next store_modules call.
+reported_misses = {}
+# Packages skipped on purpose, and why: installed on the target, or cheaper to import
+# from the shared filesystem. Workers import these from elsewhere without reporting a miss.
+skipped_modules = {}
+# Lines of miss logs that were already folded, by path
+_miss_log_offsets = {}
+# Guards the caches above, modules may be stored from a background thread
+_store_lock = threading.RLock()
+
+_packaging_pool = None
+def get_packaging_pool() -> ThreadPoolExecutor:
+    """Thread used to package modules in the background. Packaging is serialized on one
+    thread because it imports modules and shares the caches of stored modules.
+    """
+    global _packaging_pool
+    with _store_lock:
+        if _packaging_pool is None:
+            _packaging_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="proxy-imports-packaging")
+        return _packaging_pool
+
+def _spec_path(module_name: str) -> Optional[str]:
+    """Path of the file or directory of a module, found without importing it"""
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None:
+        return None
+
+    if spec.submodule_search_locations:
+        return list(spec.submodule_search_locations)[0]
+    elif spec.origin is not None and os.path.isfile(spec.origin):
+        return spec.origin
+    return None
+
+def _estimate_size(module_name: str) -> Optional[int]:
+    """Size of the files of a module on disk, found without importing it"""
+    module_path = _spec_path(module_name)
+    if module_path is None:
+        return None
+    if os.path.isfile(module_path):
+        return os.path.getsize(module_path)
+
+    size = 0
+    for dirpath, _, filenames in os.walk(module_path):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+    return size
+
+def trace_imports(modules: list[str], import_time: bool = False) -> dict[str, Any]:
+    """Runs the import tracer on modules. Returns the packages they import, in import
+    order, the packages imported by each package, and with import_time, the time to
+    import each package in seconds (including the packages it imports first).
+    """
+    # The tracer of this package, run as a script so importing proxy_imports does not
+    # pollute the trace, and with the interpreter of the driver
+    args = [sys.executable, os.path.join(os.path.dirname(__file__), "import_tracer.py"), "--json"] + modules
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{sys.path[0]}:{env.get('PYTHONPATH', '')}"
+    if import_time:
+        env["PYTHONPROFILEIMPORTTIME"] = "1"
+    # Run as a subprocess to collect full depedencies without messing with module cache
+    completed = subprocess.run(
+            args,
+            env=env,
+            capture_output=True, 
+            text=True
+        )
+    traced = {"packages": [], "dependencies": dict()}
+    if completed.stdout.strip():
+        traced = json.loads(completed.stdout)
+
+    if import_time:
+        traced["import_seconds"] = _package_import_times(completed.stderr)
+    return traced
+
+def _package_import_times(importtime: str) -> dict[str, float]:
+    """Import time of each top level package from the output of -X importtime. Modules
+    are listed after the modules they import, indented by their depth. The time of a
+    package adds up its modules that are not imported by the package itself.
+    """
+    times = dict()
+    importers = [] # Packages of the modules importing the current one, outermost first
+    lines = [line for line in importtime.splitlines() if line.startswith("import time:")]
+    for line in reversed(lines):
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        package = name.strip().partition('.')[0]
+        del importers[depth:]
+        if package not in importers:
+            times[package] = times.get(package, 0.0) + int(cumulative) / 1e6
+        importers.append(package)
+    return times
+
+def _choose_transport(module_name: str, module_path: Optional[str], config: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """How to ship a module, None without an "endpoint" in the config (see proxy_transport)"""
+    if config.get("endpoint") is None or module_path is None:
+        return None
+    with timed(module_name, "choose_transport") as info:
+        transport = choose_transport(package_stats(module_path), config["endpoint"])
+        info["method"] = transport["method"]
+        info["reason"] = transport["reason"]
+    package_transports[module_name] = transport
+    return transport
+
+def store_modules(modules: str | list,
+                  trace: bool = True,
+                  config: Optional[Union[dict[str, Any], str]] = None,
+                  dry_run: bool = False,
+                  report: bool = False) -> dict[str, Proxy]:
     """Reads module and proxies it into the FileStore, including the
     dependencies if requested. This is a best effort approach. If a 
     specific submodule is needed, pass that into this function for more
     accurate dependency resolution.
 
+    Modules under development (editable installs or source trees) are hashed
+    again on every call. If their files changed, only the changed files are
+    stored, and workers holding the previous version update it in place. Set
+    "manifest_dir" in the config to keep the versions across driver processes.
+
+    If the config has a "target_environment" (see proxy_environment), modules
+    whose distribution is installed with the same version on the target are skipped.
+
+    If the config has an "endpoint" (see proxy_transport), each module is shipped the
+    way that is estimated to be the cheapest: skipped (imported from the shared
+    filesystem), as a tar archive, as a zip file or in shards. The decisions and
+    their reasons are kept in package_transports, and in the report of a dry run
+    or with report=True.
+
+    Packages that workers reported importing from the shared filesystem (see
+    fold_misses) are added to the modules of the next call.
+
     Args:
         module_name (str): the module to proxy.
         trace (bool): try to determine and include necessary dependents. 
+        dry_run (bool): do not store anything, instead return a report of what
+            would be shipped or skipped (and why) for every module.
+        report (bool): return a tuple of the proxies and the report of what was
+            shipped or skipped (and why) for every module, as with dry_run.
     """
     config = load_config(config)
     store = create_store_from_config(config["module_store_config"])
+    target = load_target_environment(config)
 
     if type(modules) != list:
         modules = [modules]
 
+    with _store_lock:
+        misses = {name: origin for name, origin in reported_misses.items() if name not in modules}
+        if not dry_run:
+            reported_misses.clear()
+    for name, origin in misses.items():
+        record_event(name, "fold_miss", time.time(), 0.0, origin=origin)
+    modules = modules + list(misses)
+
     if trace:
-        args = ["import_tracer.py"] + modules
-        env = os.environ.copy()
-        env["PYTHONPATH"] = f"{sys.path[0]}:{env.get('PYTHONPATH', '')}"
-        # Run as a subprocess to collect full depedencies without messing with module cache
-        completed = subprocess.run(
-                args,
-                env=env,
-                capture_output=True, 
-                text=True
-            )
-        modules = completed.stdout.split("\n")[:-1]
+        traced = trace_imports(modules)
+        modules = traced["packages"]
+        with _store_lock:
+            package_dependencies.update(traced["dependencies"])
+
+    with _store_lock:
+        results, decisions = _store_modules(modules, store, target, config, dry_run)
+    if dry_run:
+        return decisions
+    if report:
+        return results, decisions
+    return results
 
+def _store_modules(modules: list[str],
+                   store: Store,
+                   target: Optional[dict[str, Any]],
+                   config: dict[str, Any],
+                   dry_run: bool) -> tuple[dict[str, Proxy], dict[str, Any]]:
+    """Stores the modules that are not stored yet. Returns the proxies of the shipped
+    modules and the report of what was shipped or skipped (and why) for every module."""
     results = dict()
+    report = dict()
     for module_name in modules:
-        if module_name not in proxied_modules:
+        record = package_records.get(module_name)
+        if module_name not in proxied_modules or record is None or record["editable"]:
             if module_name in sys.builtin_module_names or module_name in sys.stdlib_module_names:
-                print(f"Built in or standard module {module_name} skipped")
+                record_event(module_name, "skip", time.time(), 0.0, reason="built in or standard module")
+                report[module_name] = {"action": "skip", "reason": "built in or standard module"}
+                continue
+
+            provided = satisfied_on_target(module_name, target) if target is not None else None
+            if provided is not None:
+                record_event(module_name, "skip", time.time(), 0.0, reason=f"{provided} installed on target")
+                report[module_name] = {"action": "skip", "reason": f"{provided} installed on target"}
+                if not dry_run:
+                    skipped_modules[module_name] = f"{provided} installed on target"
+                continue
+
+            if dry_run:
+                reason = "not installed on target" if target is not None else "not a standard module"
+                report[module_name] = {"action": "ship", "reason": reason, "bytes": _estimate_size(module_name)}
+                transport = _choose_transport(module_name, _spec_path(module_name), config)
+                if transport is not None:
+                    report[module_name] |= {
+                        "action": "skip" if transport["method"] == "skip" else "ship",
+                        "reason": transport["reason"],
+                        "method": transport["method"],
+                        "estimates": transport["estimates"],
+                    }
                 continue
 
             try:
-                module = importlib.import_module(module_name)
+                with timed(module_name, "import"):
+                    module = importlib.import_module(module_name)
             except:
-                print(f"Could not import {module_name}, skipping")
+                record_event(module_name, "skip", time.time(), 0.0, reason="could not import", error=repr(sys.exc_info()[1]))
+                report[module_name] = {"action": "skip", "reason": "could not import"}
+                continue
+
+            transport = _choose_transport(module_name, _module_path(module), config)
+            if transport is not None and transport["method"] == "skip":
+                record_event(module_name, "skip", time.time(), 0.0, reason=transport["reason"])
+                skipped_modules[module_name] = transport["reason"]
+                report[module_name] = {"action": "skip", "reason": transport["reason"], "method": "skip"}
+                continue
+            proxied_modules[module_name] = _store_package(module_name, module, store, config, transport)["proxy"]
+            skipped_modules.pop(module_name, None)
+            report[module_name] = {"action": "ship", "reason": "not installed on target" if target is not None else "not a standard module"}
+            if transport is not None:
+                report[module_name] |= {"reason": transport["reason"], "method": transport["method"]}
+        else:
+            report[module_name] = {"action": "ship", "reason": "already stored", "bytes": 0}
+            if dry_run:
                 continue
-            module_tar = _serialize_module(module)
-            proxied_modules[module_name] = store.proxy(module_tar)
 
         results[module_name] = proxied_modules[module_name]
-    return results
 
+    return results, report
+
+def fold_misses(source: Union[dict[str, Any], list, str]) -> list[str]:
+    """Adds the packages that workers imported from outside the package path (see
+    proxy_misses) to the next store_modules call, i.e. the next transformed function.
+
+    Args:
+        source: timing report returned by a transformed function with timing=True, a
+            list of them, or the path of the "log" of report_misses. Only the lines
+            added since the last call are read from a log.
+
+    Returns:
+        The packages that were added. Packages that store_modules skipped on purpose
+        are not added again.
+    """
+    if isinstance(source, list):
+        added = dict()
+        for item in source:
+            added |= dict.fromkeys(fold_misses(item))
+        return list(added)
+
+    misses = dict()
+    if isinstance(source, str):
+        path = os.path.expanduser(source)
+        with _store_lock:
+            offset = _miss_log_offsets.get(path, 0)
+        try:
+            with open(path, "rb") as fp:
+                fp.seek(offset)
+                for line in fp:
+                    if not line.endswith(b"\n"):
+                        # Still being written, read on the next call
+                        break
+                    miss = json.loads(line)
+                    misses[miss["package"]] = miss["origin"]
+                    offset += len(line)
+        except FileNotFoundError:
+            return []
+        with _store_lock:
+            _miss_log_offsets[path] = offset
+    else:
+        for event in source["events"]:
+            if event["stage"] == "miss":
+                misses[event["package"]] = event["origin"]
+
+    with _store_lock:
+        misses = {name: origin for name, origin in misses.items() if name not in skipped_modules}
+        reported_misses.update(misses)
+    return list(misses)
+
+def fetch_policies(module_names: list[str], config: dict[str, Any]) -> dict[str, str]:
+    """Fetch policy of each stored module (see ProxyImporter). Policies set in the
+    "fetch_policy" entry of the config are kept, other modules are fetched lazily if
+    they are larger than "lazy_threshold" bytes, and eagerly otherwise.
+    """
+    overrides = config.get("fetch_policy") or dict()
+    threshold = config.get("lazy_threshold")
+    policies = dict()
+    for module_name in module_names:
+        if module_name in overrides:
+            policies[module_name] = overrides[module_name]
+            continue
+        size = package_records.get(module_name, dict()).get("bytes")
+        if threshold is not None and size is not None and size > threshold:
+            policies[module_name] = "lazy"
+        else:
+            policies[module_name] = "eager"
+    return policies
+
+async def store_modules_async(modules: str | list,
+                              trace: bool = True,
+                              config: Optional[Union[dict[str, Any], str]] = None,
+                              dry_run: bool = False,
+                              report: bool = False) -> dict[str, Proxy]:
+    """Asynchronous version of `store_modules` for asyncio based drivers. Packaging
+    runs on the packaging thread, so the event loop is not blocked.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+            get_packaging_pool(),
+            functools.partial(store_modules, modules, trace=trace, config=config, dry_run=dry_run, report=report)
+        )
+
+
+def critical_path_order(imports: list[str], dependencies: dict[str, list[str]]) -> list[str]:
+    """Orders packages by when a task needs them: each package imported by the task, in
+    the order of the import statements, followed by the packages it imports itself
+    (recursively, in the order it imports them).
+    """
+    order = dict()
+    def visit(name: str):
+        if name in order:
+            return
+        order[name] = None
+        for dependency in dependencies.get(name, []):
+            visit(dependency)
+    for name in imports:
+        visit(name)
+    return list(order)
 
 def analyze_func_and_create_proxies(func, config: Optional[Union[dict[str, Any], str]] = None):
+    """Stores the packages imported by func. The proxies are returned in the order the
+    task needs the packages (see critical_path_order), which is the order workers fetch
+    them in.
+    """
     config = load_config(config)
+    imports = function_imports(func)
+    proxies = store_modules(imports, config=config)
+    with _store_lock:
+        order = critical_path_order(imports, package_dependencies)
+    ordered = {name: proxies[name] for name in order if name in proxies}
+    return ordered | proxies
+
+def function_imports(func) -> list[str]:
+    """Packages imported by func, in the order it imports them"""
     def _strip_dots(pkg):
         if pkg.startswith('.'):
             raise ImportError('On {}, imports from the current module are not supported'.format(pkg))
@@ -138,19 +700,21 @@ def analyze_func_and_create_proxies(func, config: Optional[Union[dict[str, Any],
     src = inspect.getsource(func)
     code = ast.parse(src)
     
+    # The module of the function is imported first, when the function is loaded on the worker
+    imports = dict()
+    func_module = inspect.getmodule(func)
+    if func_module and func_module.__name__ != "__main__":
+        imports[_strip_dots(func_module.__name__)] = None
+
     # Adapted from: https://github.com/cooperative-computing-lab/cctools/blob/master/poncho/src/poncho/package_analyze.py
-    imports = set()
-    for stmt in ast.walk(code):
+    # ast.walk is breadth first, sort the statements to get the order they are executed in
+    statements = [stmt for stmt in ast.walk(code) if isinstance(stmt, (ast.Import, ast.ImportFrom))]
+    for stmt in sorted(statements, key=lambda stmt: (stmt.lineno, stmt.col_offset)):
         if isinstance(stmt, ast.Import):
             for a in stmt.names:
-                imports.add(_strip_dots(a.name))
+                imports[_strip_dots(a.name)] = None
         elif isinstance(stmt, ast.ImportFrom):
             if stmt.level != 0:
                 raise ImportError('On {}, imports from the current module are not supported'.format(stmt.module or '.'))
-            imports.add(_strip_dots(stmt.module))
-
-    func_module = inspect.getmodule(func)
-    if func_module and func_module.__name__ != "__main__":
-        imports.add(_strip_dots(func_module.__name__))
-    
-    return store_modules(list(imports), config=config)
+            imports[_strip_dots(stmt.module)] = None
+    return list(imports)
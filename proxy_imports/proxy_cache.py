@@ -0,0 +1,165 @@
+"""Tiered cache of the packages read from the module store.
+
+Packages are looked up in this process, then in a node local directory (i.e. on
+/dev/shm), and only then fetched from the module store (or from peers). Workers
+that restart, and new jobs on the same node, find the packages in the node local
+directory instead of reading them from the shared filesystem again.
+
+Blobs are keyed by the id of the stored object. Stored objects are never
+modified, so a cached blob can not go stale, and unchanged packages keep their
+stored object across driver sessions (see "manifest_dir").
+
+Configured with the "blob_cache" entry of the configuration:
+
+    "blob_cache": {
+        "directory": "/dev/shm/proxy-imports-blobs", # Node local tier, no node local tier if None
+        "memory": 0,                                 # Bytes kept in the process, none by default
+        "disk": 2**32,                               # Bytes kept in the node local directory, None for no limit
+    }
+
+A package is extracted once per process, so the blobs kept in the process are
+rarely read again, unless several importers of the process share packages. The
+memory tier is disabled by default, each worker would hold blobs it already
+extracted. The node local directory is shared by all the processes of the node,
+and usually lives in memory. When it holds more than "disk" bytes, the blobs that were least
+recently used (by modification time, refreshed on every hit) are deleted.
+"""
+from collections import OrderedDict
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Optional
+
+class BlobCache:
+    def __init__(self, directory: Optional[str] = None, memory: int = 0, disk: Optional[int] = 2**32):
+        self.directory = Path(directory).expanduser() if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.memory_limit = memory
+        self.disk_limit = disk
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_evictions": 0}
+
+    def _count(self, counter: str) -> None:
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _remember(self, blob_id: str, data: bytes) -> None:
+        """Keeps the blob in memory, evicting the least recently used ones"""
+        if len(data) > self.memory_limit:
+            return
+        with self.lock:
+            if blob_id in self.memory:
+                return
+            self.memory[blob_id] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.memory_limit:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _read_disk(self, blob_id: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+        path = self.directory / blob_id
+        try:
+            data = path.read_bytes()
+            # Recently used, evicted last
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write_disk(self, blob_id: str, data: bytes) -> None:
+        if self.directory is None:
+            return
+        if self.disk_limit is not None and len(data) > self.disk_limit:
+            return
+        # Written under a temporary name, so other processes never read a partial blob
+        partial = self.directory / f"{blob_id}.{os.getpid()}.{threading.get_ident()}.partial"
+        partial.write_bytes(data)
+        os.replace(partial, self.directory / blob_id)
+        if self.disk_limit is not None:
+            self._evict_disk(blob_id)
+
+    def _evict_disk(self, keep: str) -> None:
+        """Deletes the least recently used blobs of the directory until it is within the
+        limit. Other processes may evict the same blobs, or still read them: a deleted
+        file stays readable by the processes that opened it.
+        """
+        blobs = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(".partial"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs, key=lambda blob: blob[0]):
+            if total <= self.disk_limit:
+                break
+            if path.name == keep:
+                continue
+            try:
+                path.unlink()
+                self._count("disk_evictions")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def contains(self, blob_id: str) -> bool:
+        """Whether the blob is in this process or on the node"""
+        with self.lock:
+            if blob_id in self.memory:
+                return True
+        return self.directory is not None and (self.directory / blob_id).exists()
+
+    def get(self, blob_id: str, fetch: Callable[[], tuple[bytes, str]]) -> tuple[bytes, str]:
+        """Returns the blob and the tier it was found in ("memory" or "disk"). On a miss,
+        the blob is fetched with fetch, which returns the blob and where it came from.
+        """
+        with self.lock:
+            data = self.memory.get(blob_id)
+            if data is not None:
+                self.memory.move_to_end(blob_id)
+                self.counters["memory_hits"] += 1
+                return data, "memory"
+
+        data = self._read_disk(blob_id)
+        if data is not None:
+            self._count("disk_hits")
+            source = "disk"
+        else:
+            self._count("misses")
+            data, source = fetch()
+            self._write_disk(blob_id, data)
+        self._remember(blob_id, data)
+        return data, source
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return self.counters | {
+                "memory_bytes": self.memory_bytes,
+                "directory": str(self.directory) if self.directory is not None else None,
+            }
+
+_caches: dict[tuple[Optional[str], int, Optional[int]], BlobCache] = dict()
+_caches_lock = threading.Lock()
+def get_blob_cache(config: Optional[dict[str, Any]]) -> Optional[BlobCache]:
+    """Cache of this process for a "blob_cache" configuration, None if not configured"""
+    if config is None:
+        return None
+    key = (config.get("directory"), config.get("memory", 0), config.get("disk", 2**32))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = BlobCache(*key)
+        return _caches[key]
+
+def get_cache_stats() -> list[dict[str, Any]]:
+    """Hit and miss counters of the caches of this process"""
+    with _caches_lock:
+        return [cache.stats() for cache in _caches.values()]
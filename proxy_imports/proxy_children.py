@@ -0,0 +1,137 @@
+"""Making the extracted packages available to processes started by tasks.
+
+Tasks that use joblib/loky or multiprocessing (i.e. `n_jobs=-1`) start new
+interpreters, which don't have the ProxyImporter of the task. Without it, they
+import the packages from the shared filesystem again, or fail. With
+child_processes enabled, the importer adds a generated sitecustomize and the
+package path to PYTHONPATH (and the shared libraries to LD_LIBRARY_PATH). New
+interpreters started by the process then import the packages already extracted
+on the node, and wait for the ones that are still being extracted, without
+fetching anything. If a package is not extracted within EXTRACTION_WAIT_TIMEOUT
+(i.e. the parent failed or died), it is imported as if the finder was not there.
+
+Python only runs the first sitecustomize on the path, so the generated one runs
+the next one on the path (i.e. of the environment) after it.
+
+This module is loaded by file in the child processes, so it must only import
+the standard library.
+"""
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import json
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Optional
+import warnings
+import zipimport
+
+ENVIRONMENT_VARIABLE = "PROXY_IMPORTS_CHILDREN"
+
+# Longest time a child waits for a package of the parent to be extracted, in seconds
+EXTRACTION_WAIT_TIMEOUT = 60.0
+
+SITECUSTOMIZE = """# Generated by proxy_imports, see proxy_imports/proxy_children.py
+import importlib.util
+_spec = importlib.util.spec_from_file_location("_proxy_imports_children", {path!r})
+_children = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_children)
+_children.activate()
+_children.run_next_sitecustomize(__file__)
+"""
+
+class ExtractionFinder(importlib.abc.MetaPathFinder):
+    """Waits until a package of the parent is extracted before it is imported from the
+    package path. Other packages are imported as usual.
+    """
+
+    def __init__(self, package_path: str, packages: dict[str, str], timeout: Optional[float] = None):
+        self.package_path = package_path
+        self.packages = packages
+        self.timeout = EXTRACTION_WAIT_TIMEOUT if timeout is None else timeout
+
+    def find_spec(self, fullname, path=None, target=None):
+        package = fullname.partition('.')[0]
+        proxy_id = self.packages.pop(package, None)
+        if proxy_id is not None:
+            finished_file = Path(f"{self.package_path}/{package}-{proxy_id}_done.tmp")
+            start, tic = time.time(), time.perf_counter()
+            while not finished_file.exists():
+                if time.perf_counter() - tic > self.timeout:
+                    _record_timeout(package, start, time.perf_counter() - tic, self.timeout)
+                    return None
+                time.sleep(0.05)
+
+            # Packages shipped as zip files are not on the path
+            zip_path = f"{self.package_path}/{package}.zip"
+            if fullname == package and os.path.isfile(zip_path):
+                return zipimport.zipimporter(zip_path).find_spec(package)
+        return None
+
+def _record_timeout(package: str, start: float, duration: float, timeout: float) -> None:
+    # A timing event if the child uses proxy_imports itself, importing it here would load
+    # it in every child
+    timing = sys.modules.get("proxy_imports.proxy_timing")
+    if timing is not None:
+        timing.record_event(package, "extraction_wait_timeout", start, duration, timeout=timeout)
+    else:
+        warnings.warn(f"{package} was not extracted by the parent process within {timeout} seconds, "
+                      "importing it from the path")
+
+def activate() -> None:
+    """Adds the finder for the packages of the parent process, called by the generated
+    sitecustomize"""
+    settings = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not settings:
+        return
+    settings = json.loads(settings)
+    if settings["package_path"] not in sys.path:
+        sys.path.insert(0, settings["package_path"])
+    sys.meta_path.insert(0, ExtractionFinder(settings["package_path"], settings["packages"], settings.get("timeout")))
+
+def run_next_sitecustomize(current: str) -> None:
+    """Runs the sitecustomize that the generated one shadows, if any"""
+    directory = os.path.dirname(os.path.abspath(current))
+    path = [entry for entry in sys.path if os.path.abspath(entry or ".") != directory]
+    spec = importlib.machinery.PathFinder.find_spec("sitecustomize", path)
+    if spec is None:
+        return
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["sitecustomize"] = module
+    spec.loader.exec_module(module)
+
+def _prepend(variable: str, entries: list[str]) -> None:
+    current = [entry for entry in os.environ.get(variable, "").split(os.pathsep) if entry and entry not in entries]
+    os.environ[variable] = os.pathsep.join(entries + current)
+
+def propagate(package_path: str, packages: dict[str, str]) -> None:
+    """Sets up the environment of this process so the processes it starts find the
+    packages extracted in package_path.
+
+    Args:
+        package_path (str): node local directory the packages are extracted to.
+        packages (dict): id of the stored object of each package, by package name. Only
+            packages that are being fetched, children wait until they are extracted.
+    """
+    directory = Path(package_path, ".children")
+    directory.mkdir(parents=True, exist_ok=True)
+    sitecustomize = directory / "sitecustomize.py"
+    content = SITECUSTOMIZE.format(path=os.path.abspath(__file__))
+    if not sitecustomize.exists() or sitecustomize.read_text() != content:
+        # Other workers on the node may be starting a child from it
+        partial = directory / f"sitecustomize.{os.getpid()}.partial"
+        partial.write_text(content)
+        os.replace(partial, sitecustomize)
+
+    # Merged with the packages of other importers in this process
+    settings: dict[str, Any] = json.loads(os.environ.get(ENVIRONMENT_VARIABLE) or '{"packages": {}}')
+    if settings.get("package_path", package_path) != package_path:
+        settings["packages"] = dict()
+    settings["package_path"] = package_path
+    settings["packages"].update(packages)
+    os.environ[ENVIRONMENT_VARIABLE] = json.dumps(settings)
+
+    _prepend("PYTHONPATH", [str(directory), package_path])
+    _prepend("LD_LIBRARY_PATH", [os.path.join(package_path, "libraries")])
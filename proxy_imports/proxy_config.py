@@ -1,4 +1,3 @@
-import argparse
 import pathlib
 from string import Template
 from typing import Optional, Any
@@ -0,0 +1,148 @@
+"""Cost of proxying each package a function or module list needs.
+
+Reports, for every traced package: the size of its archive and of its shared
+libraries, the number of files, the time to import it (from the tracer, in a
+clean interpreter) and an estimate of the time to extract it on a worker,
+measured by extracting the archive on this machine. Packages that are in the
+standard library are left out, packages installed on the target environment
+(see proxy_environment) are marked.
+
+    $ proxy-imports-analyze numpy scipy
+    $ proxy-imports-analyze --function mymodule:train_model --json costs.json
+"""
+import importlib
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Any, Optional, Union
+
+from .proxy_analyze import _module_path, _serialize_module, function_imports, load_config, trace_imports
+from .proxy_environment import load_target_environment, satisfied_on_target
+from .proxy_transport import choose_transport, package_stats
+
+def _extract_seconds(archive: bytes) -> float:
+    with tempfile.TemporaryDirectory(prefix="proxy-imports-costs-") as directory:
+        tic = time.perf_counter()
+        with tarfile.open(fileobj=io.BytesIO(archive), mode="r") as f:
+            f.extractall(path=directory)
+        return time.perf_counter() - tic
+
+def _library_bytes(libraries: bytes) -> int:
+    """Size of the shared libraries in the archive of the libraries"""
+    with tarfile.open(fileobj=io.BytesIO(libraries), mode="r") as f:
+        return sum(member.size for member in f.getmembers())
+
+def package_costs(modules: list[str], config: Optional[Union[dict[str, Any], str]] = None) -> list[dict[str, Any]]:
+    """Cost of every package imported by modules, in the order they are imported.
+
+    Args:
+        modules (list): modules to trace, i.e. the packages a function imports.
+        config (dict): configuration (or its path), used for "target_environment" and
+            "endpoint". Without an endpoint, the way each package would be shipped
+            (see proxy_transport) is not reported.
+    """
+    config = load_config(config) if config is not None else dict()
+    target = load_target_environment(config)
+    traced = trace_imports(modules, import_time=True)
+
+    costs = []
+    for name in traced["packages"]:
+        if name in sys.builtin_module_names or name in sys.stdlib_module_names:
+            continue
+        cost = {
+            "package": name,
+            "import_seconds": traced["import_seconds"].get(name),
+            "on_target": satisfied_on_target(name, target) if target is not None else None,
+        }
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            # i.e. optional imports tried by other packages
+            print(f"Could not import {name}, skipping")
+            continue
+        try:
+            serialized = _serialize_module(module)
+        except Exception as e:
+            print(f"Could not package {name}: {e!r}")
+            costs.append(cost | {"error": repr(e)})
+            continue
+
+        cost |= {
+            "archive_bytes": len(serialized["module"]),
+            "files": len(serialized["manifest"]),
+            "library_bytes": _library_bytes(serialized["libraries"]),
+            "extract_seconds": _extract_seconds(serialized["module"]),
+        }
+        if config.get("endpoint") is not None:
+            transport = choose_transport(package_stats(_module_path(module)), config["endpoint"])
+            cost |= {"method": transport["method"], "reason": transport["reason"]}
+        costs.append(cost)
+    return costs
+
+def format_table(costs: list[dict[str, Any]]) -> str:
+    """Table of the costs, largest archives first"""
+    def value(cost, key, scale, digits):
+        return "-" if cost.get(key) is None else f"{cost[key] / scale:.{digits}f}"
+
+    with_method = any("method" in cost for cost in costs)
+    rows = [["package", "archive MB", "files", "libraries MB", "import s", "extract s", "on target"] + (["method"] if with_method else [])]
+    for cost in sorted(costs, key=lambda cost: cost.get("archive_bytes") or 0, reverse=True):
+        rows.append([
+            cost["package"],
+            value(cost, "archive_bytes", 2**20, 2),
+            str(cost.get("files", "-")),
+            value(cost, "library_bytes", 2**20, 2),
+            value(cost, "import_seconds", 1, 3),
+            value(cost, "extract_seconds", 1, 3),
+            cost.get("on_target") or "-",
+        ] + ([cost.get("method", "-")] if with_method else []))
+    rows.append([
+        "total",
+        f"{sum(cost.get('archive_bytes', 0) for cost in costs) / 2**20:.2f}",
+        str(sum(cost.get("files", 0) for cost in costs)),
+        f"{sum(cost.get('library_bytes', 0) for cost in costs) / 2**20:.2f}",
+        "", f"{sum(cost.get('extract_seconds', 0) for cost in costs):.3f}", "",
+    ] + ([""] if with_method else []))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths))).rstrip()
+                     for row in rows)
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser("proxy-imports-analyze", description="Report the cost of proxying the packages a function or modules need")
+    parser.add_argument("modules", nargs="*", help="Modules to trace")
+    parser.add_argument("-f", "--function", action="append", default=[], help="Function to trace the imports of, as module:function")
+    parser.add_argument("-c", "--config", default=None, help="Configuration file, for the target environment and endpoint")
+    parser.add_argument("--json", default=None, help="Write the report as JSON to this file, - for stdout")
+    opts = parser.parse_args()
+
+    modules = list(opts.modules)
+    # Console scripts don't have the working directory on the path
+    if opts.function and os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    for function in opts.function:
+        module_name, _, qualname = function.partition(":")
+        func = importlib.import_module(module_name)
+        for attribute in qualname.split("."):
+            func = getattr(func, attribute)
+        modules.extend(name for name in function_imports(func) if name not in modules)
+    if not modules:
+        parser.error("Give modules or a function to analyze")
+
+    costs = package_costs(modules, opts.config)
+    if opts.json == "-":
+        print(json.dumps(costs, indent=2))
+        return
+    print(format_table(costs))
+    if opts.json is not None:
+        with open(opts.json, "w") as fp:
+            json.dump(costs, fp, indent=2)
+
+if __name__ == "__main__":
+    main()
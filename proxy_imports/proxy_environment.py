@@ -0,0 +1,105 @@
+"""Description of the python environment available on a target endpoint.
+
+Packages whose distribution is installed with the same version on the target
+do not need to be shipped, as long as the target runs the same Python version
+(major and minor) and, for distributions with compiled extensions, the same
+ABI. Descriptions written by hand can leave out "python" and "abi", which are
+then not checked. The description of the target can be written by
+hand, or collected once by running `probe_environment` as a task on the
+endpoint and saving the result with `save_environment`.
+"""
+import functools
+import importlib.machinery
+import importlib.metadata
+import json
+import pathlib
+import platform
+import re
+import sysconfig
+from typing import Any, Optional
+
+def _normalize(name: str) -> str:
+    """Normalized distribution name (PEP 503), so "Scikit_Learn" matches "scikit-learn" """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def probe_environment() -> dict[str, Any]:
+    """Collects the distributions installed in the current environment.
+    Meant to be run as a task on the target endpoint.
+    """
+    distributions = dict()
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            distributions[_normalize(name)] = dist.version
+    return {
+        "python": platform.python_version(),
+        "abi": sysconfig.get_config_var("SOABI"),
+        "distributions": distributions,
+    }
+
+def save_environment(environment: dict[str, Any], path: str) -> None:
+    path = pathlib.Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(environment, indent=2, sort_keys=True))
+
+@functools.cache
+def _read_environment(path: str) -> dict[str, Any]:
+    return json.loads(pathlib.Path(path).expanduser().read_text())
+
+def load_target_environment(config: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """Returns the target environment from the config. The "target_environment" entry
+    can be the environment itself or the path of a file written by `save_environment`.
+    """
+    environment = config.get("target_environment")
+    if environment is None or isinstance(environment, dict):
+        return environment
+    return _read_environment(str(environment))
+
+@functools.cache
+def _packages_distributions() -> dict[str, list[str]]:
+    return importlib.metadata.packages_distributions()
+
+def local_distributions(module_name: str) -> dict[str, str]:
+    """Distributions (and their versions) that provide a top level module locally"""
+    distributions = dict()
+    for dist_name in _packages_distributions().get(module_name.partition('.')[0], []):
+        try:
+            distributions[_normalize(dist_name)] = importlib.metadata.version(dist_name)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+    return distributions
+
+@functools.cache
+def _compiled(dist_name: str) -> bool:
+    """Whether a distribution installed locally contains extension modules"""
+    try:
+        files = importlib.metadata.distribution(dist_name).files or []
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    return any(str(f).endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES)) for f in files)
+
+def _same_python(target: dict[str, Any]) -> bool:
+    """Whether the target runs the same major and minor Python version as this process"""
+    python = target.get("python")
+    return python is None or python.split(".")[:2] == platform.python_version().split(".")[:2]
+
+def satisfied_on_target(module_name: str, target: dict[str, Any]) -> Optional[str]:
+    """Checks if the target already has the same version of the distribution providing a
+    module, for the same Python version, and the same ABI if the distribution is compiled.
+
+    Returns:
+        A description of the matching distribution (i.e. "numpy==1.26.0"), or None
+        if the module has to be shipped.
+    """
+    distributions = local_distributions(module_name)
+    if len(distributions) == 0 or not _same_python(target):
+        return None
+
+    available = target.get("distributions", dict())
+    abi = target.get("abi")
+    for dist_name, version in distributions.items():
+        if available.get(dist_name) != version:
+            return None
+        if abi is not None and abi != sysconfig.get_config_var("SOABI") and _compiled(dist_name):
+            return None
+    return ", ".join(f"{dist_name}=={version}" for dist_name, version in distributions.items())
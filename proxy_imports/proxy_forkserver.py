@@ -0,0 +1,230 @@
+"""Fork server for workers that run many short tasks.
+
+Even when a package is already extracted on the node, every new worker process
+executes it again on its first import, which takes seconds for large packages.
+A ForkServer starts one template process that fetches, extracts and imports the
+proxied packages once. Every task then runs in a process forked from the
+template, which starts with the packages already imported.
+
+    server = ForkServer(proxied_modules, package_path)
+    future = server.submit(func, *args)
+    future.result()
+    server.shutdown()
+
+Functions and arguments are sent with pickle, so functions must be importable
+by the template process (i.e. not defined in an interactive session).
+
+The template is not a daemon process, so tasks can start processes of their own
+(i.e. with multiprocessing or joblib). It is stopped by shutdown, or when the
+process that started it exits.
+"""
+import atexit
+from concurrent.futures import Future
+import importlib
+import itertools
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+import pickle
+import selectors
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from proxystore.proxy import Proxy
+
+from .proxy_importer import ProxyImporter, ProxyModule
+from .proxy_timing import record_event, timed
+
+# Longest time the template waits for the importer before it forks tasks, in seconds
+FORK_WAIT_TIMEOUT = 60.0
+
+def _run_task(payload: bytes, fd: int) -> None:
+    """Runs a task in a forked process and writes the pickled outcome to fd"""
+    try:
+        func, args, kwargs = pickle.loads(payload)
+        outcome = (True, func(*args, **kwargs))
+    except BaseException as e:
+        outcome = (False, e)
+
+    try:
+        data = pickle.dumps(outcome)
+    except Exception as e:
+        data = pickle.dumps((False, RuntimeError(f"Could not pickle the result of the task: {e!r}")))
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(data)
+    os._exit(0)
+
+def _import_modules(proxied_modules: dict[str, Proxy], package_path: str, modules: list[str]) -> ProxyImporter:
+    importer = ProxyImporter(proxied_modules, package_path)
+    sys.meta_path.insert(0, importer)
+    for module_name in modules:
+        with timed(module_name.partition('.')[0], "template_import", module=module_name):
+            module = importlib.import_module(module_name)
+            if isinstance(module, ProxyModule):
+                module.__wrapped__
+    # Forking with the unpack thread still running is not safe, the tasks forked before
+    # it is done may hang
+    start = time.time()
+    if not importer.wait(FORK_WAIT_TIMEOUT):
+        for name in importer.pending_packages():
+            record_event(name, "fork_wait_timeout", start, time.time() - start, timeout=FORK_WAIT_TIMEOUT)
+    return importer
+
+def _serve(conn: Connection, proxied_modules: dict[str, Proxy], package_path: str, modules: list[str]) -> None:
+    """Main loop of the template process. Forks a process for every task received on
+    conn and sends back the outcome when the process is done. Single threaded, so
+    the template can fork at any time.
+    """
+    try:
+        _import_modules(proxied_modules, package_path, modules)
+    except BaseException as e:
+        conn.send(("error", e))
+        return
+    conn.send(("ready", os.getpid()))
+
+    selector = selectors.DefaultSelector()
+    selector.register(conn, selectors.EVENT_READ)
+    children = dict() # read end of the pipe -> (task id, pid, received chunks)
+    running = True
+    while running or children:
+        for key, _ in selector.select():
+            if key.fileobj is conn:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    message = None
+                if message is None:
+                    # Shutdown, finish running tasks
+                    selector.unregister(conn)
+                    running = False
+                    continue
+
+                task_id, payload = message
+                read_fd, write_fd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(read_fd)
+                    _run_task(payload, write_fd)
+                os.close(write_fd)
+                selector.register(read_fd, selectors.EVENT_READ)
+                children[read_fd] = (task_id, pid, [])
+            else:
+                read_fd = key.fileobj
+                data = os.read(read_fd, 1 << 16)
+                if data:
+                    children[read_fd][2].append(data)
+                    continue
+
+                selector.unregister(read_fd)
+                os.close(read_fd)
+                task_id, pid, chunks = children.pop(read_fd)
+                _, status = os.waitpid(pid, 0)
+                conn.send((task_id, b"".join(chunks), os.waitstatus_to_exitcode(status)))
+
+# Time running tasks have to finish when the process exits with a running template, in seconds
+SHUTDOWN_TIMEOUT = 10.0
+
+class ForkServer:
+    """Runs tasks in processes forked from a template process that has the proxied
+    packages imported.
+    """
+
+    def __init__(self, proxied_modules: dict[str, Proxy], package_path: str, modules: Optional[list[str]] = None):
+        """
+        Args:
+            proxied_modules (dict): proxies of the stored packages, by package name.
+            package_path (str): node local directory the packages are extracted to.
+            modules (list): modules imported by the template, all proxied packages by default.
+        """
+        # Spawned, so the template does not inherit the threads of this process
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, template_conn = ctx.Pipe()
+        if modules is None:
+            modules = list(proxied_modules)
+        self._process = ctx.Process(
+                target=_serve,
+                args=(template_conn, proxied_modules, package_path, modules),
+                name="proxy-imports-template",
+                # Tasks are forked from the template, they could not start processes of a daemon
+                daemon=False
+            )
+        self._process.start()
+        template_conn.close()
+        # Before multiprocessing joins its non daemon processes at exit
+        atexit.register(self.shutdown, SHUTDOWN_TIMEOUT)
+
+        self._ids = itertools.count()
+        self._futures: dict[int, Future] = dict()
+        self._send_lock = threading.Lock()
+        self._ready = Future()
+        self._reader = threading.Thread(target=self._read_results, name="proxy-imports-fork-server", daemon=True)
+        self._reader.start()
+
+    def _read_results(self) -> None:
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "ready":
+                self._ready.set_result(message[1])
+            elif message[0] == "error":
+                self._ready.set_exception(message[1])
+                break
+            else:
+                task_id, data, exitcode = message
+                future = self._futures.pop(task_id)
+                if not data:
+                    future.set_exception(RuntimeError(f"Task process exited with code {exitcode}"))
+                    continue
+                ok, value = pickle.loads(data)
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+        # The template is gone, fail the remaining tasks
+        for future in list(self._futures.values()):
+            if not future.done():
+                future.set_exception(RuntimeError("Template process exited"))
+        if not self._ready.done():
+            self._ready.set_exception(RuntimeError("Template process exited"))
+
+    def wait_ready(self, timeout: Optional[float] = None) -> int:
+        """Waits until the template imported the packages, returns its pid"""
+        return self._ready.result(timeout)
+
+    def submit(self, func: Callable, *args: list[Any], **kwargs: dict[str, Any]) -> Future:
+        """Runs func(*args, **kwargs) in a process forked from the template"""
+        future = Future()
+        payload = pickle.dumps((func, args, kwargs))
+        with self._send_lock:
+            task_id = next(self._ids)
+            self._futures[task_id] = future
+            self._conn.send((task_id, payload))
+        return future
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Stops the template once the running tasks are done. The template is terminated
+        if they are not done after timeout.
+        """
+        atexit.unregister(self.shutdown)
+        with self._send_lock:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._reader.join(timeout)
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
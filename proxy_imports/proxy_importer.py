@@ -1,48 +1,65 @@
 """Implementation of lazy importing ad moving via proxies"""
-import ast
-from threading import Thread
+import hashlib
+import json
+import threading
+from threading import Thread, current_thread
 import sys
 import importlib
 from importlib import abc
 from importlib._bootstrap import _ModuleLockManager
 from importlib.util import module_from_spec
-import inspect
 import io
 import os
 from pathlib import Path
 import tarfile
 from types import ModuleType
 import time
-import zipfile
+from typing import Any, Optional
 import zipimport
 import asyncio
 from asyncio import Future
+import concurrent.futures
 
-from proxystore.proxy import Proxy, resolve, is_resolved
-from proxystore.store import Store, get_store, register_store
+from proxystore.proxy import Proxy, is_resolved
 from proxystore.serialize import deserialize
 
 import lazy_object_proxy.slots as lop
 
+from .proxy_cache import BlobCache, get_blob_cache
+from .proxy_children import propagate
+from .proxy_libraries import preload_libraries, write_library_list
+from .proxy_peers import fetch_blob
+from .proxy_stores import fetch_batch, fetch_bytes
+from .proxy_timing import record_event, timed
+
+# Attributes of the ProxyModule itself, all others are forwarded to the module once resolved
+_PROXY_ATTRIBUTES = frozenset([
+    "__target__", "__factory__", "__wrapped__", "__resolved__",
+    "name", "package_path", "submodules", "file_unpack", "lazy_attributes",
+    "load_package", "load_module", "remove_submodules", "add_submodules",
+    "resolve_once", "resolve_attribute", "rebind_references",
+])
+
 class ProxyModule(lop.Proxy):
     """ Wraps a proxy of a tar of a module to behave like the proxy of a module
     Adds the necessary features to avoid resolving the module unnecessarily.
     """
 
-    def __init__(self, file_future: Future, name: str, package_path: str):
+    def __init__(self, file_future: Future, name: str, package_path: str, lazy_attributes: bool = False):
         object.__setattr__(self, '__path__', None)
         object.__setattr__(self, 'name', None)
         object.__setattr__(self, "package_path", package_path)
         object.__setattr__(self, "submodules", dict())
+        object.__setattr__(self, "lazy_attributes", lazy_attributes)
 
         package, _, submod = name.partition('.')
         if submod:
             # Parent must be imported seperately, so we don't have to set the deserializer
-            object.__setattr__(self, '__factory__', lambda: self.load_module(name, package))
+            object.__setattr__(self, '__factory__', lambda: self.resolve_once(name, lambda: self.load_module(name, package)))
         else:
             # Is a package
             object.__setattr__(self, "file_unpack", file_future)
-            object.__setattr__(self, '__factory__', lambda: self.load_package(name))
+            object.__setattr__(self, '__factory__', lambda: self.resolve_once(name, lambda: self.load_package(name)))
 
     @property
     def __name__(self):
@@ -68,20 +85,68 @@ class ProxyModule(lop.Proxy):
         else:
             super().__setattr__(name, value, __setattr__)
 
+    def __getattribute__(self, name, __getattribute__=object.__getattribute__):
+        """ Once the module is resolved, attributes are looked up on the module directly,
+        skipping the failed lookup on the proxy and the lazy_object_proxy machinery
+        """
+        if name not in _PROXY_ATTRIBUTES:
+            try:
+                module = __getattribute__(self, "__target__")
+            except AttributeError:
+                pass
+            else:
+                return getattr(module, name)
+        return __getattribute__(self, name)
+
     def __getattr__(self, name):
         """ Overrides the __getattr__ function to avoid resolving the proxy at all on get"""
         if self.__resolved__:
             return super().__getattr__(name)
-        
+
         if name in ["__name__", "__loader__", "__package__", "__spec__", "__path__", "__cached__"]:
             return object.__getattribute__(self, name)
+        if self.lazy_attributes and not name.startswith("__"):
+            # i.e. from numpy import array, only resolve the module when array is used
+            return LazyAttribute(self, name)
         return super().__getattr__(name)
+
+    def resolve_once(self, name: str, factory):
+        """Resolves the module while holding its import lock, so a module is only executed
+        once when several threads (i.e. the task and the warm-up thread) resolve it at the
+        same time. The import lock is reentrant and detects deadlocks between threads.
+        """
+        with _ModuleLockManager(name):
+            try:
+                return object.__getattribute__(self, "__target__")
+            except AttributeError:
+                module = factory()
+                object.__setattr__(self, "__target__", module)
+                return module
+
+    def resolve_attribute(self, name: str):
+        """Factory method for a LazyAttribute of this module"""
+        module = self.__wrapped__
+        try:
+            return getattr(module, name)
+        except AttributeError:
+            # from package import submodule, where the package does not import the submodule itself
+            return importlib.import_module(f"{module.__name__}.{name}")
     
     def load_package(self, name: str):
         """Factory method for a package"""
-        self.file_unpack.result()
+        with timed(name, "wait_unpack"):
+            self.file_unpack.result()
+
+        # The linker does not search the libraries directory, unless it was in LD_LIBRARY_PATH
+        # when the process started, so extension modules would not find them
+        with timed(name, "preload_libraries") as info:
+            info["count"] = preload_libraries(name, os.path.join(self.package_path, "libraries"))
         
-        if os.path.isfile(f"{self.package_path}/{name}/__init__.py"):
+        if os.path.isfile(f"{self.package_path}/{name}.zip"):
+            spec = zipimport.zipimporter(f"{self.package_path}/{name}.zip").find_spec(name)
+            if spec is None:
+                raise ModuleNotFoundError(f"Could not find module {name} in {self.package_path}/{name}.zip")
+        elif os.path.isfile(f"{self.package_path}/{name}/__init__.py"):
             module_path = f"{self.package_path}/{name}/__init__.py"
             loader = importlib.machinery.SourceFileLoader(name, module_path)
             spec = importlib.util.spec_from_loader(name, loader)
@@ -105,12 +170,14 @@ class ProxyModule(lop.Proxy):
             sys.modules[module.__name__] = module
 
             self.remove_submodules()
-            spec.loader.exec_module(module)
+            with timed(name, "exec_module"):
+                spec.loader.exec_module(module)
             self.add_submodules(module)
 
             spec._initializing = False
 
         globals()[module.__name__] = module
+        self.rebind_references(module)
         return module
 
     def remove_submodules(self):
@@ -121,7 +188,7 @@ class ProxyModule(lop.Proxy):
         of the proxy. Reimporting them will result in the actual module being returned.
         """
         for name, submod in self.submodules.items():
-            sys.modules.pop(submod.__name__)
+            sys.modules.pop(submod.__name__, None)
             submod.remove_submodules()
 
     def add_submodules(self, module: ModuleType):
@@ -154,79 +221,479 @@ class ProxyModule(lop.Proxy):
         # This has been removed from sys.modules, so it is safe to call this
         # Just import the module again, the parent is already resolved
         # So this should point to the correct thing without a problem
-        module = importlib.import_module(name)
+        with timed(package_name, "exec_submodule", module=name):
+            module = importlib.import_module(name)
         self.add_submodules(module)
+        self.rebind_references(module)
         return module
 
+    def rebind_references(self, module: ModuleType):
+        """Replace references to this proxy with the resolved module, so later accesses
+        do not go through the proxy at all. This covers the globals of every frame on the
+        stack of every thread (i.e. `import numpy as np` at the top of the task's module),
+        sys.modules and the attribute of the parent package. References in local variables
+        are not replaced.
+        """
+        seen = set()
+        for frame in sys._current_frames().values():
+            while frame is not None:
+                namespace = frame.f_globals
+                if id(namespace) not in seen:
+                    seen.add(id(namespace))
+                    for key, value in list(namespace.items()):
+                        if value is self:
+                            namespace[key] = module
+                frame = frame.f_back
+
+        for key, value in list(sys.modules.items()):
+            if value is self:
+                sys.modules[key] = module
+
+        parent, _, child = module.__name__.rpartition('.')
+        if parent and parent in sys.modules:
+            parent_module = sys.modules[parent]
+            if not isinstance(parent_module, ProxyModule) and getattr(parent_module, child, None) is self:
+                setattr(parent_module, child, module)
+
+
+def _proxy_id(proxy: Proxy) -> str:
+    """Short identifier of the stored package a proxy points to"""
+    return hashlib.sha1(repr(proxy.__factory__.key).encode()).hexdigest()[:16]
+
+def _read_local_manifest(name: str, package_path: str) -> Optional[dict[str, Any]]:
+    """Returns the version and manifest of the package extracted on this node, if any"""
+    try:
+        with open(f"{package_path}/{name}.manifest.json") as fp:
+            return json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
 
-async def unpack(proxy: Proxy, name: str, package_path: str) -> None:
-    """Unpacks the tar file into the correct place"""
-    def deserialize_and_untar(b: bytes):
-        zip_files = deserialize(b)
-
-        module_bytes = zip_files["module"]
-        module_buffer = io.BytesIO(module_bytes)
-        with tarfile.open(fileobj=module_buffer, mode="r") as f:
+def _write_local_manifest(name: str, package_path: str, version: str, manifest: dict[str, str]) -> None:
+    path = f"{package_path}/{name}.manifest.json"
+    with open(f"{path}.partial", "w") as fp:
+        json.dump({"version": version, "manifest": manifest}, fp)
+    os.replace(f"{path}.partial", path)
+
+def _extract_shards(shards: list[Proxy],
+                    name: str,
+                    package_path: str,
+                    parallel_fetches: Optional[int] = None,
+                    blob_cache: Optional[BlobCache] = None) -> None:
+    """Fetches the shards of a package in parallel, extracting each as it arrives"""
+    def fetch_and_extract(proxy: Proxy) -> int:
+        if blob_cache is None:
+            data = fetch_bytes(proxy)
+        else:
+            data, _ = blob_cache.get(_proxy_id(proxy), lambda: (fetch_bytes(proxy), "store"))
+        with tarfile.open(fileobj=io.BytesIO(deserialize(data)), mode="r") as f:
+            # Shards share directories, and tarfile does not expect another thread
+            # to create the parents of a member between its check and makedirs
+            for member in f.getmembers():
+                parent = os.path.dirname(os.path.join(package_path, member.name))
+                os.makedirs(parent, exist_ok=True)
             f.extractall(path=package_path)
+        return len(data)
+
+    with timed(name, "shards") as info:
+        info["shards"] = len(shards)
+        workers = min(len(shards), parallel_fetches or len(shards))
+        with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="proxy-imports-shards") as pool:
+            info["bytes"] = sum(pool.map(fetch_and_extract, shards))
+
+def _apply_package(zip_files: dict[str, Any], name: str, package_path: str, blob_cache: Optional[BlobCache] = None) -> None:
+    """Extracts a stored package into package_path. Packages can be complete, or
+    a delta containing only the files that changed since a base version. A delta is
+    applied in place if the base version is already extracted, otherwise the base
+    is fetched and extracted first.
+    """
+    version = zip_files.get("version")
+    local = _read_local_manifest(name, package_path)
+    if version is not None and local is not None and local["version"] == version:
+        return
+
+    if "base" in zip_files:
+        if local is None or local["version"] != zip_files["base_version"]:
+            with timed(name, "fetch_base") as info:
+                base_proxy = zip_files["base"]
+                if blob_cache is None:
+                    base = deserialize(fetch_bytes(base_proxy))
+                else:
+                    data, info["source"] = blob_cache.get(_proxy_id(base_proxy), lambda: (fetch_bytes(base_proxy), "store"))
+                    base = deserialize(data)
+            _apply_package(base, name, package_path, blob_cache)
+            local = _read_local_manifest(name, package_path)
+
+        with timed(name, "delete") as info:
+            info["files"] = len(zip_files["deleted"])
+            for path in zip_files["deleted"]:
+                Path(package_path, path).unlink(missing_ok=True)
+    elif version is not None and local is not None:
+        # Replacing an older version, remove files that no longer exist. A zip file
+        # replaces all the extracted files.
+        with timed(name, "delete") as info:
+            stale = set(local["manifest"])
+            if zip_files.get("format") != "zip":
+                stale -= set(zip_files["manifest"])
+            info["files"] = len(stale)
+            for path in stale:
+                Path(package_path, path).unlink(missing_ok=True)
+
+    zip_path = Path(package_path, f"{name}.zip")
+    if zip_files.get("format") == "zip":
+        # Imported with zipimport (see ProxyModule.load_package), nothing to extract
+        with timed(name, "write_zip") as info:
+            info["bytes"] = len(zip_files["module"])
+            partial = Path(f"{zip_path}.{os.getpid()}.partial")
+            partial.write_bytes(zip_files["module"])
+            os.replace(partial, zip_path)
+    else:
+        zip_path.unlink(missing_ok=True)
+        if "shards" in zip_files:
+            _extract_shards(zip_files["shards"], name, package_path, zip_files.get("parallel_fetches"), blob_cache)
+        else:
+            with timed(name, "untar") as info:
+                module_bytes = zip_files["module"]
+                info["bytes"] = len(module_bytes)
+                module_buffer = io.BytesIO(module_bytes)
+                with tarfile.open(fileobj=module_buffer, mode="r") as f:
+                    f.extractall(path=package_path)
+
+    with timed(name, "extract_libraries") as info:
+        info["bytes"] = len(zip_files["libraries"])
+        if len(zip_files["libraries"]) > 0:
+            library_buffer = io.BytesIO(zip_files["libraries"])
+            library_path = os.path.join(package_path, "libraries")
+            extracted = []
+            with tarfile.open(fileobj=library_buffer, mode="r|") as f:
+                for file_ in f:
+                    try:
+                        f.extract(file_, path=library_path)
+                        extracted.append(file_.name)
+                    except IOError as e:
+                        pass
+            write_library_list(name, library_path, extracted)
+
+    if version is not None:
+        _write_local_manifest(name, package_path, version, zip_files["manifest"])
+
+class LazyAttribute(lop.Proxy):
+    """ Proxy of an attribute of a ProxyModule that was accessed before the module was resolved.
+    The module is only resolved once the attribute is used (called, inspected, etc.).
+    """
 
-        library_buffer = io.BytesIO(zip_files["libraries"])
-        library_path = os.path.join(package_path, "libraries")
-        with tarfile.open(fileobj=library_buffer, mode="r|") as f:
-            for file_ in f:
-                try:
-                    f.extract(file_, path=library_path)
-                except IOError as e:
-                    pass
+    def __init__(self, module: ProxyModule, name: str):
+        super().__init__(lambda: module.resolve_attribute(name))
 
+def _lock_files(proxy: Proxy, name: str, package_path: str) -> tuple[Path, Path]:
+    """Files marking that a package is being extracted and that it is extracted. They are
+    per stored package, so a new version of a package is extracted on nodes that already
+    hold an older one.
+    """
+    proxy_id = _proxy_id(proxy)
+    return Path(f"{package_path}/{name}-{proxy_id}.tmp"), Path(f"{package_path}/{name}-{proxy_id}_done.tmp")
+
+async def _wait_extracted(name: str, finished_file: Path) -> None:
+    with timed(name, "lock_wait"):
+        while (not finished_file.exists()):
+            await asyncio.sleep(0.2)
+
+async def unpack(proxy: Proxy,
+                 name: str,
+                 package_path: str,
+                 peers: Optional[dict[str, Any]] = None,
+                 blob_cache: Optional[BlobCache] = None) -> None:
+    """Unpacks the tar file into the correct place. The package is looked up in the
+    blob cache (see proxy_cache), then fetched from another node with peers (see
+    proxy_peers), or from the store.
+    """
+    fetch_start = None
+    def deserialize_and_untar(b: bytes, source: str = "store"):
+        record_event(name, "fetch", fetch_start[0], time.perf_counter() - fetch_start[1], bytes=len(b), source=source)
+
+        with timed(name, "deserialize"):
+            zip_files = deserialize(b)
+
+        _apply_package(zip_files, name, package_path, blob_cache)
         return "Done"
 
-    started_file = Path(f"{package_path}/{name}.tmp")
-    finished_file = Path(f"{package_path}/{name}_done.tmp")
+    def fetch() -> tuple[bytes, str]:
+        if peers is None:
+            return fetch_bytes(proxy), "store"
+        return fetch_blob(proxy_id, lambda: fetch_bytes(proxy), peers, name)
+
+    def fetch_and_untar():
+        nonlocal fetch_start
+        fetch_start = (time.time(), time.perf_counter())
+        if blob_cache is None:
+            deserialize_and_untar(*fetch())
+        else:
+            deserialize_and_untar(*blob_cache.get(proxy_id, fetch))
+        finished_file.touch()
+
+    proxy_id = _proxy_id(proxy)
+    started_file, finished_file = _lock_files(proxy, name, package_path)
     try:
         # Prevent multiple tasks from extracting proxy
         started_file.touch(exist_ok=False)
-        proxy.__factory__.deserializer = deserialize_and_untar
-        resolve(proxy)
-        finished_file.touch()
     except FileExistsError as e:
         # Wait for package to finish extracting before continuing
-        while (not finished_file.exists()):
-            await asyncio.sleep(0.2)
-    
+        await _wait_extracted(name, finished_file)
+        return "Done"
+
+    # Extracted in the executor of the loop, so the loop completes the future of this
+    # package while the next one is extracted, instead of after it
+    await asyncio.get_running_loop().run_in_executor(None, fetch_and_untar)
     return "Done"
 
+async def unpack_batch(proxies: dict[str, Proxy],
+                       futures: dict[str, concurrent.futures.Future],
+                       package_path: str,
+                       blob_cache: Optional[BlobCache] = None) -> None:
+    """Unpacks several packages, reading the ones that are not in the blob cache with
+    one request per store (see proxy_stores.fetch_batch). The future of each package
+    is completed as soon as it is extracted, or by another process on the node.
+    """
+    claimed, waiting = dict(), dict()
+    for name, proxy in proxies.items():
+        started_file, finished_file = _lock_files(proxy, name, package_path)
+        try:
+            started_file.touch(exist_ok=False)
+            claimed[name] = finished_file
+        except FileExistsError:
+            waiting[name] = finished_file
+
+    def fetch_and_untar():
+        missing = [name for name in claimed if blob_cache is None or not blob_cache.contains(_proxy_id(proxies[name]))]
+        fetched, error = dict(), None
+        if missing:
+            start = (time.time(), time.perf_counter())
+            try:
+                fetched = dict(zip(missing, fetch_batch([proxies[name] for name in missing])))
+            except Exception as e:
+                error = e
+            duration = time.perf_counter() - start[1]
+
+        for name, finished_file in claimed.items():
+            try:
+                if name in missing:
+                    if error is not None:
+                        raise error
+                    data = fetched.pop(name)
+                    record_event(name, "fetch", start[0], duration, bytes=len(data), source="store", batch=len(missing))
+                    if blob_cache is not None:
+                        blob_cache.get(_proxy_id(proxies[name]), lambda: (data, "store"))
+                else:
+                    with timed(name, "fetch") as info:
+                        data, info["source"] = blob_cache.get(_proxy_id(proxies[name]), lambda: (fetch_bytes(proxies[name]), "store"))
+                        info["bytes"] = len(data)
+                with timed(name, "deserialize"):
+                    zip_files = deserialize(data)
+                _apply_package(zip_files, name, package_path, blob_cache)
+                finished_file.touch()
+                futures[name].set_result("Done")
+            except Exception as e:
+                futures[name].set_exception(e)
+
+    async def wait(name: str, finished_file: Path):
+        await _wait_extracted(name, finished_file)
+        futures[name].set_result("Done")
+
+    await asyncio.gather(asyncio.get_running_loop().run_in_executor(None, fetch_and_untar),
+                         *[wait(name, finished_file) for name, finished_file in waiting.items()])
+
 async def stop_loop(futures, loop):
-    for f in futures:
-        await asyncio.wrap_future(f)
+    # Errors are raised when the module is imported, the loop stops in any case
+    await asyncio.gather(*[asyncio.wrap_future(f) for f in futures], return_exceptions=True)
+    await loop.shutdown_default_executor()
     loop.stop()
 
+FETCH_POLICIES = ("eager", "priority", "lazy")
+
+def warm_up_modules(warm_up: Optional[bool | list[str]], fetch_policy: dict[str, str]) -> list[str]:
+    """Modules to warm up (see ProxyImporter.warm_up) for the "warm_up" option of a
+    configuration, given the fetch policy of every proxied package. A list of modules is
+    warmed up as is. True stands for the packages that are not fetched lazily, and their
+    submodules imported by this process: warming up a lazy package would fetch it anyway.
+    """
+    if warm_up is True:
+        packages = {name for name, policy in fetch_policy.items() if policy != "lazy"}
+        # Sorted, so packages come before their submodules
+        return sorted(packages | {name for name in list(sys.modules) if name.partition('.')[0] in packages})
+    return list(warm_up or [])
+
 # Adapted from: https://gist.github.com/rmcgibbo/28bcf323ee0a0e482f52339701390f28
 class ProxyImporter(importlib.abc.MetaPathFinder, importlib.abc.Loader):
-    _proxied_modules: dict[str, Proxy]
-
-    def __init__(self, proxied_modules: dict[str, Proxy], package_path: str):
+    _proxied_modules: dict[str, concurrent.futures.Future]
+
+    def __init__(self,
+                 proxied_modules: dict[str, Proxy],
+                 package_path: str,
+                 lazy_attributes: bool = False,
+                 peers: Optional[dict[str, Any]] = None,
+                 blob_cache: Optional[dict[str, Any]] = None,
+                 fetch_policy: Optional[dict[str, str]] = None,
+                 child_processes: bool = False,
+                 batch_fetches: bool = False):
+        """
+        Args:
+            proxied_modules (dict): proxies of the stored packages, by package name.
+            package_path (str): node local directory the packages are extracted to.
+            lazy_attributes (bool): attributes of a module that is not resolved yet, i.e.
+                names imported with `from package import name`, are returned as proxies.
+                The package is only resolved once the name is used, so fetching and
+                extracting it overlaps with the rest of the task setup. Note that
+                `hasattr` is always True for an unresolved module in this mode.
+            peers (dict): fetch packages from other nodes that already hold them, see
+                proxy_peers for the options.
+            blob_cache (dict): look up packages in a cache in this process and on the node
+                before fetching them, see proxy_cache for the options.
+            fetch_policy (dict): when to fetch each package. "eager" packages (the default)
+                are fetched right away, "priority" packages before the eager ones, and
+                "lazy" packages only when they are first imported.
+            child_processes (bool): processes started by this one (i.e. by joblib or
+                multiprocessing) import the packages extracted by this importer, see
+                proxy_children.
+            batch_fetches (bool): the "priority" packages, then the eager ones, are read
+                from the store with one request per store instead of one per package (see
+                proxy_stores). Saves the latency of each request for many small packages,
+                but no package is extracted before all of its batch is read. Not used
+                with peers.
+        """
+        fetch_policy = fetch_policy or dict()
+        for name, policy in fetch_policy.items():
+            if policy not in FETCH_POLICIES:
+                raise ValueError(f"Unknown fetch policy {policy} for {name}, expected one of {FETCH_POLICIES}")
         Path(package_path).mkdir(parents=True, exist_ok=True)
         sys.path.insert(0, package_path)
         self.package_path = package_path
+        self.lazy_attributes = lazy_attributes
 
-        # Path for shared libraries, must be added to LD_LIBRARY_PATH at startup
-        # This can't be done from inside python because the environment has already
-        # been cached in the linker by this point
+        # Path for shared libraries, they are preloaded before a package is executed
+        # (see proxy_libraries), as the linker only reads LD_LIBRARY_PATH at startup
         library_path = os.path.join(package_path, "libraries")
         Path(library_path).mkdir(exist_ok=True)
 
         self.loop  = asyncio.new_event_loop()
+        # A single extraction thread, packages are extracted in the order they are scheduled
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="proxy-imports-unpack"))
         def run_loop(loop):
             asyncio.set_event_loop(loop)
             loop.run_forever()
         self.unpack_thread = Thread(target=run_loop, args=(self.loop,))
         self.unpack_thread.start()
 
+        self.fetch_policy = {name: fetch_policy.get(name, "eager") for name in proxied_modules}
+        self._proxies = dict(proxied_modules)
+        self._unpack_options = (package_path, peers, get_blob_cache(blob_cache))
+        self.child_processes = child_processes
+
+        # Packages are unpacked one after the other, in the order they are scheduled
         futures = dict()
-        for name, proxy in proxied_modules.items():
-            futures[name] = asyncio.run_coroutine_threadsafe(unpack(proxy, name, package_path), self.loop)
-        self.end = asyncio.run_coroutine_threadsafe(stop_loop(list(futures.values()), self.loop), self.loop)
+        batches = []
+        if batch_fetches and peers is None:
+            for policy in ("priority", "eager"):
+                batch = {name: proxy for name, proxy in proxied_modules.items() if self.fetch_policy[name] == policy}
+                if batch:
+                    futures.update({name: concurrent.futures.Future() for name in batch})
+                    batches.append(asyncio.run_coroutine_threadsafe(
+                        unpack_batch(batch, futures, package_path, self._unpack_options[2]), self.loop))
+        else:
+            for name in sorted(proxied_modules, key=lambda name: self.fetch_policy[name] != "priority"):
+                if self.fetch_policy[name] != "lazy":
+                    futures[name] = asyncio.run_coroutine_threadsafe(unpack(proxied_modules[name], name, *self._unpack_options), self.loop)
+        self.end = asyncio.run_coroutine_threadsafe(stop_loop(list(futures.values()) + batches, self.loop), self.loop)
         self._proxied_modules = futures     
+        if child_processes:
+            propagate(package_path, {name: _proxy_id(self._proxies[name]) for name in futures})
+        self._fetch_lock = threading.Lock()
+        self.fetch_threads = []
+        self.warm_up_threads = []
+        self.imported = set()
+        self._warming_up: Optional[str] = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits until all packages are extracted and the warm-up is done, then stops the
+        unpack thread. Call it before forking a process that uses the importer: a forked
+        child only has the thread that forked, so it would wait forever on an unpack or an
+        import lock held by another thread of the parent. The ForkServer template does
+        (see proxy_forkserver). Returns False if the timeout expired first.
+        """
+        threads = [self.unpack_thread] + self.fetch_threads + self.warm_up_threads
+        if current_thread() in threads:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+        if not self.unpack_thread.is_alive() and not self.loop.is_closed():
+            self.loop.close()
+        return not any(thread.is_alive() for thread in threads)
+
+    def pending_packages(self) -> list[str]:
+        """Packages that are still extracted or warmed up"""
+        pending = [name for name, future in self._proxied_modules.items() if not future.done()]
+        warming_up = self._warming_up
+        if warming_up is not None and warming_up not in pending:
+            pending.append(warming_up)
+        return pending
+
+    def fetch(self, name: str) -> concurrent.futures.Future:
+        """Future of the unpack of a package. Lazy packages are fetched on the first call,
+        in a thread of their own, as the unpack thread may already be stopped.
+        """
+        with self._fetch_lock:
+            if name not in self._proxied_modules:
+                future = concurrent.futures.Future()
+                def run():
+                    try:
+                        future.set_result(asyncio.run(unpack(self._proxies[name], name, *self._unpack_options)))
+                    except BaseException as e:
+                        future.set_exception(e)
+                thread = Thread(target=run, name=f"proxy-imports-fetch-{name}")
+                thread.start()
+                self.fetch_threads.append(thread)
+                self._proxied_modules[name] = future
+                if self.child_processes:
+                    propagate(self.package_path, {name: _proxy_id(self._proxies[name])})
+            return self._proxied_modules[name]
+
+    def unused_packages(self) -> list[str]:
+        """Packages that were fetched, but never imported in this process. Fetching
+        these lazily (see fetch_policy) would save their fetch and extraction.
+        """
+        return [name for name in self._proxied_modules if name not in self.imported]
+
+    def warm_up(self, modules: list[str]) -> Thread:
+        """Imports modules of the proxied packages in a background thread, each as soon as
+        its package is extracted, so executing them overlaps with the rest of the task setup
+        (i.e. deserializing its inputs). Must be called after the importer is added to
+        sys.meta_path. Modules of packages that are not proxied are ignored.
+
+        The package of a module is resolved before the module itself, so submodules are
+        imported as regular modules. Resolution holds the import lock of the module, so a
+        task importing the same module waits for the warm-up instead of executing it again.
+        """
+        def run():
+            for module_name in modules:
+                package = module_name.partition('.')[0]
+                if package not in self._proxies:
+                    continue
+                self._warming_up = package
+                with timed(package, "warm_up", module=module_name) as info:
+                    try:
+                        self.fetch(package).result()
+                        package_module = importlib.import_module(package)
+                        if isinstance(package_module, ProxyModule):
+                            package_module.__wrapped__
+                        importlib.import_module(module_name)
+                    except Exception as e:
+                        # The task gets the same error if it imports the module itself
+                        info["error"] = repr(e)
+            self._warming_up = None
+
+        thread = Thread(target=run, name="proxy-imports-warm-up", daemon=True)
+        thread.start()
+        self.warm_up_threads.append(thread)
+        return thread
 
     def find_module(self, fullname, path=None):
         spec = self.find_spec(fullname, path)
@@ -237,9 +704,11 @@ class ProxyImporter(importlib.abc.MetaPathFinder, importlib.abc.Loader):
     def create_module(self, spec):
         package, _, submod = spec.name.partition('.')            
 
-        if package in self._proxied_modules:
-            proxy = self._proxied_modules[package]
-            proxy = ProxyModule(proxy, spec.name, self.package_path)
+        if package in self._proxies:
+            if not submod:
+                record_event(package, "first_import", time.time(), 0.0)
+                self.imported.add(package)
+            proxy = ProxyModule(self.fetch(package), spec.name, self.package_path, self.lazy_attributes)
             importlib._bootstrap._init_module_attrs(spec, proxy, override=True)
             self._in_create_module = False
             return proxy
@@ -259,7 +728,9 @@ class ProxyImporter(importlib.abc.MetaPathFinder, importlib.abc.Loader):
             return None
 
         package, _, submod = fullname.partition('.')
-        if package in self._proxied_modules:
+        if package in self._proxies:
+            # Starts fetching lazy packages
+            self.fetch(package)
             spec = importlib.machinery.ModuleSpec(fullname, self)
             return spec
 
@@ -0,0 +1,125 @@
+"""Loading the shared libraries shipped with a package.
+
+The shared libraries of a package (collected with PyInstaller) are extracted to
+the "libraries" directory of the package path. The dynamic linker only searches
+the directories in LD_LIBRARY_PATH as it was when the process started, so
+extension modules linking them would fail to load in a running worker. Instead,
+the libraries of a package are loaded with RTLD_GLOBAL before the package is
+executed, dependencies first. The linker then finds them by their soname when an
+extension module needs them.
+
+The libraries of each package are listed in "{name}.libraries.json" in the
+libraries directory when they are extracted, so every process on the node
+preloads them, not only the one that extracted them.
+"""
+import ctypes
+import json
+import os
+from pathlib import Path
+import struct
+import threading
+import time
+from typing import Optional
+
+from .proxy_timing import record_event
+
+_DT_NEEDED = 1
+_DT_SONAME = 14
+_SHT_DYNAMIC = 6
+
+def read_dynamic(path: str) -> tuple[Optional[str], list[str]]:
+    """Returns the soname of an ELF shared library and the libraries it needs, or
+    (None, []) if the file is not an ELF file."""
+    with open(path, "rb") as fp:
+        data = fp.read()
+    if data[:4] != b"\x7fELF":
+        return None, []
+
+    is_64 = data[4] == 2
+    endian = "<" if data[5] == 1 else ">"
+    if is_64:
+        shoff, = struct.unpack_from(endian + "Q", data, 0x28)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x3A)
+        section = endian + "IIQQQQIIQQ"
+        entry = endian + "qQ"
+    else:
+        shoff, = struct.unpack_from(endian + "I", data, 0x20)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x2E)
+        section = endian + "IIIIIIIIII"
+        entry = endian + "iI"
+
+    sections = [struct.unpack_from(section, data, shoff + i * shentsize) for i in range(shnum)]
+    for sh_type, sh_offset, sh_size, sh_link in ((s[1], s[4], s[5], s[6]) for s in sections):
+        if sh_type != _SHT_DYNAMIC:
+            continue
+        strtab_offset = sections[sh_link][4]
+        def string(offset: int) -> str:
+            start = strtab_offset + offset
+            return data[start:data.index(b"\0", start)].decode()
+
+        soname, needed = None, []
+        for offset in range(sh_offset, sh_offset + sh_size, struct.calcsize(entry)):
+            tag, value = struct.unpack_from(entry, data, offset)
+            if tag == _DT_NEEDED:
+                needed.append(string(value))
+            elif tag == _DT_SONAME:
+                soname = string(value)
+        return soname, needed
+    return None, []
+
+def dependency_order(paths: list[str]) -> list[str]:
+    """Orders libraries so each comes after the libraries of the list it needs"""
+    by_name = dict()
+    needs = dict()
+    for path in paths:
+        try:
+            soname, needed = read_dynamic(path)
+        except (OSError, struct.error, IndexError, ValueError):
+            soname, needed = None, []
+        by_name[os.path.basename(path)] = path
+        if soname is not None:
+            by_name[soname] = path
+        needs[path] = needed
+
+    order = dict()
+    def visit(path: str, visiting: set):
+        if path in order or path in visiting:
+            return
+        visiting.add(path)
+        for name in needs[path]:
+            if name in by_name:
+                visit(by_name[name], visiting)
+        order[path] = None
+    for path in sorted(paths):
+        visit(path, set())
+    return list(order)
+
+def write_library_list(name: str, library_path: str, libraries: list[str]) -> None:
+    """Records the libraries extracted for a package"""
+    Path(library_path).mkdir(parents=True, exist_ok=True)
+    partial = Path(library_path, f"{name}.libraries.json.{os.getpid()}.partial")
+    partial.write_text(json.dumps(sorted(libraries)))
+    os.replace(partial, Path(library_path, f"{name}.libraries.json"))
+
+_loaded: dict[str, Optional[ctypes.CDLL]] = dict() # None if the library could not be loaded
+_loaded_lock = threading.Lock()
+def preload_libraries(name: str, library_path: str) -> int:
+    """Loads the libraries shipped with a package into this process, and returns how
+    many were loaded. Libraries are only loaded once per process."""
+    try:
+        libraries = json.loads(Path(library_path, f"{name}.libraries.json").read_text())
+    except FileNotFoundError:
+        return 0
+
+    count = 0
+    with _loaded_lock:
+        paths = [os.path.join(library_path, library) for library in libraries]
+        for path in dependency_order([path for path in paths if path not in _loaded and os.path.isfile(path)]):
+            try:
+                _loaded[path] = ctypes.CDLL(path, mode=ctypes.RTLD_GLOBAL)
+                count += 1
+            except OSError as e:
+                # Not every collected file is a library this process can load
+                record_event(name, "preload_failed", time.time(), 0.0, library=path, error=str(e))
+                _loaded[path] = None
+    return count
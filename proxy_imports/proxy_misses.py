@@ -0,0 +1,151 @@
+"""Packages that tasks import from outside the package path.
+
+A package that the driver does not trace (i.e. imported with importlib, or by a
+plugin system) is not proxied, and workers silently import it from the shared
+filesystem, which is often the most expensive import of the task. With
+"report_misses" in the configuration, the importer is followed by a MissFinder
+that records every package outside of the standard library that is imported
+from elsewhere than the package path, with its origin and the time it took to
+import. Misses are recorded as "miss" timing events, so they are returned with
+the result of transformed functions with timing=True, and appended to a log:
+
+    "report_misses": {"log": "/shared/fs/misses.jsonl"}
+
+Packages that store_modules skipped on purpose (installed on the target, or
+cheaper to import from the shared filesystem) are sent to workers as
+"skipped_modules" and are not reported.
+
+On the driver, fold_misses (see proxy_analyze) adds the reported packages to the
+next store_modules call.
+"""
+import importlib.abc
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from .proxy_timing import record_event
+
+# Packages the importer itself needs, they are imported from the environment on purpose
+_OWN_PACKAGES = frozenset(["proxy_imports", "proxystore", "lazy_object_proxy", "dill"])
+
+class MissFinder(importlib.abc.MetaPathFinder):
+    """Records the packages found by the finders after it on sys.meta_path outside of
+    package_path. Only looks up top level packages, so it is not consulted again for
+    their submodules.
+    """
+
+    def __init__(self, package_path: str, proxied: Iterable[str] = (), log: Optional[str] = None, skipped: Iterable[str] = ()):
+        self.package_path = os.path.abspath(package_path)
+        self.proxied = set(proxied)
+        self.skipped = set(skipped)
+        self.log = log
+        self.misses: dict[str, dict[str, Any]] = dict()
+        self._local = threading.local()
+
+    def _is_local(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(self.package_path + os.sep)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if path is not None or fullname in self.misses or fullname in _OWN_PACKAGES:
+            return None
+        if fullname in self.proxied or fullname in self.skipped:
+            return None
+        if fullname in sys.builtin_module_names or fullname in sys.stdlib_module_names:
+            return None
+        if getattr(self._local, "searching", False):
+            return None
+
+        # Looks the package up as if this finder was not there
+        self._local.searching = True
+        try:
+            finders = sys.meta_path[sys.meta_path.index(self) + 1:] if self in sys.meta_path else []
+            spec = None
+            for finder in finders:
+                find_spec = getattr(finder, "find_spec", None)
+                if find_spec is not None:
+                    spec = find_spec(fullname, path, target)
+                    if spec is not None:
+                        break
+        finally:
+            self._local.searching = False
+
+        if spec is None:
+            return None
+        locations = [spec.origin] if spec.has_location else list(spec.submodule_search_locations or [])
+        if not locations or any(self._is_local(location) for location in locations):
+            return None
+
+        miss = {"origin": locations[0], "start": time.time()}
+        self.misses[fullname] = miss
+        self._time_exec(fullname, spec, miss)
+        return spec
+
+    def _time_exec(self, fullname: str, spec, miss: dict[str, Any]) -> None:
+        """Times the execution of the package, with its submodules and dependencies"""
+        loader = spec.loader
+        exec_module = getattr(loader, "exec_module", None)
+        def timed_exec(module):
+            if module.__name__ != fullname:
+                # Another module of a loader shared by several modules, i.e. zipimport
+                return exec_module(module)
+            del loader.exec_module
+            tic = time.perf_counter()
+            try:
+                return exec_module(module)
+            finally:
+                self._record(fullname, miss, time.perf_counter() - tic)
+
+        try:
+            if exec_module is None:
+                raise AttributeError
+            loader.exec_module = timed_exec
+        except AttributeError:
+            # Loaders without instance attributes are not timed
+            self._record(fullname, miss, None)
+
+    def _record(self, fullname: str, miss: dict[str, Any], import_seconds: Optional[float]) -> None:
+        miss["import_seconds"] = import_seconds
+        record_event(fullname, "miss", miss["start"], import_seconds or 0.0, origin=miss["origin"])
+        if self.log is None:
+            return
+        line = json.dumps({"package": fullname, "host": socket.gethostname(), "pid": os.getpid()} | miss)
+        # Appends of one line are not interleaved with other processes
+        with open(self.log, "a") as fp:
+            fp.write(line + "\n")
+
+def add_miss_finder(package_path: str,
+                    proxied: Iterable[str],
+                    options: Optional[dict[str, Any] | bool],
+                    skipped: Iterable[str] = ()) -> Optional[MissFinder]:
+    """Adds a MissFinder after the importers on sys.meta_path, for the "report_misses"
+    option of the configuration (True, or a dictionary with the path of a "log"). There
+    is one finder per process, importers added later share it. Packages that were
+    skipped on purpose are not reported.
+    """
+    if not options:
+        return None
+    options = options if isinstance(options, dict) else dict()
+    log = options.get("log")
+    if log is not None:
+        log = os.path.expanduser(log)
+        os.makedirs(os.path.dirname(os.path.abspath(log)), exist_ok=True)
+
+    for existing in sys.meta_path:
+        if isinstance(existing, MissFinder):
+            existing.proxied.update(proxied)
+            existing.skipped.update(skipped)
+            existing.log = log or existing.log
+            return existing
+
+    finder = MissFinder(package_path, proxied, log, skipped)
+    # After the ProxyImporter and other finders of this library, before the path finder
+    position = 0
+    for i, existing in enumerate(sys.meta_path):
+        if type(existing).__module__.startswith("proxy_imports."):
+            position = i + 1
+    sys.meta_path.insert(position, finder)
+    return finder
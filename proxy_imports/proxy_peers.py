@@ -0,0 +1,238 @@
+"""Distribution of packages between workers.
+
+When many nodes import the same package, each of them reads the same blob from
+the module store. With peers enabled, the worker extracting a package on a node
+serves the blob to workers on other nodes, in a broadcast tree: the n-th node to
+ask for a blob (its rank) fetches it from node (n - 1) // fanout, and only the
+first one reads it from the store. Nodes find their parent through a registry
+directory on the shared filesystem, which only holds one small file per node
+and blob. If the parent fails or does not answer in time, the blob is read from
+the store instead.
+
+Configured with the "peers" entry of the configuration:
+
+    "peers": {
+        "directory": "/path/on/shared/fs", # Registry, use a new one for every run
+        "fanout": 2,                        # Number of children of every node
+        "host": None,                       # Address others reach this node at, hostname by default
+        "bind": None,                       # Address the server listens on, host by default ("" for all interfaces)
+        "timeout": 30,                      # Seconds to wait for a parent before using the store
+        "memory": 256 * 2**20,              # Bytes of blobs served from memory, others are served from "spool"
+        "spool": None,                      # Node local directory for the other blobs, a temporary directory by default
+    }
+
+Requests carry a secret written to the registry directory by the first node, so
+only processes that can read the registry get blobs.
+"""
+from collections import OrderedDict
+import hmac
+import os
+from pathlib import Path
+import secrets
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Optional
+import weakref
+
+from .proxy_timing import record_event
+
+_LENGTH = struct.Struct("!Q")
+
+class PeerServer:
+    """Serves the blobs fetched by this process to other nodes. Blobs are kept in memory
+    up to a budget, least recently used first, and the others are served from a file in
+    the spool directory, so a worker does not hold every package it served in memory.
+    """
+
+    def __init__(self, host: str, timeout: float, bind: Optional[str] = None, memory: int = 256 * 2**20, spool: Optional[str] = None):
+        self.timeout = timeout
+        self.memory_limit = memory
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_bytes = 0
+        self.available: dict[str, bool] = dict() # False if this process failed to fetch the blob
+        self.tokens: set[str] = set()
+        self.condition = threading.Condition()
+
+        if spool is None:
+            self.spool = Path(tempfile.mkdtemp(prefix="proxy-imports-peers-"))
+            weakref.finalize(self, shutil.rmtree, self.spool, ignore_errors=True)
+        else:
+            self.spool = Path(spool).expanduser() / f"{socket.gethostname()}-{os.getpid()}"
+            self.spool.mkdir(parents=True, exist_ok=True)
+            weakref.finalize(self, shutil.rmtree, self.spool, ignore_errors=True)
+
+        self.socket = socket.create_server((host if bind is None else bind, 0))
+        self.address = f"{host}:{self.socket.getsockname()[1]}"
+        self.thread = threading.Thread(target=self._serve, name="proxy-imports-peers", daemon=True)
+        self.thread.start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            try:
+                conn.settimeout(self.timeout)
+                token, _, blob_id = conn.makefile("rb").readline().decode().strip().partition(" ")
+                with self.condition:
+                    authorized = any(hmac.compare_digest(token, known) for known in self.tokens)
+                if not authorized:
+                    conn.sendall(_LENGTH.pack(0))
+                    return
+
+                # The request may come in while this process is still fetching the blob
+                with self.condition:
+                    self.condition.wait_for(lambda: blob_id in self.available, self.timeout)
+                    data = self.memory.get(blob_id)
+                    if data is not None:
+                        self.memory.move_to_end(blob_id)
+                    elif not self.available.get(blob_id):
+                        conn.sendall(_LENGTH.pack(0))
+                        return
+                if data is not None:
+                    conn.sendall(_LENGTH.pack(len(data)))
+                    conn.sendall(data)
+                    return
+                with open(self.spool / blob_id, "rb") as fp:
+                    conn.sendall(_LENGTH.pack(os.fstat(fp.fileno()).st_size))
+                    conn.sendfile(fp)
+            except (OSError, UnicodeDecodeError):
+                pass
+
+    def add(self, blob_id: str, data: Optional[bytes]) -> None:
+        """Serves a blob, or answers that this process does not have it if data is None"""
+        if data is not None and len(data) > self.memory_limit:
+            self._spool(blob_id, data)
+            data = None
+        with self.condition:
+            if data is not None:
+                self.memory[blob_id] = data
+                self.memory_bytes += len(data)
+            self.available[blob_id] = data is not None or (self.spool / blob_id).exists()
+            while self.memory_bytes > self.memory_limit:
+                evicted_id, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+                # Written while holding the lock, so a request never finds neither copy
+                self._spool(evicted_id, evicted)
+            self.condition.notify_all()
+
+    def _spool(self, blob_id: str, data: bytes) -> None:
+        partial = self.spool / f"{blob_id}.partial"
+        partial.write_bytes(data)
+        os.replace(partial, self.spool / blob_id)
+
+    def close(self) -> None:
+        self.socket.close()
+
+_server: Optional[PeerServer] = None
+_server_lock = threading.Lock()
+def get_server(config: dict[str, Any]) -> PeerServer:
+    """Server of this process, started on first use"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = PeerServer(config.get("host") or socket.gethostname(), config.get("timeout", 30), config.get("bind"),
+                                 config.get("memory", 256 * 2**20), config.get("spool"))
+        return _server
+
+def _run_token(directory: Path, timeout: float) -> str:
+    """Secret of the run, created by the first node in the registry and only readable by
+    its user"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / ".token"
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    except FileExistsError:
+        return _read_address(path, timeout)
+    token = secrets.token_hex(16)
+    with os.fdopen(fd, "w") as fp:
+        fp.write(token)
+    return token
+
+def _register(directory: Path, address: str) -> int:
+    """Registers this node as a holder of the blob, and returns its rank"""
+    directory.mkdir(parents=True, exist_ok=True)
+    rank = len(os.listdir(directory))
+    while True:
+        try:
+            fd = os.open(directory / str(rank), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            rank += 1
+            continue
+        with os.fdopen(fd, "w") as fp:
+            fp.write(address)
+        return rank
+
+def _read_address(path: Path, timeout: float) -> str:
+    """Address of a node, waiting for it to be written after the file is created"""
+    deadline = time.monotonic() + timeout
+    while True:
+        address = path.read_text().strip()
+        if address:
+            return address
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"No address in {path}")
+        time.sleep(0.01)
+
+def _fetch_from_peer(address: str, blob_id: str, token: str, timeout: float) -> bytes:
+    host, _, port = address.rpartition(":")
+    with socket.create_connection((host, int(port)), timeout=timeout) as conn:
+        conn.sendall(f"{token} {blob_id}\n".encode())
+        stream = conn.makefile("rb")
+        header = stream.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            raise ConnectionError(f"Peer {address} closed the connection")
+        (length,) = _LENGTH.unpack(header)
+        if length == 0:
+            raise LookupError(f"Peer {address} does not have {blob_id}")
+        data = stream.read(length)
+        if len(data) < length:
+            raise ConnectionError(f"Peer {address} closed the connection")
+        return data
+
+def fetch_blob(blob_id: str, fetch_from_store: Callable[[], bytes], config: dict[str, Any], package: Optional[str] = None) -> tuple[bytes, str]:
+    """Fetches a blob from the parent of this node in the broadcast tree, or from the
+    store if this node is the root or the parent fails. The blob is then served to the
+    children of this node.
+
+    Args:
+        package (str): package the blob belongs to, for the timing events.
+
+    Returns:
+        The blob and where it came from ("peer" or "store").
+    """
+    server = get_server(config)
+    timeout = config.get("timeout", 30)
+    token = _run_token(Path(config["directory"]).expanduser(), timeout)
+    with server.condition:
+        server.tokens.add(token)
+    directory = Path(config["directory"]).expanduser() / blob_id
+    rank = _register(directory, server.address)
+
+    data = None
+    try:
+        if rank > 0:
+            parent = (rank - 1) // config.get("fanout", 2)
+            start = time.time()
+            tic = time.perf_counter()
+            try:
+                address = _read_address(directory / str(parent), timeout)
+                data, source = _fetch_from_peer(address, blob_id, token, timeout), "peer"
+            except (OSError, LookupError) as e:
+                record_event(package or blob_id, "peer_fallback", start, time.perf_counter() - tic,
+                             blob=blob_id, parent=parent, error=repr(e))
+        if data is None:
+            data, source = fetch_from_store(), "store"
+    finally:
+        # Children waiting on a failed fetch fall back to the store
+        server.add(blob_id, data)
+    return data, source
@@ -0,0 +1,116 @@
+"""Fetching packages when a worker starts, before its first task arrives.
+
+Without prefetching, a worker only starts fetching and extracting packages when
+its first task sets up the imports, so the first tasks on a new block all wait
+for them. With prefetching, the packages are in place by the time tasks arrive:
+
+    # concurrent.futures
+    proxies = store_modules(["numpy"], config=config)
+    executor = ProcessPoolExecutor(initializer=prefetch, initargs=(proxies, config))
+
+    # Parsl, HighThroughputExecutor(worker_init=...)
+    worker_init = worker_init_command(proxies, config, "/shared/fs/prefetch.pkl")
+
+Tasks transformed with proxy_transform find the packages already extracted on
+the node. Tasks that are not transformed can import the packages directly in
+processes started with the `prefetch` initializer.
+"""
+import os
+from pathlib import Path
+import pickle
+import shlex
+import sys
+from typing import Any, Optional, Union
+
+from proxystore.proxy import Proxy
+
+from .proxy_config import read_config
+from .proxy_importer import ProxyImporter, warm_up_modules
+from .proxy_misses import add_miss_finder
+
+def prefetch(proxied_modules: dict[str, Proxy], config: Optional[Union[dict[str, Any], str]] = None) -> ProxyImporter:
+    """Adds a ProxyImporter for proxied_modules to this process, which starts fetching
+    and extracting the packages in the background. Can be used as the initializer of
+    a process pool.
+
+    Args:
+        proxied_modules (dict): proxies of the stored packages, by package name.
+        config (dict): configuration (or its path) with the package path and the options
+            of the importer (lazy_attributes, warm_up, peers, blob_cache, fetch_policy,
+            child_processes, batch_fetches). If warm_up is True, the proxied packages that
+            are not fetched lazily are imported in the background (see warm_up_modules). With report_misses, packages imported from outside the
+            package path are recorded (see proxy_misses), except the skipped_modules.
+    """
+    if config is None or isinstance(config, str):
+        config = read_config(config)
+
+    importer = ProxyImporter(
+            proxied_modules,
+            config["package_path"],
+            lazy_attributes=config.get("lazy_attributes", False),
+            peers=config.get("peers"),
+            blob_cache=config.get("blob_cache"),
+            fetch_policy=config.get("fetch_policy"),
+            child_processes=config.get("child_processes", False),
+            batch_fetches=config.get("batch_fetches", False)
+        )
+    sys.meta_path.insert(0, importer)
+    add_miss_finder(config["package_path"], proxied_modules, config.get("report_misses"), config.get("skipped_modules", ()))
+
+    warm_up = warm_up_modules(config.get("warm_up"), importer.fetch_policy)
+    if warm_up:
+        importer.warm_up(warm_up)
+    return importer
+
+def worker_init_command(proxied_modules: dict[str, Proxy],
+                        config: Optional[Union[dict[str, Any], str]],
+                        path: str,
+                        background: bool = True) -> str:
+    """Writes the proxies and configuration to path, which must be readable by the workers,
+    and returns a shell command that prefetches them, i.e. for Parsl's `worker_init`. With
+    background, the command returns immediately and the workers start while the packages
+    are extracted, their first import waits for the extraction.
+    """
+    from .proxy_analyze import _store_lock, skipped_modules
+
+    if config is None or isinstance(config, str):
+        config = read_config(config)
+    # Not reported as misses by the workers (see proxy_misses)
+    with _store_lock:
+        config = config | {"skipped_modules": sorted(skipped_modules)}
+
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{path}.partial", "wb") as fp:
+        pickle.dump({"proxied_modules": proxied_modules, "config": config}, fp)
+    os.replace(f"{path}.partial", path)
+
+    command = f"python -m proxy_imports.proxy_prefetch {shlex.quote(str(path))}"
+    if background:
+        command += " &"
+    return command
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch and extract the packages written by worker_init_command")
+    parser.add_argument("path", type=str, help="File written by worker_init_command")
+    opts = parser.parse_args()
+
+    with open(opts.path, "rb") as fp:
+        prefetch_file = pickle.load(fp)
+    config = dict(prefetch_file["config"])
+    # Warming up only matters in the processes that run tasks
+    config["warm_up"] = None
+    importer = prefetch(prefetch_file["proxied_modules"], config)
+    importer.wait()
+
+    failed = False
+    for name, future in importer._proxied_modules.items():
+        if future.exception() is not None:
+            print(f"Could not prefetch {name}: {future.exception()!r}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Connectors to the module store, shared by all fetches of a worker process.
+
+Every stored package carries the configuration of its store. Resolving the proxy
+of a package looks the store up by name, under a global lock, and builds a new
+Store (with its memory cache) when the name is unknown or was used for another
+store. Packages of different tasks (different envelopes, drivers restarted with
+the same store) would each set up a connector again: a Redis connection pool,
+a check of the store directory, and so on.
+
+Instead, the importer reads packages through one connector per store
+configuration in the process, created on first use and reused by every package
+and task. Several packages of the same store are read with a single get_batch,
+i.e. one MGET on Redis, instead of one request each (see fetch_batch and
+"batch_fetches" in ProxyImporter).
+"""
+from collections import defaultdict
+import threading
+from typing import Any
+
+from proxystore.proxy import Proxy
+from proxystore.utils import import_class
+
+def _config_key(store_config: dict[str, Any]) -> tuple:
+    """Key of a store configuration. Values that are not plain settings, i.e. the
+    dictionary of a LocalConnector, are keyed by identity. Their ids are only unique
+    while they are alive, so the registry keeps them with the connector."""
+    def value(v):
+        return v if isinstance(v, (str, int, float, bool, type(None))) else ("id", id(v))
+    connector_config = store_config.get("connector_config") or dict()
+    return (store_config["name"], store_config["connector_type"],
+            tuple(sorted((k, value(v)) for k, v in connector_config.items())))
+
+# Key of each configuration to its connector and the values of its connector_config
+_connectors: dict[tuple, tuple[Any, tuple]] = dict()
+_connectors_lock = threading.Lock()
+def get_connector(store_config: dict[str, Any]) -> Any:
+    """Connector of this process for a store configuration, created on first use"""
+    key = _config_key(store_config)
+    with _connectors_lock:
+        if key not in _connectors:
+            connector_type = import_class(store_config["connector_type"])
+            connector_config = store_config["connector_config"]
+            _connectors[key] = (connector_type.from_config(connector_config), tuple((connector_config or dict()).values()))
+        return _connectors[key][0]
+
+def fetch_bytes(proxy: Proxy) -> bytes:
+    """Reads the serialized object of a proxy from its store. Unlike resolving the
+    proxy, this does not keep the object in the memory cache of the store or in the proxy.
+    """
+    factory = proxy.__factory__
+    data = get_connector(factory.store_config).get(factory.key)
+    if data is None:
+        raise ValueError(f"Package {factory.key} is not in the store")
+    return data
+
+def fetch_batch(proxies: list[Proxy]) -> list[bytes]:
+    """Reads the serialized objects of several proxies, with one request per store"""
+    by_store = defaultdict(list)
+    for i, proxy in enumerate(proxies):
+        by_store[_config_key(proxy.__factory__.store_config)].append(i)
+
+    results = [None] * len(proxies)
+    for indices in by_store.values():
+        factories = [proxies[i].__factory__ for i in indices]
+        data = get_connector(factories[0].store_config).get_batch([factory.key for factory in factories])
+        for i, factory, blob in zip(indices, factories, data):
+            if blob is None:
+                raise ValueError(f"Package {factory.key} is not in the store")
+            results[i] = blob
+    return results
@@ -0,0 +1,130 @@
+"""Structured timing events for the packaging and import pipeline.
+
+Every stage of moving a package (tarring on the driver, fetching, deserializing
+and extracting on the worker, executing the module) records an event here. The
+events are kept per process and can be turned into a JSON serializable report
+with `get_timing_report`.
+
+Only the last MAX_EVENTS events are kept, older events are dropped when new ones
+are recorded. Reports of a single task should not clear the events, since other
+tasks of the process may still be running: take `event_mark()` when the task
+starts and pass it as `since` to `get_timing_report`.
+"""
+from collections import deque
+from contextlib import contextmanager
+import itertools
+import os
+import socket
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+MAX_EVENTS = 100_000
+
+_events: deque[dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+# Number of events ever recorded (or cleared) in this process, marks are counted in it
+_recorded = 0
+_events_lock = threading.Lock()
+
+def record_event(package: str, stage: str, start: float, duration: float, **info: Any) -> dict[str, Any]:
+    """Record a single span of the pipeline.
+
+    Args:
+        package (str): top level package the span belongs to.
+        stage (str): name of the stage, i.e. "fetch" or "exec_module".
+        start (float): wall clock time (time.time()) the stage started.
+        duration (float): length of the stage in seconds.
+        info: any additional (JSON serializable) information, i.e. number of bytes.
+    """
+    event = {
+        "package": package,
+        "stage": stage,
+        "start": start,
+        "duration": duration,
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+    }
+    event.update(info)
+    global _recorded
+    with _events_lock:
+        _events.append(event)
+        _recorded += 1
+    return event
+
+@contextmanager
+def timed(package: str, stage: str, **info: Any) -> Iterator[dict[str, Any]]:
+    """Context manager that records the enclosed block as a stage. The yielded
+    dictionary can be used to attach information that is only known at the end
+    of the stage (i.e. the number of bytes read).
+    """
+    start = time.time()
+    tic = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record_event(package, stage, start, time.perf_counter() - tic, **info)
+
+def event_mark() -> int:
+    """Position of the next recorded event, to only read the events recorded after it"""
+    with _events_lock:
+        return _recorded
+
+def _events_since(since: Optional[int]) -> list[dict[str, Any]]:
+    # Must hold _events_lock. Events before the oldest kept one were dropped already
+    if since is None:
+        return list(_events)
+    start = max(len(_events) - (_recorded - since), 0)
+    return list(itertools.islice(_events, start, None))
+
+def get_events(package: Optional[str] = None, since: Optional[int] = None) -> list[dict[str, Any]]:
+    """Returns a copy of the events recorded in this process, optionally only for one
+    package or only the events recorded after the mark since (see event_mark)"""
+    with _events_lock:
+        events = _events_since(since)
+    if package is not None:
+        events = [e for e in events if e["package"] == package]
+    return events
+
+def clear_events() -> None:
+    """Drops all events of this process, including those of tasks that are still running"""
+    with _events_lock:
+        _events.clear()
+
+def get_timing_report(clear: bool = False, since: Optional[int] = None) -> dict[str, Any]:
+    """Summarize the recorded events into a machine readable report.
+
+    The report contains the total time spent in each stage per package, the
+    number of bytes handled by each stage that reported it, the packages that
+    were fetched but never imported, the packages imported from outside the package
+    path, and the raw events.
+
+    Args:
+        clear (bool): clear the recorded events after creating the report.
+        since (int): only report the events recorded after this mark (see event_mark).
+    """
+    with _events_lock:
+        events = _events_since(since)
+        if clear:
+            _events.clear()
+
+    packages: dict[str, dict[str, Any]] = dict()
+    for event in events:
+        summary = packages.setdefault(event["package"], {"stages": dict(), "bytes": dict()})
+        stage = event["stage"]
+        summary["stages"][stage] = summary["stages"].get(stage, 0.0) + event["duration"]
+        if "bytes" in event:
+            summary["bytes"][stage] = summary["bytes"].get(stage, 0) + event["bytes"]
+
+    # Candidates for a lazy fetch policy
+    unused = [name for name, summary in packages.items() if "fetch" in summary["stages"] and "first_import" not in summary["stages"]]
+    # Imported from outside the package path (see proxy_misses), candidates for proxying
+    misses = [name for name, summary in packages.items() if "miss" in summary["stages"]]
+
+    return {
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "packages": packages,
+        "unused": unused,
+        "misses": misses,
+        "events": events,
+    }
@@ -1,37 +1,119 @@
-from functools import wraps
-from typing import Any
+from concurrent.futures import Future
+from functools import update_wrapper
+import hashlib
+import json
+from typing import Any, Callable
 
 from proxystore.proxy import Proxy
-from .proxy_analyze import analyze_func_and_create_proxies
-from .proxy_analyze import load_config
-from dill import dumps # Would rather use pickle or parsl, but breaks when decorator is not used.
 
-def proxy_transform(f=None, config_path=None):
+# The packaging stack (proxy_analyze, dill) is imported when a function is transformed,
+# so importing proxy_imports on a worker stays cheap
+
+def _envelope_id(envelope: dict[str, Any], store_config: dict[str, Any]) -> str:
+    """Content hash of an envelope and of the store it is kept in. Every entry of the
+    envelope is hashed, the proxies by the key of their stored object.
+    """
+    digest = hashlib.sha256(envelope["function"])
+    entries = {key: value for key, value in envelope.items() if key != "function"}
+    # Not resolved, a proxy only stands for its stored object
+    entries["proxied_modules"] = {name: repr(proxy.__factory__.key) for name, proxy in envelope["proxied_modules"].items()}
+    digest.update(json.dumps({"envelope": entries, "store": store_config}, sort_keys=True, default=repr).encode())
+    return digest.hexdigest()
+
+# Envelopes stored by this process, keyed by content hash
+_envelopes: dict[str, Proxy] = dict()
+def _register_envelope(payload: bytes, proxies: dict[str, Proxy], config: dict[str, Any], fetch_policy: dict[str, str]) -> tuple[str, Proxy]:
+    """Stores the function payload and its proxied modules once, and returns the content
+    hash with a proxy of the stored envelope. The proxy only serializes its key, so it is
+    cheap to send with every task.
+    """
+    from .proxy_analyze import _store_lock, create_store_from_config, skipped_modules
+    from .proxy_importer import warm_up_modules
+
+    # Not reported as misses by the workers (see proxy_misses)
+    with _store_lock:
+        skipped = sorted(skipped_modules)
+    envelope = {
+        "function": payload,
+        "proxied_modules": proxies,
+        "package_path": config["package_path"],
+        "lazy_attributes": config.get("lazy_attributes", False),
+        "warm_up": warm_up_modules(config.get("warm_up", False), fetch_policy),
+        "peers": config.get("peers"),
+        "blob_cache": config.get("blob_cache"),
+        "fetch_policy": fetch_policy,
+        "child_processes": config.get("child_processes", False),
+        "batch_fetches": config.get("batch_fetches", False),
+        "report_misses": config.get("report_misses"),
+        "skipped_modules": skipped,
+    }
+    envelope_id = _envelope_id(envelope, config["module_store_config"])
+    if envelope_id not in _envelopes:
+        store = create_store_from_config(config["module_store_config"])
+        _envelopes[envelope_id] = store.proxy(envelope)
+    return envelope_id, _envelopes[envelope_id]
+
+def _identity(obj: Any) -> Any:
+    return obj
+
+class PendingTransform:
+    """Stands in for a transformed function while its dependencies are packaged in the
+    background. Calling or serializing it waits for the packaging to finish, and
+    serializing it produces the transformed function itself.
+    """
+
+    def __init__(self, func: Callable, future: Future):
+        self._future = future
+        update_wrapper(self, func, assigned=("__module__", "__name__", "__qualname__", "__annotations__","__doc__"))
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self, timeout: float | None = None) -> Callable:
+        """Waits for packaging to finish and returns the transformed function"""
+        return self._future.result(timeout)
+
+    def __call__(self, *args: list[Any], **kwargs: dict[str, Any]) -> Any:
+        return self.result()(*args, **kwargs)
+
+    def __reduce__(self):
+        return (_identity, (self.result(),))
+
+def proxy_transform(f=None, config_path=None, timing=False, asynchronous=False):
     """Transforms a function to extract all the module imports, proxy the necessary modules
-    and returns a function that accepts the proxied module, sets up the imports, and 
+    and returns a function that accepts the proxied module, sets up the imports, and
     and calls the transformed function.
+
+    The function and the proxied modules are stored once, and the transformed function
+    only carries a reference to them. Workers load the function on its first call and
+    reuse it for later calls.
+
+    If timing is True, the transformed function returns a tuple of the result and
+    the timing report (see `proxy_imports.proxy_timing.get_timing_report`) of the
+    worker for that call.
+
+    If asynchronous is True, the dependencies are traced, packaged and stored in the
+    background and a `PendingTransform` is returned immediately. It waits for the
+    packaging when it is first called or serialized.
     """
 
+    from .proxy_analyze import analyze_func_and_create_proxies, fetch_policies, get_packaging_pool, load_config
+    from .proxy_worker import transformed_function
+
     config = load_config(config_path)
 
-    def decorator(wrapped_func):
+    def transform(wrapped_func):
+        from dill import dumps # Would rather use pickle or parsl, but breaks when decorator is not used.
+
         proxies = analyze_func_and_create_proxies(wrapped_func, config)
         payload = dumps(wrapped_func)
+        envelope_id, envelope = _register_envelope(payload, proxies, config, fetch_policies(list(proxies), config))
+        return transformed_function(wrapped_func, envelope_id, envelope, timing)
 
-        @wraps(wrapped_func, assigned=("__name__", "__qualname__", "__annotations__","__doc__"))
-        def wrapped(*args: list[Any], 
-                    serialized_func: str = payload, 
-                    proxied_modules: dict[str, Proxy] = proxies,
-                    package_path: str = config["package_path"],
-                    **kwargs: dict[str, Any]) -> Any:
-            import sys
-            from dill import loads
-            from .proxy_importer import ProxyImporter
-            sys.meta_path.insert(0, ProxyImporter(proxied_modules, package_path))
-            func = loads(serialized_func)
-            return func(*args, **kwargs)
-
-        return wrapped
+    def decorator(wrapped_func):
+        if asynchronous:
+            return PendingTransform(wrapped_func, get_packaging_pool().submit(transform, wrapped_func))
+        return transform(wrapped_func)
 
     if f is None:
         return decorator
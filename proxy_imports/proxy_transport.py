@@ -0,0 +1,111 @@
+"""Choosing how each package is shipped to the workers.
+
+Proxying a package is not always worth it. A tiny pure Python package is cheaper
+to import from the shared filesystem than to fetch, lock and extract, and a huge
+one is fetched faster in several shards. With an "endpoint" entry in the
+configuration, store_modules estimates the cost of each way of shipping a
+package and picks the cheapest:
+
+    - skip: not proxied, workers import it from the shared filesystem
+    - tar: one archive, extracted on the node (the default without "endpoint")
+    - zip: one zip file with compiled byte code, imported with zipimport without
+      extracting anything. Only for packages of Python files.
+    - sharded: several archives, fetched in parallel and extracted on the node
+
+The estimates use the size and number of files of the package, and these
+characteristics of the endpoint (defaults in ENDPOINT_DEFAULTS):
+
+    "endpoint": {
+        "metadata_latency": 0.001,    # Seconds to open a file on the shared filesystem
+        "bandwidth": 1e9,             # Bytes per second read from the store or shared filesystem
+        "fetch_latency": 0.05,        # Seconds to fetch a package: store, lock files, deserializing
+        "file_create": 5e-5,          # Seconds to create a file on the node local disk
+        "shard_bytes": 256 * 2**20,   # Size of a shard, smaller packages are not sharded
+        "parallel_fetches": 4,        # Shards fetched at the same time
+    }
+
+Workers must have access to the filesystem the driver imports packages from,
+otherwise skipped packages can not be imported.
+"""
+import math
+import os
+from typing import Any
+
+METHODS = ("skip", "tar", "zip", "sharded")
+
+ENDPOINT_DEFAULTS = {
+    "metadata_latency": 0.001,
+    "bandwidth": 1e9,
+    "fetch_latency": 0.05,
+    "file_create": 5e-5,
+    "shard_bytes": 256 * 2**20,
+    "parallel_fetches": 4,
+}
+
+# Files that can be imported from a zip file, other files (extension modules, data
+# read through __file__) need to be on the filesystem
+_ZIP_SUFFIXES = (".py", ".pyi", "py.typed")
+
+def package_stats(module_path: str) -> dict[str, Any]:
+    """Number of files, bytes and whether all files can be imported from a zip file,
+    for the file or directory of a module"""
+    if os.path.isfile(module_path):
+        paths = [module_path]
+    else:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(module_path):
+            dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+
+    size = 0
+    for path in paths:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            continue
+    return {
+        "files": len(paths),
+        "bytes": size,
+        "zip_safe": all(path.endswith(_ZIP_SUFFIXES) for path in paths),
+    }
+
+def choose_transport(stats: dict[str, Any], endpoint: dict[str, Any]) -> dict[str, Any]:
+    """Picks the cheapest way to ship a package.
+
+    Args:
+        stats (dict): files, bytes and zip_safe of the package (see package_stats).
+        endpoint (dict): characteristics of the endpoint, see ENDPOINT_DEFAULTS.
+
+    Returns:
+        The method, the reason for it, the estimated seconds of each method that
+        applies, and the number of shards.
+    """
+    endpoint = ENDPOINT_DEFAULTS | endpoint
+    files, size = stats["files"], stats["bytes"]
+    transfer = size / endpoint["bandwidth"]
+    shards = max(1, math.ceil(size / endpoint["shard_bytes"]))
+
+    estimates = {
+        "skip": files * endpoint["metadata_latency"] + transfer,
+        "tar": endpoint["fetch_latency"] + transfer + files * endpoint["file_create"],
+    }
+    if stats["zip_safe"]:
+        estimates["zip"] = endpoint["fetch_latency"] + transfer + endpoint["file_create"]
+    if shards > 1:
+        parallel = min(shards, endpoint["parallel_fetches"])
+        estimates["sharded"] = (endpoint["fetch_latency"] * math.ceil(shards / parallel)
+                                + transfer / parallel + files * endpoint["file_create"])
+
+    method = min(estimates, key=estimates.get)
+    others = sorted((estimate, name) for name, estimate in estimates.items() if name != method)
+    reason = f"{method} estimated at {estimates[method]:.3f}s for {files} files and {size} bytes"
+    if others:
+        reason += f", next best is {others[0][1]} at {others[0][0]:.3f}s"
+    if not stats["zip_safe"]:
+        reason += ", not zip: has files that can not be imported from a zip"
+    return {
+        "method": method,
+        "reason": reason,
+        "estimates": estimates,
+        "shards": shards if method == "sharded" else 1,
+    }
@@ -0,0 +1,58 @@
+"""Worker side of transformed functions.
+
+Transformed functions are defined in this module, so deserializing one on a
+worker only imports what is needed to fetch and unpack packages. The packaging
+stack (PyInstaller, tracing, tarring) is never imported on the worker.
+"""
+from functools import update_wrapper
+import inspect
+import threading
+from typing import Any, Callable
+
+from proxystore.proxy import Proxy
+from proxystore.serialize import deserialize
+
+from .proxy_prefetch import prefetch
+from .proxy_stores import fetch_bytes
+from .proxy_timing import event_mark, get_timing_report
+
+# Functions loaded on this worker, keyed by the content hash of their envelope
+_loaded_functions: dict[str, Callable] = dict()
+_loaded_functions_lock = threading.Lock()
+def load_function(envelope_id: str, envelope: Proxy) -> Callable:
+    """Fetches the envelope, sets up the proxied imports and deserializes the
+    function the first time a function is called in this process.
+    """
+    with _loaded_functions_lock:
+        if envelope_id not in _loaded_functions:
+            from dill import loads
+
+            # Read through the connector the packages of the envelope are read with
+            envelope = deserialize(fetch_bytes(envelope))
+            # The envelope holds the options of the importer, like a configuration
+            prefetch(envelope["proxied_modules"], envelope)
+            _loaded_functions[envelope_id] = loads(envelope["function"])
+        return _loaded_functions[envelope_id]
+
+def transformed_function(wrapped_func: Callable, envelope_id: str, envelope: Proxy, timing: bool = False) -> Callable:
+    """Creates the function that is sent to workers in place of wrapped_func"""
+
+    def wrapped(*args: list[Any],
+                envelope_id: str = envelope_id,
+                envelope: Proxy = envelope,
+                report_timing: bool = timing,
+                **kwargs: dict[str, Any]) -> Any:
+        if report_timing:
+            # Other tasks of the worker may be running, only report the events of this one
+            mark = event_mark()
+        func = load_function(envelope_id, envelope)
+        result = func(*args, **kwargs)
+        if report_timing:
+            return result, get_timing_report(since=mark)
+        return result
+
+    # Not using __wrapped__, it would send the original function with every task
+    update_wrapper(wrapped, wrapped_func, assigned=("__name__", "__qualname__", "__annotations__","__doc__"), updated=())
+    del wrapped.__wrapped__
+    wrapped.__signature__ = inspect.signature(wrapped_func)
+    return wrapped
@@ -0,0 +1,67 @@
+import sys
+
+import pytest
+
+import proxy_imports.proxy_analyze as proxy_analyze
+from proxy_imports import store_modules
+
+@pytest.fixture
+def store_config(request, tmp_path):
+    """Configuration with a module store in tmp_path, named after the test module"""
+    return {
+        "package_path": str(tmp_path / "proxied-site-packages"),
+        "module_store_config": {
+            "name": f"{request.module.__name__}-store-{tmp_path.name}",
+            "connector_type": "proxystore.connectors.file.FileConnector",
+            "connector_config": {"store_dir": str(tmp_path / "store")},
+            "cache_size": 0,
+        },
+    }
+
+@pytest.fixture
+def stored_package(tmp_path, store_config):
+    """Writes packages to tmp_path / "src" and stores them.
+
+    Called with the files of the packages, by path relative to the source directory.
+    Returns the proxies (None if store is False) and the configuration, which has the
+    options passed as keyword arguments. The packages are removed from sys.modules, and
+    the source directory from sys.path unless on_path is True, so tests import them
+    through an importer. Everything is cleaned up after the test.
+    """
+    src = tmp_path / "src"
+    names = set()
+
+    def store(files: dict[str, str | bytes], modules: list[str] | None = None, store: bool = True, on_path: bool = False, **options):
+        for path, content in files.items():
+            (src / path).parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, bytes):
+                (src / path).write_bytes(content)
+            else:
+                (src / path).write_text(content)
+            names.add(path.partition("/")[0].removesuffix(".py"))
+        if modules is None:
+            modules = list(dict.fromkeys(path.partition("/")[0].removesuffix(".py") for path in files))
+        config = store_config | options
+
+        if str(src) not in sys.path:
+            sys.path.insert(0, str(src))
+        proxies = store_modules(modules, trace=False, config=config) if store else None
+        if not on_path:
+            sys.path.remove(str(src))
+        _forget(names)
+        return proxies, config
+
+    yield store
+    if str(src) in sys.path:
+        sys.path.remove(str(src))
+    _forget(names)
+    for name in names:
+        proxy_analyze.proxied_modules.pop(name, None)
+        proxy_analyze.package_records.pop(name, None)
+        proxy_analyze.package_transports.pop(name, None)
+        proxy_analyze.skipped_modules.pop(name, None)
+
+def _forget(names: set[str]) -> None:
+    for name in list(sys.modules):
+        if name.partition(".")[0] in names:
+            del sys.modules[name]
@@ -0,0 +1,30 @@
+import asyncio
+
+import dill
+import pytest
+
+from proxy_imports import proxy_transform, store_modules_async
+from proxy_imports.proxy_transform import PendingTransform
+
+@pytest.fixture
+def config(stored_package):
+    _, config = stored_package({"asyncpkg/__init__.py": "VALUE = 1\n"}, store=False, on_path=True)
+    return config
+
+def test_store_modules_async(config):
+    proxies = asyncio.run(store_modules_async("asyncpkg", trace=False, config=config))
+    assert list(proxies) == ["asyncpkg"]
+
+def task(a):
+    return a + 1
+
+def test_asynchronous_transform(config):
+    pending = proxy_transform(task, config_path=config, asynchronous=True)
+    assert isinstance(pending, PendingTransform)
+    assert pending.__name__ == "task"
+
+    # Serializing waits for packaging and sends the transformed function
+    transformed = dill.loads(dill.dumps(pending))
+    assert pending.done()
+    assert not isinstance(transformed, PendingTransform)
+    assert transformed.__name__ == "task"
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter
+from proxy_imports.proxy_cache import BlobCache
+from proxy_imports.proxy_timing import clear_events, get_events
+
+def test_tiers(tmp_path):
+    fetches = []
+    def fetch():
+        fetches.append(1)
+        return b"blob", "store"
+
+    cache = BlobCache(str(tmp_path / "blobs"), memory=2**20)
+    assert cache.get("a", fetch) == (b"blob", "store")
+    assert cache.get("a", fetch) == (b"blob", "memory")
+
+    # A new process on the same node
+    restarted = BlobCache(str(tmp_path / "blobs"), memory=2**20)
+    assert restarted.get("a", fetch) == (b"blob", "disk")
+    assert restarted.get("a", fetch) == (b"blob", "memory")
+
+    assert len(fetches) == 1
+    assert cache.stats()["misses"] == 1 and cache.stats()["memory_hits"] == 1
+    assert restarted.stats()["disk_hits"] == 1 and restarted.stats()["misses"] == 0
+
+def test_memory_limit(tmp_path):
+    cache = BlobCache(memory=10)
+    cache.get("a", lambda: (b"x" * 6, "store"))
+    cache.get("b", lambda: (b"y" * 6, "store"))
+    assert list(cache.memory) == ["b"]
+    assert cache.memory_bytes == 6
+    assert cache.get("a", lambda: (b"x" * 6, "store"))[1] == "store"
+
+def test_disk_limit(tmp_path):
+    blobs = tmp_path / "blobs"
+    cache = BlobCache(str(blobs), memory=0, disk=13)
+    cache.get("a", lambda: (b"x" * 6, "store"))
+    cache.get("b", lambda: (b"y" * 6, "store"))
+    os.utime(blobs / "a", (1, 1))
+    os.utime(blobs / "b", (2, 2))
+
+    # A hit on the node makes a the most recently used
+    assert cache.get("a", lambda: (b"x" * 6, "store"))[1] == "disk"
+    cache.get("c", lambda: (b"z" * 6, "store"))
+    assert sorted(path.name for path in blobs.iterdir()) == ["a", "c"]
+    assert cache.stats()["disk_evictions"] == 1
+
+    # Larger than the limit, only fetched
+    assert cache.get("d", lambda: (b"w" * 14, "store"))[1] == "store"
+    assert not (blobs / "d").exists()
+
+@pytest.fixture
+def proxies(stored_package, tmp_path):
+    proxies, _ = stored_package({"cachedpkg/__init__.py": "VALUE = 5\n"})
+    return proxies, tmp_path
+
+def test_importer_uses_cache(proxies):
+    proxies, tmp_path = proxies
+    blob_cache = {"directory": str(tmp_path / "blobs")}
+    clear_events()
+    for job in ["first", "second"]:
+        # A new package path, as for a new job on the same node
+        importer = ProxyImporter(proxies, str(tmp_path / job), blob_cache=blob_cache)
+        sys.meta_path.insert(0, importer)
+        try:
+            import cachedpkg
+            assert cachedpkg.VALUE == 5
+        finally:
+            sys.meta_path.remove(importer)
+            sys.modules.pop("cachedpkg", None)
+
+    assert [event["source"] for event in get_events("cachedpkg") if event["stage"] == "fetch"] == ["store", "disk"]
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from proxy_imports import ProxyImporter
+from proxy_imports.proxy_children import ENVIRONMENT_VARIABLE, propagate
+
+@pytest.fixture
+def environment(monkeypatch, tmp_path):
+    # The importer changes the environment of the process, restored after each test
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "sitecustomize.py").write_text("import os\nos.environ['ENVIRONMENT_SITECUSTOMIZE'] = 'ran'\n")
+    monkeypatch.setenv("PYTHONPATH", str(site))
+    monkeypatch.setenv("LD_LIBRARY_PATH", "")
+    monkeypatch.delenv(ENVIRONMENT_VARIABLE, raising=False)
+
+def run_child(code):
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, timeout=60).stdout.split()
+
+def test_child_imports_extracted_package(stored_package, environment):
+    proxies, config = stored_package({"childpkg/__init__.py": "NAME = 'childpkg'\n"})
+
+    importer = ProxyImporter(proxies, config["package_path"], child_processes=True)
+    importer.wait()
+    try:
+        # The child does not have src on its path, only the extracted package
+        path, site = run_child("import childpkg, os; print(childpkg.__file__, os.environ.get('ENVIRONMENT_SITECUSTOMIZE'))")
+        assert path.startswith(config["package_path"])
+        assert site == "ran"
+    finally:
+        sys.path.remove(config["package_path"])
+        sys.modules.pop("childpkg", None)
+
+def test_child_waits_for_extraction(tmp_path, environment):
+    package_path = tmp_path / "proxied-site-packages"
+    propagate(str(package_path), {"slowpkg": "0123456789abcdef"})
+
+    child = subprocess.Popen([sys.executable, "-c", "import time, slowpkg; print(time.time())"], stdout=subprocess.PIPE, text=True)
+    time.sleep(0.5)
+    (package_path / "slowpkg").mkdir()
+    (package_path / "slowpkg" / "__init__.py").write_text("")
+    extracted = time.time()
+    (package_path / "slowpkg-0123456789abcdef_done.tmp").touch()
+
+    stdout, _ = child.communicate(timeout=60)
+    assert child.returncode == 0
+    assert float(stdout) >= extracted
+
+def test_child_stops_waiting(tmp_path, environment, monkeypatch):
+    package_path = tmp_path / "proxied-site-packages"
+    propagate(str(package_path), {"slowpkg": "0123456789abcdef"})
+    settings = json.loads(os.environ[ENVIRONMENT_VARIABLE])
+    monkeypatch.setenv(ENVIRONMENT_VARIABLE, json.dumps(settings | {"timeout": 0.5}))
+    # The parent never finishes extracting, the package is imported from elsewhere
+    fallback = tmp_path / "fallback"
+    (fallback / "slowpkg").mkdir(parents=True)
+    (fallback / "slowpkg" / "__init__.py").write_text("")
+    monkeypatch.setenv("PYTHONPATH", f"{os.environ['PYTHONPATH']}{os.pathsep}{fallback}")
+
+    completed = subprocess.run([sys.executable, "-c", "import slowpkg; print(slowpkg.__file__)"],
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.startswith(str(fallback))
+    assert "slowpkg was not extracted by the parent process" in completed.stderr
@@ -0,0 +1,58 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from proxy_imports import package_costs
+from proxy_imports.proxy_analyze import _package_import_times
+from proxy_imports.proxy_costs import format_table
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     otherpkg.sub
+import time:       200 |        300 |   otherpkg
+import time:        50 |         50 |   mainpkg.helpers
+import time:       400 |        750 | mainpkg
+import time:        10 |         10 | mainpkg.late
+"""
+
+def test_package_import_times():
+    times = _package_import_times(IMPORTTIME)
+    # mainpkg includes otherpkg, which it imports, and its own submodules
+    assert times == {"mainpkg": pytest.approx(0.00076), "otherpkg": pytest.approx(0.0003)}
+
+@pytest.fixture
+def packages(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    (src / "costpkg").mkdir(parents=True)
+    (src / "costpkg" / "__init__.py").write_text("import costdep\nfrom . import sub\n")
+    (src / "costpkg" / "sub.py").write_text("VALUE = 1\n")
+    (src / "costpkg" / "data.bin").write_bytes(b"x" * 100000)
+    (src / "costdep.py").write_text("import json\n")
+    monkeypatch.setenv("PYTHONPATH", str(src))
+    monkeypatch.syspath_prepend(str(src))
+    yield src
+    for name in ["costpkg", "costpkg.sub", "costdep"]:
+        sys.modules.pop(name, None)
+
+def test_package_costs(packages):
+    costs = {cost["package"]: cost for cost in package_costs(["costpkg"])}
+    # Standard modules are not reported
+    assert list(costs) == ["costpkg", "costdep"]
+    assert costs["costpkg"]["files"] == 3
+    assert costs["costpkg"]["archive_bytes"] > 100000
+    assert costs["costpkg"]["library_bytes"] == 0
+    assert costs["costpkg"]["import_seconds"] >= costs["costdep"]["import_seconds"] > 0
+    assert costs["costpkg"]["extract_seconds"] > 0
+    assert costs["costpkg"]["on_target"] is None
+
+    table = format_table(list(costs.values())).splitlines()
+    assert table[0].split()[0] == "package"
+    assert table[1].split()[0] == "costpkg"
+    assert table[-1].split()[:3] == ["total", f"{(costs['costpkg']['archive_bytes'] + costs['costdep']['archive_bytes']) / 2**20:.2f}", "4"]
+
+def test_cli_json(packages, tmp_path):
+    completed = subprocess.run([sys.executable, "-m", "proxy_imports.proxy_costs", "costpkg", "--json", "-"],
+                               capture_output=True, text=True, check=True)
+    costs = json.loads(completed.stdout)
+    assert [cost["package"] for cost in costs] == ["costpkg", "costdep"]
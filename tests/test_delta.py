@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+import pytest
+
+from proxy_imports import store_modules
+import proxy_imports.proxy_analyze as proxy_analyze
+from proxy_imports.proxy_importer import unpack
+
+@pytest.fixture
+def config(stored_package, tmp_path):
+    _, config = stored_package({
+        "devpkg/__init__.py": "VALUE = 1\n",
+        "devpkg/sub/__init__.py": "",
+        "devpkg/old.py": "OLD = True\n",
+    }, store=False, on_path=True, manifest_dir=str(tmp_path / "manifests"))
+    return config
+
+@pytest.fixture
+def dev_package(config, tmp_path):
+    return tmp_path / "src" / "devpkg"
+
+def test_delta_update(dev_package, config):
+    package_path = config["package_path"]
+    os.makedirs(package_path)
+
+    proxy = store_modules("devpkg", trace=False, config=config)["devpkg"]
+    assert proxy_analyze.package_records["devpkg"]["editable"]
+    assert proxy_analyze.package_records["devpkg"]["depth"] == 0
+    asyncio.run(unpack(proxy, "devpkg", package_path))
+    assert open(f"{package_path}/devpkg/old.py").read() == "OLD = True\n"
+
+    # Unchanged package is not stored again
+    assert store_modules("devpkg", trace=False, config=config)["devpkg"] is proxy
+
+    (dev_package / "__init__.py").write_text("VALUE = 2\n")
+    (dev_package / "old.py").unlink()
+    (dev_package / "new.py").write_text("NEW = True\n")
+
+    delta = store_modules("devpkg", trace=False, config=config)["devpkg"]
+    assert delta is not proxy
+    assert proxy_analyze.package_records["devpkg"]["depth"] == 1
+
+    asyncio.run(unpack(delta, "devpkg", package_path))
+    assert open(f"{package_path}/devpkg/__init__.py").read() == "VALUE = 2\n"
+    assert open(f"{package_path}/devpkg/new.py").read() == "NEW = True\n"
+    assert not os.path.exists(f"{package_path}/devpkg/old.py")
+
+def test_delta_on_fresh_node(dev_package, config, tmp_path):
+    store_modules("devpkg", trace=False, config=config)
+    (dev_package / "sub" / "__init__.py").write_text("SUB = 1\n")
+
+    # A new driver process finds the previous version in the manifest directory
+    proxy_analyze.package_records.clear()
+    proxy_analyze.proxied_modules.clear()
+    delta = store_modules("devpkg", trace=False, config=config)["devpkg"]
+    assert proxy_analyze.package_records["devpkg"]["depth"] == 1
+
+    # A node without the base version fetches the base first
+    package_path = str(tmp_path / "fresh-node")
+    os.makedirs(package_path)
+    asyncio.run(unpack(delta, "devpkg", package_path))
+    assert open(f"{package_path}/devpkg/sub/__init__.py").read() == "SUB = 1\n"
+    assert open(f"{package_path}/devpkg/old.py").read() == "OLD = True\n"
@@ -0,0 +1,44 @@
+import pytest
+
+from proxy_imports import probe_environment, save_environment, store_modules
+from proxy_imports.proxy_environment import load_target_environment, local_distributions, satisfied_on_target
+
+@pytest.fixture
+def config(store_config):
+    return store_config
+
+def test_probe_finds_installed_distributions():
+    environment = probe_environment()
+    assert environment["distributions"]["pytest"] == pytest.__version__
+    assert local_distributions("pytest") == {"pytest": pytest.__version__}
+
+def test_satisfied_on_target():
+    assert satisfied_on_target("pytest", probe_environment()) == f"pytest=={pytest.__version__}"
+    assert satisfied_on_target("pytest", {"distributions": {"pytest": "0.0.1"}}) is None
+    assert satisfied_on_target("pytest", {"distributions": dict()}) is None
+
+def test_python_mismatch():
+    environment = probe_environment()
+    assert satisfied_on_target("pytest", environment | {"python": "2.7.18"}) is None
+    assert satisfied_on_target("pytest", environment | {"python": environment["python"].rpartition(".")[0] + ".99"}) is not None
+
+    # Only compiled distributions depend on the ABI
+    yaml = pytest.importorskip("yaml")
+    other_abi = environment | {"abi": "cpython-27mu-x86_64-linux-gnu"}
+    assert satisfied_on_target("yaml", environment) == f"pyyaml=={yaml.__version__}"
+    assert satisfied_on_target("yaml", other_abi) is None
+    assert satisfied_on_target("pytest", other_abi) is not None
+
+def test_load_from_file(tmp_path):
+    path = str(tmp_path / "target.json")
+    save_environment({"python": "3.11.0", "distributions": {"numpy": "1.26.0"}}, path)
+    assert load_target_environment({"target_environment": path})["distributions"] == {"numpy": "1.26.0"}
+    assert load_target_environment(dict()) is None
+
+def test_dry_run(config):
+    config["target_environment"] = {"distributions": {"pytest": pytest.__version__}}
+    report = store_modules(["pytest", "json", "pluggy"], trace=False, config=config, dry_run=True)
+    assert report["pytest"]["action"] == "skip"
+    assert report["json"]["action"] == "skip"
+    assert report["pluggy"]["action"] == "ship"
+    assert report["pluggy"]["bytes"] > 0
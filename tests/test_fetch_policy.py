@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter
+from proxy_imports.proxy_analyze import fetch_policies
+from proxy_imports.proxy_importer import _proxy_id
+from proxy_imports.proxy_timing import clear_events, get_events, get_timing_report
+
+PACKAGES = ["smallpkg", "otherpkg", "branchpkg"]
+
+@pytest.fixture
+def proxies(stored_package):
+    files = {f"{name}/__init__.py": f"NAME = {name!r}\n" for name in PACKAGES}
+    return stored_package(files | {"branchpkg/data.bin": os.urandom(100000)})
+
+def extracted(proxies, config, name):
+    return os.path.exists(f"{config['package_path']}/{name}-{_proxy_id(proxies[name])}_done.tmp")
+
+def test_default_policy_by_size(proxies):
+    proxies, config = proxies
+    policies = fetch_policies(PACKAGES, config | {"lazy_threshold": 50000, "fetch_policy": {"otherpkg": "priority"}})
+    assert policies == {"smallpkg": "eager", "otherpkg": "priority", "branchpkg": "lazy"}
+    assert fetch_policies(PACKAGES, config) == {name: "eager" for name in PACKAGES}
+
+def test_lazy_and_priority(proxies):
+    proxies, config = proxies
+    clear_events()
+    importer = ProxyImporter(proxies, config["package_path"],
+                             fetch_policy={"otherpkg": "priority", "branchpkg": "lazy"})
+    sys.meta_path.insert(0, importer)
+    try:
+        import smallpkg
+        assert smallpkg.NAME == "smallpkg"
+        importer.wait()
+
+        # The priority package is fetched first, the lazy one not at all
+        assert [event["package"] for event in get_events() if event["stage"] == "fetch"] == ["otherpkg", "smallpkg"]
+        assert not extracted(proxies, config, "branchpkg")
+        assert importer.unused_packages() == ["otherpkg"]
+        assert get_timing_report()["unused"] == ["otherpkg"]
+
+        import branchpkg
+        assert branchpkg.NAME == "branchpkg"
+        assert extracted(proxies, config, "branchpkg")
+        assert importer.unused_packages() == ["otherpkg"]
+    finally:
+        sys.meta_path.remove(importer)
+
+def test_unknown_policy(proxies):
+    proxies, config = proxies
+    with pytest.raises(ValueError):
+        ProxyImporter(proxies, config["package_path"], fetch_policy={"smallpkg": "sometimes"})
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+from proxy_imports.proxy_forkserver import ForkServer
+
+def read_value(name):
+    import importlib
+    return os.getpid(), importlib.import_module(name).VALUE
+
+def fail():
+    raise ValueError("task failed")
+
+def start_child():
+    import multiprocessing
+    process = multiprocessing.get_context("fork").Process(target=os.getpid)
+    process.start()
+    process.join()
+    return process.exitcode
+
+@pytest.fixture
+def proxies(stored_package, tmp_path):
+    counter = tmp_path / "executions"
+    proxies, config = stored_package({
+        "forkpkg/__init__.py": f"with open({str(counter)!r}, 'a') as fp:\n    fp.write('x')\nVALUE = 5\n",
+    })
+    counter.unlink()
+    return proxies, config["package_path"], counter
+
+def test_tasks_run_in_forked_processes(proxies):
+    proxied_modules, package_path, counter = proxies
+    with ForkServer(proxied_modules, package_path) as server:
+        template = server.wait_ready(timeout=60)
+        results = [server.submit(read_value, "forkpkg") for _ in range(3)]
+        results = [future.result(timeout=60) for future in results]
+
+        assert [value for _, value in results] == [5, 5, 5]
+        pids = {pid for pid, _ in results}
+        assert len(pids) == 3 and template not in pids and os.getpid() not in pids
+        # Executed once in the template, not in the task processes
+        assert counter.read_text() == "x"
+
+        with pytest.raises(ValueError, match="task failed"):
+            server.submit(fail).result(timeout=60)
+
+def test_tasks_start_processes(proxies):
+    proxied_modules, package_path, counter = proxies
+    server = ForkServer(proxied_modules, package_path)
+    try:
+        assert server.submit(start_child).result(timeout=60) == 0
+    finally:
+        server.shutdown(timeout=10)
+    assert not server._process.is_alive()
+
+def test_importer_is_fork_safe(proxies):
+    from proxy_imports import ProxyImporter
+
+    proxied_modules, package_path, counter = proxies
+    importer = ProxyImporter(proxied_modules, package_path)
+    sys.meta_path.insert(0, importer)
+    try:
+        # Waiting before forking, the child does not need the unpack thread
+        assert importer.wait(timeout=30)
+        pid = os.fork()
+        if pid == 0:
+            import signal
+            signal.alarm(30)
+            import forkpkg
+            os._exit(0 if forkpkg.VALUE == 5 else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert not importer.unpack_thread.is_alive()
+    finally:
+        sys.meta_path.remove(importer)
+        sys.modules.pop("forkpkg", None)
+
+def test_fork_wait_times_out(proxies, monkeypatch):
+    import proxy_imports.proxy_forkserver as proxy_forkserver
+    from proxy_imports.proxy_importer import _lock_files
+    from proxy_imports.proxy_timing import clear_events, get_events
+
+    proxied_modules, package_path, counter = proxies
+    # Another process on the node is extracting the package
+    started_file, finished_file = _lock_files(proxied_modules["forkpkg"], "forkpkg", package_path)
+    started_file.parent.mkdir(parents=True, exist_ok=True)
+    started_file.touch()
+    monkeypatch.setattr(proxy_forkserver, "FORK_WAIT_TIMEOUT", 0.5)
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+    clear_events()
+    importer = proxy_forkserver._import_modules(proxied_modules, package_path, [])
+    try:
+        assert [event["package"] for event in get_events() if event["stage"] == "fork_wait_timeout"] == ["forkpkg"]
+    finally:
+        finished_file.touch()
+        assert importer.wait(timeout=10)
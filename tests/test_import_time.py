@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import dill
+
+from proxy_imports import proxy_transform
+
+# Modules only needed to package functions, workers should never import them
+DRIVER_ONLY = ["PyInstaller", "proxy_imports.proxy_analyze", "proxy_imports.import_tracer"]
+
+def import_times(code: str) -> dict[str, int]:
+    """Runs code in a clean interpreter with -X importtime, returns the cumulative
+    import time in microseconds of every module it imported. Modules imported with
+    importlib.import_module are not timed by -X importtime, they are reported as 0.
+    """
+    code = f"{code}\nimport sys\nprint(','.join(sys.modules))"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    times = {name: 0 for name in completed.stdout.strip().splitlines()[-1].split(",")}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def driver_only(times: dict[str, int]) -> list[str]:
+    return [name for name in times if any(name == m or name.startswith(f"{m}.") for m in DRIVER_ONLY)]
+
+def test_worker_imports():
+    times = import_times("import proxy_imports; from proxy_imports import ProxyImporter")
+    assert "proxy_imports.proxy_importer" in times
+    assert driver_only(times) == []
+    assert "dill" not in times
+
+def test_packaging_is_imported_on_use():
+    times = import_times("from proxy_imports import store_modules")
+    assert "proxy_imports.proxy_analyze" in times
+
+def task(a):
+    return a + 1
+
+def test_deserializing_transformed_function(tmp_path, store_config):
+    path = tmp_path / "task.pkl"
+    path.write_bytes(dill.dumps(proxy_transform(task, config_path=store_config)))
+
+    times = import_times(f"import dill; dill.loads(open({str(path)!r}, 'rb').read())")
+    assert "proxy_imports.proxy_worker" in times
+    assert driver_only(times) == []
@@ -0,0 +1,29 @@
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter
+
+@pytest.fixture
+def proxies(stored_package):
+    proxies, config = stored_package({
+        "lazypkg/__init__.py": "VALUE = 5\ndef double(x):\n    return 2 * x\n",
+        "lazypkg/sub/__init__.py": "NAME = 'sub'\n",
+    })
+    return proxies, config["package_path"]
+
+def test_from_import_is_lazy(proxies):
+    importer = ProxyImporter(*proxies, lazy_attributes=True)
+    sys.meta_path.insert(0, importer)
+    try:
+        from lazypkg import VALUE, double, sub
+        module = sys.modules["lazypkg"]
+        assert not module.__resolved__
+
+        assert double(2) == 4
+        assert module.__resolved__
+        assert VALUE == 5
+        assert sub.NAME == "sub"
+        assert "proxied-site-packages" in module.__file__
+    finally:
+        sys.meta_path.remove(importer)
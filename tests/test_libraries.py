@@ -0,0 +1,88 @@
+import ctypes
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from proxy_imports.proxy_libraries import dependency_order, preload_libraries, read_dynamic, write_library_list
+
+pytestmark = pytest.mark.skipif(shutil.which("cc") is None, reason="Needs a C compiler")
+
+def compile_library(directory, name, source, needs=()):
+    (directory / f"{name}.c").write_text(source)
+    subprocess.run(["cc", "-shared", "-fPIC", f"-Wl,-soname,{name}.so", "-o", str(directory / f"{name}.so"),
+                    str(directory / f"{name}.c"), f"-L{directory}"] + [f"-l{need[3:]}" for need in needs],
+                   check=True, capture_output=True)
+    return str(directory / f"{name}.so")
+
+@pytest.fixture
+def libraries(tmp_path):
+    # Unique names, libraries stay loaded in the test process
+    base = f"libbase{tmp_path.name.replace('-', '')}"
+    user = f"libuser{tmp_path.name.replace('-', '')}"
+    base_path = compile_library(tmp_path, base, "int base_value(void) { return 41; }\n")
+    user_path = compile_library(tmp_path, user, "int base_value(void);\nint user_value(void) { return base_value() + 1; }\n", needs=[base])
+    return tmp_path, base, user, base_path, user_path
+
+def test_read_dynamic(libraries, tmp_path):
+    _, base, user, base_path, user_path = libraries
+    assert read_dynamic(base_path)[0] == f"{base}.so"
+    soname, needed = read_dynamic(user_path)
+    assert soname == f"{user}.so"
+    assert f"{base}.so" in needed
+
+    (tmp_path / "notes.txt").write_text("not a library")
+    assert read_dynamic(str(tmp_path / "notes.txt")) == (None, [])
+
+def test_preload_in_dependency_order(libraries):
+    library_path, base, user, base_path, user_path = libraries
+    assert dependency_order([user_path, base_path]) == [base_path, user_path]
+
+    # Without the preload, the linker could not find the base library of user
+    with pytest.raises(OSError):
+        ctypes.CDLL(f"{user}.so")
+
+    write_library_list("userpkg", str(library_path), [f"{user}.so", f"{base}.so"])
+    assert preload_libraries("userpkg", str(library_path)) == 2
+    assert preload_libraries("userpkg", str(library_path)) == 0
+    assert preload_libraries("otherpkg", str(library_path)) == 0
+
+    # Extension modules find preloaded libraries by their soname
+    assert ctypes.CDLL(f"{user}.so").user_value() == 42
+
+def test_preloaded_before_exec(libraries, stored_package, tmp_path):
+    _, base, user, base_path, user_path = libraries
+    # The package loads its library by soname when it is executed, as an extension module would
+    files = {
+        "libpkg/__init__.py": f"import ctypes\nVALUE = ctypes.CDLL('{user}.so').user_value()\n",
+        f"libpkg/{base}.so": open(base_path, "rb").read(),
+        f"libpkg/{user}.so": open(user_path, "rb").read(),
+        "libpkg/libnotes.so": b"not a library",
+    }
+    # The driver imports the package to store it
+    ctypes.CDLL(base_path, mode=ctypes.RTLD_GLOBAL)
+    ctypes.CDLL(user_path, mode=ctypes.RTLD_GLOBAL)
+    proxies, config = stored_package(files)
+    path = tmp_path / "proxies.pkl"
+    path.write_bytes(pickle.dumps(proxies))
+
+    # A new worker, where only the preload lets the linker find the libraries
+    code = (f"import json, pickle, sys\n"
+            f"from proxy_imports import ProxyImporter\n"
+            f"from proxy_imports.proxy_timing import get_events\n"
+            f"sys.meta_path.insert(0, ProxyImporter(pickle.load(open({str(path)!r}, 'rb')), {config['package_path']!r}))\n"
+            f"import libpkg\n"
+            f"print(json.dumps([libpkg.VALUE, get_events('libpkg')]))\n")
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=tmp_path)
+    assert completed.returncode == 0, completed.stderr
+    value, events = json.loads(completed.stdout)
+    assert value == 42
+
+    stages = [event["stage"] for event in events]
+    assert stages.index("preload_libraries") < stages.index("exec_module")
+    failed = [event for event in events if event["stage"] == "preload_failed"]
+    assert [os.path.basename(event["library"]) for event in failed] == ["libnotes.so"]
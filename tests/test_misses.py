@@ -0,0 +1,99 @@
+import json
+import pickle
+import sys
+
+import pytest
+
+from proxy_imports import fold_misses, store_modules
+from proxy_imports.proxy_analyze import reported_misses, skipped_modules
+from proxy_imports.proxy_misses import MissFinder
+from proxy_imports.proxy_prefetch import prefetch, worker_init_command
+from proxy_imports.proxy_timing import clear_events, get_timing_report
+
+@pytest.fixture
+def setup(stored_package, tmp_path):
+    proxies, config = stored_package({"tracedpkg/__init__.py": "VALUE = 5\n", "missedpkg/__init__.py": "VALUE = 5\n"},
+                                     modules=["tracedpkg"], on_path=True,
+                                     report_misses={"log": str(tmp_path / "misses.jsonl")})
+    reported_misses.clear()
+    meta_path = list(sys.meta_path)
+    yield proxies, config, tmp_path
+    sys.meta_path[:] = meta_path
+
+def test_finder(tmp_path):
+    src = tmp_path / "src"
+    (src / "localpkg").mkdir(parents=True)
+    (src / "localpkg" / "__init__.py").write_text("import time\ntime.sleep(0.05)\n")
+    (tmp_path / "package_path" / "extractedpkg").mkdir(parents=True)
+    (tmp_path / "package_path" / "extractedpkg" / "__init__.py").write_text("")
+    sys.path[:0] = [str(tmp_path / "package_path"), str(src)]
+    finder = MissFinder(str(tmp_path / "package_path"))
+    sys.meta_path.insert(0, finder)
+    try:
+        import localpkg, extractedpkg, json, email.mime
+    finally:
+        sys.meta_path.remove(finder)
+        sys.path.remove(str(tmp_path / "package_path"))
+        sys.path.remove(str(src))
+        sys.modules.pop("localpkg", None)
+        sys.modules.pop("extractedpkg", None)
+
+    assert list(finder.misses) == ["localpkg"]
+    assert finder.misses["localpkg"]["origin"] == str(src / "localpkg" / "__init__.py")
+    assert finder.misses["localpkg"]["import_seconds"] >= 0.05
+
+def test_fold_log(setup):
+    proxies, config, tmp_path = setup
+    prefetch(proxies, config)
+    import tracedpkg, missedpkg
+    assert tracedpkg.VALUE == missedpkg.VALUE == 5
+
+    misses = [json.loads(line) for line in (tmp_path / "misses.jsonl").read_text().splitlines()]
+    assert [miss["package"] for miss in misses] == ["missedpkg"]
+
+    assert fold_misses(str(tmp_path / "misses.jsonl")) == ["missedpkg"]
+    # Only new lines are folded
+    assert fold_misses(str(tmp_path / "misses.jsonl")) == []
+
+    next_proxies = store_modules("tracedpkg", trace=False, config=config)
+    assert list(next_proxies) == ["tracedpkg", "missedpkg"]
+    assert list(store_modules("tracedpkg", trace=False, config=config)) == ["tracedpkg"]
+
+def test_fold_timing_report(setup):
+    proxies, config, tmp_path = setup
+    config = dict(config, report_misses=True)
+    clear_events()
+    prefetch(proxies, config)
+    import missedpkg
+
+    report = get_timing_report(clear=True)
+    assert report["misses"] == ["missedpkg"]
+    assert fold_misses([report, report]) == ["missedpkg"]
+    assert list(reported_misses) == ["missedpkg"]
+
+def test_skipped_not_reported(stored_package, tmp_path):
+    # Cheaper to import from the shared filesystem with this endpoint
+    endpoint = {"metadata_latency": 0.001, "bandwidth": 1e9, "fetch_latency": 0.05, "file_create": 5e-5}
+    proxies, config = stored_package({"skippedpkg/__init__.py": "VALUE = 5\n"}, on_path=True, endpoint=endpoint)
+    assert proxies == dict() and "skippedpkg" in skipped_modules
+
+    path = tmp_path / "prefetch.pkl"
+    worker_init_command(proxies, config | {"report_misses": True}, str(path))
+    with open(path, "rb") as fp:
+        config = pickle.load(fp)["config"]
+    assert config["skipped_modules"] == ["skippedpkg"]
+
+    clear_events()
+    meta_path = list(sys.meta_path)
+    try:
+        prefetch(proxies, config)
+        import skippedpkg
+        assert skippedpkg.VALUE == 5
+    finally:
+        sys.meta_path[:] = meta_path
+    report = get_timing_report(clear=True)
+    assert report["misses"] == []
+
+    # Reported by a worker that did not know about it
+    report["events"].append({"package": "skippedpkg", "stage": "miss", "origin": skippedpkg.__file__})
+    assert fold_misses(report) == []
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+from proxy_imports.proxy_analyze import critical_path_order
+
+import proxy_imports.import_tracer as import_tracer
+
+def test_critical_path_order():
+    dependencies = {"task_pkg": ["numpy", "scipy"], "scipy": ["numpy", "threadpoolctl"]}
+    assert critical_path_order(["task_pkg", "pandas"], dependencies) == ["task_pkg", "numpy", "scipy", "threadpoolctl", "pandas"]
+    assert critical_path_order(["pandas", "scipy"], dependencies) == ["pandas", "scipy", "numpy", "threadpoolctl"]
+    assert critical_path_order([], dependencies) == []
+
+def test_tracer_dependencies(tmp_path):
+    (tmp_path / "firstpkg").mkdir()
+    (tmp_path / "firstpkg" / "__init__.py").write_text("import secondpkg\nimport thirdpkg\n")
+    (tmp_path / "secondpkg").mkdir()
+    (tmp_path / "secondpkg" / "__init__.py").write_text("import thirdpkg\n")
+    (tmp_path / "thirdpkg").mkdir()
+    (tmp_path / "thirdpkg" / "__init__.py").write_text("")
+
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{tmp_path}:{env.get('PYTHONPATH', '')}"
+    completed = subprocess.run([sys.executable, import_tracer.__file__, "--json", "firstpkg"],
+                               env=env, capture_output=True, text=True, check=True)
+    traced = json.loads(completed.stdout)
+    assert traced["packages"] == ["firstpkg", "secondpkg", "thirdpkg"]
+    # thirdpkg is already imported when firstpkg imports it, so only secondpkg needs it
+    assert traced["dependencies"] == {"firstpkg": ["secondpkg"], "secondpkg": ["thirdpkg"]}
+    assert critical_path_order(["firstpkg"], traced["dependencies"]) == traced["packages"]
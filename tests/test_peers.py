@@ -0,0 +1,99 @@
+import multiprocessing
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter
+from proxy_imports.proxy_peers import PeerServer, _fetch_from_peer, fetch_blob
+from proxy_imports.proxy_timing import clear_events, get_events
+
+def test_fetch_from_parent(tmp_path):
+    config = {"directory": str(tmp_path / "peers"), "host": "127.0.0.1", "timeout": 5}
+    reads = []
+    def from_store():
+        reads.append(1)
+        return b"blob"
+
+    # Both nodes are served by this process, the second one fetches from the first
+    assert fetch_blob("blob-a", from_store, config) == (b"blob", "store")
+    assert fetch_blob("blob-a", from_store, config) == (b"blob", "peer")
+    assert len(reads) == 1
+    assert sorted(p.name for p in (tmp_path / "peers" / "blob-a").iterdir()) == ["0", "1"]
+
+def test_fall_back_to_store(tmp_path):
+    config = {"directory": str(tmp_path / "peers"), "host": "127.0.0.1", "timeout": 5}
+    # The parent is registered, but gone
+    (tmp_path / "peers" / "blob-b").mkdir(parents=True)
+    (tmp_path / "peers" / "blob-b" / "0").write_text("127.0.0.1:1")
+    clear_events()
+    assert fetch_blob("blob-b", lambda: b"blob", config, "pkg") == (b"blob", "store")
+    assert [event["parent"] for event in get_events("pkg") if event["stage"] == "peer_fallback"] == [0]
+
+def test_server_spools_and_checks_token(tmp_path):
+    server = PeerServer("127.0.0.1", timeout=5, memory=10, spool=str(tmp_path / "spool"))
+    server.tokens.add("secret")
+    server.add("small", b"x" * 6)
+    server.add("other", b"y" * 6)
+    server.add("large", b"z" * 20)
+    try:
+        # Over the memory budget, served from the spool directory
+        assert list(server.memory) == ["other"]
+        assert sorted(p.name for p in server.spool.iterdir()) == ["large", "small"]
+        assert _fetch_from_peer(server.address, "small", "secret", 5) == b"x" * 6
+        assert _fetch_from_peer(server.address, "large", "secret", 5) == b"z" * 20
+        assert _fetch_from_peer(server.address, "other", "secret", 5) == b"y" * 6
+        with pytest.raises(LookupError):
+            _fetch_from_peer(server.address, "other", "wrong", 5)
+    finally:
+        server.close()
+
+@pytest.fixture
+def proxies(stored_package, tmp_path):
+    proxies, _ = stored_package({"peerpkg/__init__.py": "VALUE = 5\n"})
+    return proxies, tmp_path
+
+def node(proxies, package_path, peers, barrier, queue):
+    sys.meta_path.insert(0, ProxyImporter(proxies, package_path, peers=peers))
+    import peerpkg
+    queue.put((peerpkg.VALUE, [event["source"] for event in get_events("peerpkg") if event["stage"] == "fetch"]))
+    # Keep serving until all nodes have the package
+    barrier.wait()
+
+def test_nodes_share_package(proxies):
+    proxies, tmp_path = proxies
+    peers = {"directory": str(tmp_path / "peers"), "host": "127.0.0.1", "timeout": 30}
+    nnodes = 4
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(nnodes)
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=node, args=(proxies, str(tmp_path / f"node-{i}"), peers, barrier, queue)) for i in range(nnodes)]
+    for p in processes:
+        p.start()
+    results = [queue.get(timeout=60) for _ in processes]
+    for p in processes:
+        p.join()
+
+    assert [value for value, _ in results] == [5] * nnodes
+    sources = sorted(source for _, fetches in results for source in fetches)
+    assert sources == ["peer"] * (nnodes - 1) + ["store"]
+
+def test_importer_falls_back_to_store(proxies):
+    from proxy_imports.proxy_importer import _proxy_id
+
+    proxies, tmp_path = proxies
+    peers = {"directory": str(tmp_path / "peers"), "host": "127.0.0.1", "timeout": 5}
+    # The parent of this node is registered, but gone
+    registry = tmp_path / "peers" / _proxy_id(proxies["peerpkg"])
+    registry.mkdir(parents=True)
+    (registry / "0").write_text("127.0.0.1:1")
+
+    clear_events()
+    importer = ProxyImporter(proxies, str(tmp_path / "node"), peers=peers)
+    sys.meta_path.insert(0, importer)
+    try:
+        import peerpkg
+        assert peerpkg.VALUE == 5
+        assert [event["source"] for event in get_events("peerpkg") if event["stage"] == "fetch"] == ["store"]
+    finally:
+        sys.meta_path.remove(importer)
+        sys.modules.pop("peerpkg", None)
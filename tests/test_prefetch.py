@@ -0,0 +1,36 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from proxy_imports.proxy_importer import _proxy_id
+from proxy_imports.proxy_prefetch import prefetch, worker_init_command
+
+def read_value():
+    import prefetchpkg
+    return prefetchpkg.VALUE
+
+@pytest.fixture
+def proxies(stored_package):
+    return stored_package({"prefetchpkg/__init__.py": "VALUE = 5\n"})
+
+def extracted(proxies, config):
+    return os.path.exists(f"{config['package_path']}/prefetchpkg-{_proxy_id(proxies['prefetchpkg'])}_done.tmp")
+
+def test_process_pool_initializer(proxies):
+    proxies, config = proxies
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(2, mp_context=ctx, initializer=prefetch, initargs=(proxies, config)) as executor:
+        assert executor.submit(read_value).result(timeout=60) == 5
+    assert extracted(proxies, config)
+
+def test_worker_init_command(proxies, tmp_path):
+    proxies, config = proxies
+    command = worker_init_command(proxies, config, str(tmp_path / "prefetch.pkl"), background=False)
+    assert not extracted(proxies, config)
+    env = os.environ | {"PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run(command, shell=True, check=True, env=env)
+    assert extracted(proxies, config)
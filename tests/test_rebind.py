@@ -0,0 +1,21 @@
+import json.decoder
+
+from proxy_imports.proxy_importer import ProxyModule
+
+decoder = None
+
+def test_resolved_proxy_forwards_attributes():
+    proxy = ProxyModule(None, "json.decoder", package_path="")
+    assert proxy.JSONDecoder is json.decoder.JSONDecoder
+    assert proxy.__resolved__
+    assert proxy.__name__ == "json.decoder"
+    assert isinstance(proxy, ProxyModule)
+
+def test_globals_are_rebound_on_resolution():
+    global decoder
+    decoder = ProxyModule(None, "json.decoder", package_path="")
+    assert isinstance(decoder, ProxyModule)
+
+    decoder.JSONDecoder # Resolves the proxy
+    assert type(decoder) is type(json.decoder)
+    assert decoder is json.decoder
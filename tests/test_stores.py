@@ -0,0 +1,107 @@
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter
+from proxy_imports.proxy_importer import _lock_files
+from proxy_imports.proxy_stores import fetch_batch, fetch_bytes, get_connector
+from proxy_imports.proxy_timing import clear_events, get_events
+
+PACKAGES = ["batchpkg_a", "batchpkg_b", "batchpkg_c"]
+
+@pytest.fixture
+def proxies(stored_package, tmp_path):
+    proxies, _ = stored_package({f"{name}/__init__.py": f"VALUE = {i}\n" for i, name in enumerate(PACKAGES)})
+    return proxies, tmp_path
+
+def import_all(importer):
+    sys.meta_path.insert(0, importer)
+    try:
+        return [__import__(name).VALUE for name in PACKAGES]
+    finally:
+        sys.meta_path.remove(importer)
+        for name in PACKAGES:
+            sys.modules.pop(name, None)
+
+def test_connector_shared(proxies):
+    proxies, tmp_path = proxies
+    store_configs = [proxy.__factory__.store_config for proxy in proxies.values()]
+    connector = get_connector(store_configs[0])
+    assert all(get_connector(dict(store_config)) is connector for store_config in store_configs)
+
+    other = dict(store_configs[0], connector_config={"store_dir": str(tmp_path / "other")})
+    assert get_connector(other) is not connector
+
+def test_fetch_batch(proxies, monkeypatch):
+    proxies, tmp_path = proxies
+    connector = get_connector(proxies["batchpkg_a"].__factory__.store_config)
+    batches = []
+    get_batch = connector.get_batch
+    monkeypatch.setattr(connector, "get_batch", lambda keys: batches.append(keys) or get_batch(keys))
+
+    blobs = fetch_batch(list(proxies.values()))
+    assert len(batches) == 1 and len(batches[0]) == len(PACKAGES)
+    assert blobs == [fetch_bytes(proxy) for proxy in proxies.values()]
+
+def test_importer_batches(proxies):
+    proxies, tmp_path = proxies
+    clear_events()
+    importer = ProxyImporter(proxies, str(tmp_path / "batched"), batch_fetches=True)
+    assert import_all(importer) == [0, 1, 2]
+    importer.wait()
+
+    fetches = [event for name in PACKAGES for event in get_events(name) if event["stage"] == "fetch"]
+    assert [event["batch"] for event in fetches] == [3, 3, 3]
+
+def test_batch_waits_for_other_process(proxies):
+    proxies, tmp_path = proxies
+    package_path = tmp_path / "shared"
+    package_path.mkdir()
+    # Another process on the node started extracting batchpkg_b
+    started_file, finished_file = _lock_files(proxies["batchpkg_b"], "batchpkg_b", str(package_path))
+    started_file.touch()
+
+    clear_events()
+    importer = ProxyImporter(proxies, str(package_path), batch_fetches=True)
+    assert importer.fetch("batchpkg_a").result(timeout=10) == "Done"
+    assert not importer.fetch("batchpkg_b").done()
+
+    # Extracted by the other process
+    sibling = ProxyImporter({"batchpkg_b": proxies["batchpkg_b"]}, str(tmp_path / "sibling"))
+    sibling.wait()
+    for path in (tmp_path / "sibling").iterdir():
+        if path.name.startswith("batchpkg_b"):
+            path.rename(package_path / path.name)
+    finished_file.touch()
+    assert import_all(importer) == [0, 1, 2]
+    importer.wait()
+    assert sorted(event["package"] for event in get_events() if event["stage"] == "fetch" and event.get("batch") == 2) == ["batchpkg_a", "batchpkg_c"]
+
+def test_batch_with_blob_cache(proxies):
+    proxies, tmp_path = proxies
+    blob_cache = {"directory": str(tmp_path / "blobs")}
+    clear_events()
+    for job in ["first", "second"]:
+        importer = ProxyImporter(proxies, str(tmp_path / job), blob_cache=blob_cache, batch_fetches=True)
+        assert import_all(importer) == [0, 1, 2]
+        importer.wait()
+
+    sources = [event["source"] for event in get_events("batchpkg_a") if event["stage"] == "fetch"]
+    assert sources == ["store", "disk"]
+
+class SettingsConnector:
+    """Connector that keeps a copy of its settings, not the object it was configured with"""
+    def __init__(self, settings):
+        self.settings = dict(settings)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["settings"])
+
+def test_connector_of_new_settings():
+    # Settings of stores that are gone must not be mistaken for new ones with the same id
+    for i in range(10):
+        settings = {"value": i}
+        store_config = {"name": "settings", "connector_type": f"{__name__}.SettingsConnector",
+                        "connector_config": {"settings": settings}}
+        assert get_connector(store_config).settings == settings
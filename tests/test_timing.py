@@ -0,0 +1,58 @@
+from collections import deque
+import json
+import time
+
+import proxy_imports.proxy_timing as proxy_timing
+from proxy_imports.proxy_timing import clear_events, event_mark, get_events, get_timing_report, record_event, timed
+
+def test_timed_records_stage():
+    clear_events()
+    with timed("numpy", "untar") as info:
+        time.sleep(0.01)
+        info["bytes"] = 10
+
+    events = get_events("numpy")
+    assert len(events) == 1
+    assert events[0]["stage"] == "untar"
+    assert events[0]["bytes"] == 10
+    assert events[0]["duration"] >= 0.01
+
+def test_report_sums_stages():
+    clear_events()
+    record_event("numpy", "fetch", time.time(), 1.0, bytes=100)
+    record_event("numpy", "fetch", time.time(), 0.5, bytes=50)
+    record_event("numpy", "exec_module", time.time(), 2.0)
+    record_event("scipy", "lock_wait", time.time(), 3.0)
+
+    report = get_timing_report(clear=True)
+    assert report["packages"]["numpy"]["stages"] == {"fetch": 1.5, "exec_module": 2.0}
+    assert report["packages"]["numpy"]["bytes"] == {"fetch": 150}
+    assert report["packages"]["scipy"]["stages"] == {"lock_wait": 3.0}
+    assert len(report["events"]) == 4
+    assert get_events() == []
+
+    json.dumps(report) # Report must be machine readable
+
+def test_report_since_mark():
+    clear_events()
+    record_event("numpy", "fetch", time.time(), 1.0)
+    mark = event_mark()
+    other = event_mark()
+    record_event("scipy", "fetch", time.time(), 2.0)
+
+    # The report of one task leaves the events of the others
+    report = get_timing_report(since=mark)
+    assert list(report["packages"]) == ["scipy"]
+    assert len(get_events()) == 2
+    assert [e["package"] for e in get_events(since=other)] == ["scipy"]
+    assert get_timing_report(since=event_mark())["events"] == []
+
+def test_events_are_capped(monkeypatch):
+    monkeypatch.setattr(proxy_timing, "_events", deque(maxlen=3))
+    mark = event_mark()
+    for i in range(5):
+        record_event(f"package_{i}", "fetch", time.time(), 1.0)
+
+    assert [e["package"] for e in get_events()] == ["package_2", "package_3", "package_4"]
+    assert len(get_events(since=mark)) == 3
+    assert [e["package"] for e in get_events(since=event_mark() - 1)] == ["package_4"]
@@ -0,0 +1,77 @@
+import subprocess
+import sys
+
+import dill
+import pytest
+
+from proxy_imports import analyze_func_and_create_proxies, proxy_transform
+from proxy_imports.proxy_transform import _envelope_id
+import proxy_imports.proxy_worker as proxy_worker
+
+PACKAGES = [f"transformpkg_{i}" for i in range(10)]
+
+TASKS = f"""
+def few(a):
+    import {PACKAGES[0]}
+    return a + {PACKAGES[0]}.VALUE
+
+def all(a):
+    import {", ".join(PACKAGES)}
+    return a + {PACKAGES[-1]}.VALUE
+"""
+
+@pytest.fixture
+def tasks(stored_package):
+    files = {f"{name}/__init__.py": f"VALUE = {i}\n" for i, name in enumerate(PACKAGES)}
+    _, config = stored_package(files | {"transformtasks.py": TASKS}, store=False, on_path=True)
+    import transformtasks
+    return transformtasks, config
+
+def test_payload_does_not_grow(tasks):
+    tasks, config = tasks
+    few = proxy_transform(tasks.few, config_path=config)
+    many = proxy_transform(tasks.all, config_path=config)
+    # The packages are in the stored envelope, tasks only carry its key
+    assert len(dill.dumps(many)) == len(dill.dumps(few))
+
+def test_loaded_once(tasks, monkeypatch):
+    tasks, config = tasks
+    transformed = proxy_transform(tasks.few, config_path=config)
+    loads = []
+    dill_loads = dill.loads
+    monkeypatch.setattr(dill, "loads", lambda payload: loads.append(payload) or dill_loads(payload))
+    monkeypatch.setattr(proxy_worker, "_loaded_functions", dict())
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+
+    transformed = dill_loads(dill.dumps(transformed))
+    assert transformed(1) == 1
+    assert transformed(2) == 2
+    assert len(loads) == 1
+    assert len(proxy_worker._loaded_functions) == 1
+
+def test_task_does_not_import_packaging(tasks, tmp_path):
+    tasks, config = tasks
+    path = tmp_path / "task.pkl"
+    path.write_bytes(dill.dumps(proxy_transform(tasks.all, config_path=config)))
+
+    # A worker without the sources, which runs the task through the proxied packages
+    code = (f"import dill, sys; task = dill.loads(open({str(path)!r}, 'rb').read()); print(task(1)); "
+            f"print(','.join(sys.modules))")
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=tmp_path)
+    assert completed.returncode == 0, completed.stderr
+    result, modules = completed.stdout.splitlines()
+    assert result == str(1 + len(PACKAGES) - 1)
+    assert not [name for name in modules.split(",") if name.partition(".")[0] == "PyInstaller"]
+
+def test_envelope_id(tasks):
+    tasks, config = tasks
+    proxies = analyze_func_and_create_proxies(tasks.few, config)
+    envelope = {"function": dill.dumps(tasks.few), "proxied_modules": proxies, "package_path": config["package_path"]}
+    store_config = config["module_store_config"]
+    envelope_id = _envelope_id(envelope, store_config)
+    assert _envelope_id(dict(envelope), dict(store_config)) == envelope_id
+
+    # Stored in another store
+    assert _envelope_id(envelope, store_config | {"name": "other"}) != envelope_id
+    # Any entry of the envelope
+    assert _envelope_id(envelope | {"new_option": True}, store_config) != envelope_id
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+from proxy_imports import ProxyImporter, store_modules
+import proxy_imports.proxy_analyze as proxy_analyze
+from proxy_imports.proxy_timing import clear_events, get_events
+from proxy_imports.proxy_transport import choose_transport
+
+PACKAGES = ["tinypkg", "zippkg", "shardpkg"]
+
+def test_choose_transport():
+    endpoint = {"metadata_latency": 0.001, "bandwidth": 1e9, "fetch_latency": 0.05, "file_create": 5e-5, "shard_bytes": 2**28}
+    assert choose_transport({"files": 3, "bytes": 10000, "zip_safe": True}, endpoint)["method"] == "skip"
+    assert choose_transport({"files": 500, "bytes": 10**7, "zip_safe": True}, endpoint)["method"] == "zip"
+    assert choose_transport({"files": 500, "bytes": 10**7, "zip_safe": False}, endpoint)["method"] == "tar"
+
+    huge = choose_transport({"files": 5000, "bytes": 2 * 10**9, "zip_safe": False}, endpoint)
+    assert huge["method"] == "sharded"
+    assert huge["shards"] == 8
+    assert set(huge["estimates"]) == {"skip", "tar", "sharded"}
+    assert huge["reason"].startswith("sharded estimated at")
+
+@pytest.fixture
+def packages(stored_package):
+    files = {
+        "tinypkg/__init__.py": "NAME = 'tinypkg'\n",
+        "zippkg/__init__.py": "from . import module0\nNAME = 'zippkg'\n",
+        "zippkg/sub/__init__.py": "",
+        "shardpkg/__init__.py": "import os\nDATA = sorted(os.listdir(os.path.dirname(__file__)))\n",
+    }
+    files |= {f"zippkg/module{i}.py": f"VALUE = {i}\n" for i in range(100)}
+    files |= {f"shardpkg/data{i}.bin": os.urandom(2900) for i in range(100)}
+    endpoint = {"metadata_latency": 0.001, "bandwidth": 1e6, "fetch_latency": 0.05, "file_create": 5e-5,
+                "shard_bytes": 100000, "parallel_fetches": 2}
+    _, config = stored_package(files, store=False, on_path=True, endpoint=endpoint)
+    return config
+
+def test_dry_run_reports_decisions(packages):
+    report = store_modules(PACKAGES, trace=False, config=packages, dry_run=True)
+    assert {name: report[name]["method"] for name in PACKAGES} == {"tinypkg": "skip", "zippkg": "zip", "shardpkg": "sharded"}
+    assert report["tinypkg"]["action"] == "skip"
+    assert report["zippkg"]["reason"].startswith("zip estimated at")
+
+def test_report_decisions(packages):
+    clear_events()
+    proxies, report = store_modules(PACKAGES, trace=False, config=packages, report=True)
+    assert list(proxies) == ["zippkg", "shardpkg"]
+    assert {name: report[name]["method"] for name in PACKAGES} == {"tinypkg": "skip", "zippkg": "zip", "shardpkg": "sharded"}
+    assert report["tinypkg"]["action"] == "skip"
+    assert report["shardpkg"]["action"] == "ship"
+    assert report["shardpkg"]["reason"].startswith("sharded estimated at")
+    assert [e["reason"] for e in get_events("tinypkg") if e["stage"] == "skip"] == [report["tinypkg"]["reason"]]
+
+    # A source tree is hashed again, but keeps its transport
+    _, report = store_modules(["zippkg"], trace=False, config=packages, report=True)
+    assert list(report) == ["zippkg"]
+    assert report["zippkg"]["method"] == "zip"
+
+def test_ship_by_transport(packages):
+    proxies = store_modules(PACKAGES, trace=False, config=packages)
+    # The tiny package is imported from the shared filesystem
+    assert list(proxies) == ["zippkg", "shardpkg"]
+    assert proxy_analyze.package_transports["tinypkg"]["method"] == "skip"
+    assert proxy_analyze.package_records["zippkg"]["method"] == "zip"
+    assert proxy_analyze.package_records["shardpkg"]["transport"]["shards"] == 3
+    expected_data = sorted(os.listdir(os.path.dirname(sys.modules["shardpkg"].__file__)))
+
+    for name in PACKAGES:
+        sys.modules.pop(name, None)
+    sys.modules.pop("zippkg.module0", None)
+    importer = ProxyImporter(proxies, packages["package_path"])
+    sys.meta_path.insert(0, importer)
+    try:
+        import zippkg
+        import zippkg.module42
+        assert zippkg.NAME == "zippkg"
+        assert zippkg.module42.VALUE == 42
+        assert os.path.join(packages["package_path"], "zippkg.zip") in zippkg.module42.__file__
+        assert not os.path.exists(os.path.join(packages["package_path"], "zippkg"))
+
+        import shardpkg
+        assert shardpkg.__file__.startswith(packages["package_path"])
+        assert shardpkg.DATA == expected_data
+    finally:
+        sys.meta_path.remove(importer)
+        sys.path.remove(packages["package_path"])
+        importer.wait()
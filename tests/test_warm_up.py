@@ -0,0 +1,77 @@
+import sys
+import threading
+
+import pytest
+
+from proxy_imports import ProxyImporter, prefetch
+from proxy_imports.proxy_importer import warm_up_modules
+from proxy_imports.proxy_timing import clear_events, get_events
+
+@pytest.fixture
+def proxies(stored_package, tmp_path):
+    counter = tmp_path / "executions"
+    # Every execution of the package appends a line to counter, and it is slow enough
+    # for the task to race the warm-up thread
+    proxies, config = stored_package({
+        "warmpkg/__init__.py": f"import time\nwith open({str(counter)!r}, 'a') as fp:\n    fp.write('x')\ntime.sleep(0.2)\nVALUE = 5\n",
+        "warmpkg/sub/__init__.py": "NAME = 'sub'\n",
+    })
+    counter.unlink()
+    return proxies, config["package_path"], counter
+
+def test_warm_up_imports_in_background(proxies):
+    proxied_modules, package_path, counter = proxies
+    clear_events()
+    importer = ProxyImporter(proxied_modules, package_path)
+    sys.meta_path.insert(0, importer)
+    try:
+        importer.warm_up(["warmpkg", "warmpkg.sub", "json"]).join()
+        assert type(sys.modules["warmpkg"]) is type(sys)
+        assert type(sys.modules["warmpkg.sub"]) is type(sys)
+
+        import warmpkg.sub
+        assert warmpkg.sub.NAME == "sub"
+        assert counter.read_text() == "x"
+        assert [event["module"] for event in get_events("warmpkg") if event["stage"] == "warm_up"] == ["warmpkg", "warmpkg.sub"]
+    finally:
+        sys.meta_path.remove(importer)
+
+def test_task_waits_for_warm_up(proxies):
+    proxied_modules, package_path, counter = proxies
+    importer = ProxyImporter(proxied_modules, package_path)
+    sys.meta_path.insert(0, importer)
+    try:
+        thread = importer.warm_up(["warmpkg"])
+        values = []
+        def task():
+            import warmpkg
+            values.append(warmpkg.VALUE)
+        tasks = [threading.Thread(target=task) for _ in range(4)]
+        for t in tasks:
+            t.start()
+        for t in tasks + [thread]:
+            t.join()
+
+        assert values == [5] * 4
+        assert counter.read_text() == "x"
+    finally:
+        sys.meta_path.remove(importer)
+
+def test_warm_up_modules():
+    fetch_policy = {"warm_eager": "eager", "warm_priority": "priority", "warm_lazy": "lazy"}
+    assert warm_up_modules(True, fetch_policy) == ["warm_eager", "warm_priority"]
+    # Listed packages are warmed up, even lazy ones
+    assert warm_up_modules(["warm_lazy"], fetch_policy) == ["warm_lazy"]
+    assert warm_up_modules(None, fetch_policy) == []
+
+def test_prefetch_skips_lazy_packages(proxies):
+    proxied_modules, package_path, counter = proxies
+    clear_events()
+    importer = prefetch(proxied_modules, {"package_path": package_path, "warm_up": True, "fetch_policy": {"warmpkg": "lazy"}})
+    try:
+        importer.wait()
+        assert importer.warm_up_threads == []
+        assert not counter.exists()
+        assert get_events("warmpkg") == []
+    finally:
+        sys.meta_path.remove(importer)